@@ -1,8 +1,22 @@
 # import the libraries
 
+import os
+import sys
 from datetime import timedelta, datetime
-from airflow.models import DAG
-from airflow.providers.standard.operators.bash import BashOperator
+
+from airflow.exceptions import AirflowFailException
+from airflow.providers.standard.sensors.filesystem import FileSensor
+from airflow.sdk import Param, dag, task, task_group
+
+# pipeline modules are imported inside the tasks, so that parsing the dag
+# stays fast and does not need pandas or mysql
+PIPELINE_SRC = os.path.join(os.path.dirname(__file__), '..', '..',
+                            'pipeline', 'src')
+sys.path.insert(0, os.path.abspath(PIPELINE_SRC))
+
+# months loading at once across every dag run, create the pool with
+# airflow pools set pv_train_load 3 'pv_train monthly loads'
+LOAD_POOL = 'pv_train_load'
 
 # defining DAG arguments
 default_args = {
@@ -13,17 +27,129 @@ default_args = {
     'retry_delay': timedelta(minutes=5),
 }
 
+
+@task
+def unzip(ds=None):
+    '''
+    Unzip the zip downloaded on the run date and archive it.
+    '''
+    import main
+    return main.unzip(datetime.fromisoformat(ds).date())
+
+
+@task
+def validate(zip_path=None, yyyymm=None, ds=None):
+    '''
+    Check the month's csv before anything is loaded, the month of the run
+    date being the one main.load() loads.
+    '''
+    from loaders.import_pv_train import check_pv_train
+    from util import load_config
+
+    if yyyymm is None:
+        import main
+        yyyymm = main.load_month(datetime.fromisoformat(ds).date())
+
+    # without extract, the csv is read from the archived zip
+    extract = load_config('lta_pv_train.yaml').config_pv_train.extract
+    return check_pv_train(None if extract else zip_path, yyyymm)
+
+
+@task(pool=LOAD_POOL)
+def load(zip_path=None, yyyymm=None, ds=None):
+    '''
+    Load the month's csv into mariadb.
+    '''
+    if yyyymm is not None:
+        # backfills load the csvs extracted into csv_prefix
+        from loaders.import_pv_train import import_pv_train
+        import_pv_train(yyyymm=yyyymm)
+        return
+
+    import main
+    main.load(datetime.fromisoformat(ds).date(), zip_path)
+
+
 # define the DAG
-dag = DAG(
-    'transport_dag',
+@dag(
+    dag_id='transport_dag',
     default_args=default_args,
     description='Transport DAG',
     schedule=timedelta(days=1),
+    catchup=False,
 )
+def transport_dag():
+    '''
+    Daily run: fetch the latest pv_train zip from LTA DataMall, then unzip,
+    validate and load it. The run stops after fetch when nothing new has
+    been published.
+    '''
+    @task.short_circuit
+    def fetch(ds=None):
+        import main
+        return main.fetch(datetime.fromisoformat(ds).date())
+
+    zip_path = unzip()
+    fetch() >> zip_path
+    validate(zip_path) >> load(zip_path)
+
 
-# define the first task
-extract = BashOperator(
-    task_id='echo',
-    bash_command='echo "hello world"',
-    dag=dag,
+@dag(
+    dag_id='pv_train_backfill',
+    default_args=default_args,
+    description='Load a range of pv_train months in parallel',
+    schedule=None,
+    catchup=False,
+    params={
+        'start': Param('202501', type='string', pattern=r'^\d{6}$'),
+        'end': Param('202501', type='string', pattern=r'^\d{6}$'),
+    },
 )
+def pv_train_backfill():
+    '''
+    Backfill: one mapped task group per month from start to end. Each month
+    waits for its extracted csv with a deferrable sensor, which frees its
+    worker slot while waiting, then is validated and loaded. Loads run in
+    parallel up to the slots of the pv_train_load pool. Needs extract on.
+    '''
+    @task
+    def months(params=None):
+        from dateutil.relativedelta import relativedelta
+        from util import load_config
+
+        # the sensors wait for extracted csvs, which are only written with
+        # extract on, so fail at once rather than wait out the timeout
+        if not load_config('lta_pv_train.yaml').config_pv_train.extract:
+            raise AirflowFailException(
+                'Error: pv_train_backfill loads the csvs extracted into '
+                'csv_prefix, set extract: True in lta_pv_train.yaml.')
+
+        month = datetime.strptime(params['start'], '%Y%m')
+        end = datetime.strptime(params['end'], '%Y%m')
+        result = []
+        while month <= end:
+            result.append(f'{month:%Y%m}')
+            month += relativedelta(months=1)
+        return result
+
+    @task
+    def csv_path(yyyymm):
+        from loaders.import_pv_train import source_path
+        return os.path.expanduser(source_path(yyyymm)[1])
+
+    @task_group
+    def backfill_month(yyyymm):
+        wait = FileSensor(
+            task_id='wait_for_csv',
+            filepath=csv_path(yyyymm),
+            deferrable=True,
+            poke_interval=300,
+            timeout=timedelta(days=1).total_seconds(),
+        )
+        wait >> validate(yyyymm=yyyymm) >> load(yyyymm=yyyymm)
+
+    backfill_month.expand(yyyymm=months())
+
+
+transport_dag()
+pv_train_backfill()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark of DataPipe.load_db() over 1 to 8 parallel connections.
+
+Synthetic rows are prepared in memory up front, so that only the load is
+timed, then loaded into a scratch copy of the table once per connection
+count. Needs mariadb, reached through DB_HOST, DB_USER, DB_PASS and
+DB_NAME like the loader. Results are appended to a jsonl file along with
+the git commit.
+
+Usage: python benchmarks/bench_parallel.py [--rows 1000000] [--atomic]
+'''
+
+import argparse
+import json
+import os
+import time
+
+from bench_pipeline import BENCH_DIR, git_commit
+from gen_pv_train import pv_train_blocks
+
+# bench_pipeline has put src on the path and set CONFIG_DIR
+from import_func import DataPipe, frame_to_rows  # noqa: E402
+from loaders import import_pv_train as loader  # noqa: E402
+
+RESULTS = os.path.join(BENCH_DIR, 'parallel_results.jsonl')
+CONNECTIONS = (1, 2, 4, 8)
+
+
+def prepare(rows: int, yyyymm: str):
+    '''Return synthetic rows as tuples for executemany()'''
+    return [row for df in pv_train_blocks(rows, yyyymm)
+            for row in frame_to_rows(loader.transform_pv_train(df))]
+
+
+def bench(sqlpipe: DataPipe, data: list, config_db: dict, batch_size: int,
+          yyyymm: str):
+    '''
+    Load the rows into an emptied scratch table once per connection count.
+
+    Returns
+    -------
+        dict of the seconds and rows/s of each connection count
+    '''
+    tbl = f'{sqlpipe.database}.{config_db['tbl']}'
+    result = {}
+    for parallel in CONNECTIONS:
+        with (sqlpipe.connection() as connection,
+              connection.cursor() as cursor):
+            cursor.execute(f'TRUNCATE TABLE {tbl};')
+
+        start = time.perf_counter()
+        sqlpipe.load_db({**config_db, 'parallel': parallel}, iter(data),
+                        batch_size=batch_size, yyyymm=yyyymm)
+        seconds = time.perf_counter() - start
+
+        result[str(parallel)] = {'seconds': seconds,
+                                 'rows_per_second': len(data) / seconds}
+        print(f'  {parallel} connections {seconds:8.2f}s '
+              f'{len(data) / seconds:>14,.0f} rows/s')
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000,
+                        help='rows loaded at each connection count')
+    parser.add_argument('--batch-size', type=int, default=50_000,
+                        help='rows per executemany() batch')
+    parser.add_argument('--atomic', action='store_true',
+                        help='load through a staging table')
+    parser.add_argument('--results', default=RESULTS,
+                        help='jsonl file the results are appended to')
+    args = parser.parse_args()
+
+    yyyymm = '202507'
+    config_db = loader.config_db_tbl
+    source = f'{os.environ['DB_NAME']}.{config_db['tbl']}'
+    config_db = {**config_db, 'tbl': f'{config_db['tbl']}_bench',
+                 'checkpoint': False, 'partition_exchange': False,
+                 'parallel_atomic': args.atomic}
+
+    sqlpipe = DataPipe(
+        hostname=os.environ['DB_HOST'],
+        username=os.environ['DB_USER'],
+        password=os.environ['DB_PASS'],
+        database=os.environ['DB_NAME'],
+        pool_size=max(CONNECTIONS) + 1
+    )
+    tbl = f'{sqlpipe.database}.{config_db['tbl']}'
+    with (sqlpipe.connection() as connection,
+          connection.cursor() as cursor):
+        cursor.execute(f'CREATE TABLE IF NOT EXISTS {tbl} LIKE {source};')
+
+    data = prepare(args.rows, yyyymm)
+    print(f'rows: {args.rows:,} batch_size: {args.batch_size:,} '
+          f'atomic: {args.atomic}')
+    try:
+        connections = bench(sqlpipe, data, config_db, args.batch_size,
+                            yyyymm)
+    finally:
+        with (sqlpipe.connection() as connection,
+              connection.cursor() as cursor):
+            cursor.execute(f'DROP TABLE IF EXISTS {tbl};')
+
+    result = {'commit': git_commit(), 'timestamp': time.time(),
+              'rows': args.rows, 'batch_size': args.batch_size,
+              'atomic': args.atomic, 'connections': connections}
+    with open(args.results, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark of the pv_train pipeline stages on synthetic data.
+
+Each size is generated as a zip, then unzipped, parsed, transformed and
+loaded through the loader's own code path, with a SQLite database standing
+in for mariadb. Results are appended to a jsonl file along with the git
+commit, and compared against the last run of the same size so that
+regressions between commits show up.
+
+Usage: python benchmarks/bench_pipeline.py [--rows 100000 1000000 ...]
+'''
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import time
+from datetime import date
+from itertools import batched
+
+from gen_pv_train import CONFIG_DIR, generate
+
+# gen_pv_train has put src on the path, the loader reads its config on import
+os.environ.setdefault('CONFIG_DIR', CONFIG_DIR)
+import metrics  # noqa: E402
+from loaders import import_pv_train as loader  # noqa: E402
+from util import unzip_file  # noqa: E402
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS = os.path.join(BENCH_DIR, 'results.jsonl')
+SIZES = (100_000, 1_000_000, 10_000_000, 50_000_000)
+
+# slowdown against the last run that is reported as a regression
+THRESHOLD = 1.10
+
+sqlite3.register_adapter(date, date.isoformat)
+
+
+class SqliteSink:
+    '''
+    Create class standing in for DataPipe, loading into a SQLite database.
+
+    Parameters
+    ----------
+        db_path (str): SQLite database file
+    '''
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+
+    def load_db(self, config_db, data, batch_size=None, yyyymm=None,
+                source=None, stats=None):
+        '''
+        Insert the rows into the table in batches, like DataPipe.load_db().
+        '''
+        tbl = config_db['tbl']
+        cols = list(config_db['tbl_col'].values())
+        query = (f'INSERT INTO {tbl} ({', '.join(cols)}) '
+                 f'VALUES ({', '.join('?' * len(cols))})')
+
+        conn = sqlite3.connect(self.db_path)
+        try:
+            conn.execute(f'CREATE TABLE IF NOT EXISTS {tbl} '
+                         f'({', '.join(cols)})')
+            count = 0
+            for batch in batched(data, batch_size or 250_000):
+                count += conn.executemany(query, batch).rowcount
+            conn.commit()
+        finally:
+            conn.close()
+
+        return count
+
+
+def git_commit():
+    '''Return the commit being benchmarked, marked if the tree is dirty'''
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=BENCH_DIR, text=True,
+                              capture_output=True).stdout.strip()
+
+    commit = git('rev-parse', '--short', 'HEAD') or 'unknown'
+    if git('status', '--porcelain', '--', '..'):
+        commit += '-dirty'
+
+    return commit
+
+
+def bench(rows: int, tmp_dir: str):
+    '''
+    Run every stage over a zip of the given number of rows.
+
+    Returns
+    -------
+        dict of the seconds, rows/s and bytes/s of each stage
+    '''
+    yyyymm = '202507'
+    name = f'transport_node_train_{yyyymm}'
+    # larger sizes spread over the months from yyyymm, loaded as one file
+    zip_path = generate(os.path.join(tmp_dir, f'{name}.zip'), rows, yyyymm)
+
+    # a fresh recorder per size, picked up by the loader
+    recorder = loader.recorder = metrics.Recorder()
+
+    csv_dir = os.path.join(tmp_dir, 'csv')
+    with recorder.stage('unzip') as counts:
+        unzip_file(zip_path, csv_dir, loader.logger)
+        counts['rows'] = rows
+        counts['bytes'] = os.path.getsize(os.path.join(csv_dir, f'{name}.csv'))
+
+    # keep the archive, quarantine, fingerprints and cache version in the
+    # temp dir, rollups are left out as they need mariadb
+    loader.config_pv_train = {
+        **loader.load_config(loader.YAML_FILE).config_pv_train,
+        'parquet_prefix': os.path.join(tmp_dir, 'parquet'),
+        'quarantine_prefix': os.path.join(tmp_dir, 'quarantine'),
+        'delta_prefix': os.path.join(tmp_dir, 'delta'),
+        'cache_version': os.path.join(tmp_dir, 'pv_train.version')
+    }
+    loader.config_rollup = None
+
+    sink = SqliteSink(os.path.join(tmp_dir, 'sink.db'))
+    loader.load_pv_train(os.path.join(csv_dir, f'{name}.csv'), sink, yyyymm)
+
+    return {
+        stage: {key: entry[key] for key in
+                ('seconds', 'rows_per_second', 'bytes_per_second')}
+        for stage, entry in recorder.summary()['stages'].items()
+    }
+
+
+def previous(rows: int, results: str):
+    '''Return the last recorded result for the given number of rows'''
+    if not os.path.exists(results):
+        return None
+
+    last = None
+    with open(results, encoding='utf-8') as f:
+        for line in f:
+            result = json.loads(line)
+            if result['rows'] == rows:
+                last = result
+
+    return last
+
+
+def report(result: dict, last: dict | None):
+    '''Print the stages of a result, compared against the last run'''
+    print(f'rows: {result['rows']:,} commit: {result['commit']}')
+    for stage, entry in result['stages'].items():
+        line = (f'  {stage:<16} {entry['seconds']:8.2f}s '
+                f'{entry['rows_per_second']:>14,.0f} rows/s')
+        before = last['stages'].get(stage) if last else None
+        if before and before['seconds']:
+            ratio = entry['seconds'] / before['seconds']
+            line += f'  {ratio:5.2f}x vs {last['commit']}'
+            if ratio > THRESHOLD:
+                line += '  REGRESSION'
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=SIZES[:2],
+                        help=f'sizes to run, up to {SIZES[-1]:,} rows')
+    parser.add_argument('--results', default=RESULTS,
+                        help='jsonl file the results are appended to')
+    args = parser.parse_args()
+
+    commit = git_commit()
+    for rows in args.rows:
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            stages = bench(rows, tmp_dir)
+
+        result = {'commit': commit, 'timestamp': time.time(), 'rows': rows,
+                  'stages': stages}
+        report(result, previous(rows, args.results))
+
+        with open(args.results, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+
+'''
+Benchmark of the pv_train transform and row marshalling.
+
+Compares the previous per-row path (apply() on YEAR_MONTH and tuples built
+from df.to_numpy()) against the vectorized path used by the loader.
+
+Usage: python benchmarks/bench_transform.py [--rows 5000000]
+'''
+
+import argparse
+import os
+import tempfile
+import time
+from collections import deque
+
+import pandas as pd
+
+from gen_pv_train import CONFIG_DIR, generate
+
+# gen_pv_train has put src on the path
+from import_func import frame_to_rows  # noqa: E402
+from util import load_config  # noqa: E402
+
+
+def legacy(df: pd.DataFrame):
+    '''Previous transform: apply() per row and an object copy of the frame'''
+    df.loc[:, 'YEAR_MONTH'] = df['YEAR_MONTH'].apply(lambda x: x + '-01')
+    return (tuple(row) for row in df.to_numpy())
+
+
+def vectorized(df: pd.DataFrame):
+    '''Current transform: to_datetime() and column wise row marshalling'''
+    df['YEAR_MONTH'] = pd.to_datetime(df['YEAR_MONTH'], format='%Y-%m')
+    return frame_to_rows(df)
+
+
+def timed(func, df: pd.DataFrame):
+    '''Time a transform, including the iteration over its rows'''
+    start = time.perf_counter()
+    # drain the rows the same way executemany() would
+    deque(func(df), maxlen=0)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=5_000_000)
+    args = parser.parse_args()
+
+    os.environ.setdefault('CONFIG_DIR', CONFIG_DIR)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        csv_path = os.path.join(tmp_dir, 'transport_node_train_202507.csv')
+        generate(csv_path, args.rows)
+        col_pd = load_config('lta_pv_train.yaml').config_pv_train.col_pd
+        df = pd.read_csv(csv_path, dtype=col_pd)
+
+    t_legacy = timed(legacy, df.copy())
+    t_vector = timed(vectorized, df.copy())
+
+    print(f'rows:       {args.rows}')
+    print(f'legacy:     {t_legacy:.2f}s ({args.rows / t_legacy:,.0f} rows/s)')
+    print(f'vectorized: {t_vector:.2f}s ({args.rows / t_vector:,.0f} rows/s)')
+    print(f'speedup:    {t_legacy / t_vector:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+
+'''
+Generator of synthetic pv_train csv and zip files for the benchmarks.
+
+The columns are those of col_pd in lta_pv_train.yaml, with realistic
+stations, day types and tap volumes. Each row has its own natural key, a
+month holding at most one row per station, day type and hour, so larger
+sizes are spread over consecutive months. Rows are written a block at a
+time, so files of tens of millions of rows are generated in constant
+memory.
+
+Usage: python benchmarks/gen_pv_train.py --rows 1000000 --out /tmp/pv.zip
+'''
+
+import argparse
+import io
+import os
+import sys
+import zipfile
+from contextlib import contextmanager
+from itertools import cycle
+
+import numpy as np
+import pandas as pd
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', 'src')
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', 'config')
+sys.path.insert(0, SRC_DIR)
+
+from util import load_config  # noqa: E402
+
+BLOCK_ROWS = 1_000_000
+
+# mrt and lrt lines, and the number of stations generated on each
+LINES = {'NS': 28, 'EW': 33, 'CG': 2, 'NE': 17, 'CC': 29, 'CE': 2, 'DT': 37,
+         'TE': 29, 'BP': 14, 'SW': 8, 'SE': 5, 'PW': 7, 'PE': 7}
+CODES = [f'{line}{i}' for line, count in LINES.items()
+         for i in range(1, count + 1)]
+DAY_TYPES = np.array(['WEEKDAY', 'WEEKENDS/HOLIDAY'])
+HOURS = 24
+
+# larger sizes are spread over at most this many months, beyond which
+# stations are added to each month, keeping within the dates pandas handles
+MAX_MONTHS = 120
+
+
+def station_codes(count: int):
+    '''
+    Return the codes of count stations, the real stations first, then
+    stations numbered on from the end of each line.
+    '''
+    extra = [f'{line}{LINES[line] + 1 + i // len(LINES)}'
+             for i, line in zip(range(count - len(CODES)),
+                                cycle(LINES))]
+
+    return np.array(CODES + extra)
+
+
+def layout(rows: int, yyyymm: str):
+    '''
+    Return the months the rows are spread over and the station codes of
+    each month, so that every row can be given its own natural key.
+
+    Parameters
+    ----------
+        rows (int): rows to generate
+        yyyymm (str): first month of the rows
+    '''
+    per_station = len(DAY_TYPES) * HOURS
+    count = min(-(-rows // (per_station * len(CODES))), MAX_MONTHS)
+    months = pd.period_range(f'{yyyymm[:4]}-{yyyymm[4:]}',
+                             periods=max(count, 1), freq='M')
+    per_month = -(-rows // len(months))
+
+    return (list(months.strftime('%Y%m')),
+            station_codes(max(-(-per_month // per_station), len(CODES))))
+
+
+def pv_train_block(rng: np.random.Generator, keys: np.ndarray, yyyymm: str,
+                   codes: np.ndarray):
+    '''
+    Return a dataframe of synthetic pv_train rows.
+
+    Parameters
+    ----------
+        rng (np.random.Generator): random generator
+        keys (np.ndarray): natural key of each row, numbered by station,
+            day type then hour
+        yyyymm (str): month of the rows
+        codes (np.ndarray): station codes the keys are numbered over
+    '''
+    hours = keys % HOURS
+    # busier in the morning and evening peaks, quiet overnight
+    peak = np.where(np.isin(hours, (7, 8, 9, 17, 18, 19)), 20_000, 4_000)
+    peak = np.where(hours < 5, 50, peak)
+
+    df = pd.DataFrame({
+        'YEAR_MONTH': f'{yyyymm[:4]}-{yyyymm[4:]}',
+        'DAY_TYPE': DAY_TYPES[keys // HOURS % len(DAY_TYPES)],
+        'TIME_PER_HOUR': hours,
+        'PT_TYPE': 'TRAIN',
+        'PT_CODE': codes[keys // (HOURS * len(DAY_TYPES))],
+        'TOTAL_TAP_IN_VOLUME': rng.integers(0, peak),
+        'TOTAL_TAP_OUT_VOLUME': rng.integers(0, peak)
+    })
+
+    # same columns, in the same order, as the files published by lta
+    col_pd = load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    return df[list(col_pd)]
+
+
+def pv_train_blocks(rows: int, yyyymm: str = '202507', seed: int = 0):
+    '''
+    Yield dataframes of synthetic pv_train rows, at most BLOCK_ROWS each,
+    the rows shared out evenly over the months of layout().
+
+    Parameters
+    ----------
+        rows (int): rows to generate
+        yyyymm (str): first month of the rows
+        seed (int): seed of the random generator
+    '''
+    rng = np.random.default_rng(seed)
+    months, codes = layout(rows, yyyymm)
+    keys = len(codes) * len(DAY_TYPES) * HOURS
+
+    for i, month in enumerate(months):
+        count = rows * (i + 1) // len(months) - rows * i // len(months)
+        # a sample of the month's keys, in key order like the lta files
+        sample = np.sort(rng.choice(keys, count, replace=False))
+        for start in range(0, count, BLOCK_ROWS):
+            yield pv_train_block(rng, sample[start:start + BLOCK_ROWS],
+                                 month, codes)
+
+
+@contextmanager
+def open_output(path: str, member: str | None = None):
+    '''
+    Open the csv file to write to, or the csv member of a zip file when
+    path ends in .zip.
+    '''
+    if not path.endswith('.zip'):
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            yield f
+        return
+
+    member = member or os.path.basename(path)[:-len('.zip')] + '.csv'
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zip_obj:
+        # force_zip64 as the size of the member is not known up front
+        with zip_obj.open(member, 'w', force_zip64=True) as raw:
+            f = io.TextIOWrapper(raw, encoding='utf-8', newline='')
+            yield f
+            # flush, and leave closing the member to the zip file
+            f.flush()
+            f.detach()
+
+
+def generate(path: str, rows: int, yyyymm: str = '202507',
+             member: str | None = None, seed: int = 0):
+    '''
+    Write a synthetic pv_train csv, or a zip holding it, a block at a time.
+
+    Parameters
+    ----------
+        path (str): csv file to write, or zip file if it ends in .zip
+        rows (int): rows to write
+        yyyymm (str): first month of the rows
+        member (str): name of the csv within the zip, defaults to the name
+            of the zip
+        seed (int): seed of the random generator
+    '''
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    with open_output(path, member) as f:
+        for i, block in enumerate(pv_train_blocks(rows, yyyymm, seed)):
+            block.to_csv(f, index=False, header=i == 0)
+
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--yyyymm', default='202507')
+    parser.add_argument('--out', required=True,
+                        help='csv file to write, or zip if it ends in .zip')
+    args = parser.parse_args()
+
+    os.environ.setdefault('CONFIG_DIR', CONFIG_DIR)
+    print(generate(args.out, args.rows, args.yyyymm))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+'''Columnar archive of the loaded data as a partitioned parquet dataset'''
+
+import os
+import shutil
+from contextlib import contextmanager
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# string columns are dictionary encoded, both in the parquet files and when
+# read back (as pandas categoricals), as they hold few distinct values
+ARROW_TYPES = {
+    'str': pa.dictionary(pa.int32(), pa.string()),
+    'string': pa.dictionary(pa.int32(), pa.string()),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'bool': pa.bool_(),
+    'float32': pa.float32(),
+    'float64': pa.float64(),
+    'int8': pa.int8(),
+    'int16': pa.int16(),
+    'int32': pa.int32(),
+    'int64': pa.int64(),
+    'Int64': pa.int64()
+}
+
+
+class ParquetArchive:
+    '''
+    Create class to archive data into a hive partitioned parquet dataset,
+    one partition directory per month, e.g. year_month=2025-07. Files are
+    zstd compressed and only the columns and months asked for are read back.
+
+    Parameters
+    ----------
+        root (str): directory of the dataset
+        col_pd (dict): pandas dtype of each column, as in col_pd
+        partition (str): column the dataset is partitioned on
+        compression (str): parquet compression codec
+    '''
+    def __init__(self, root: str, col_pd: dict, partition: str = 'year_month',
+                 compression: str = 'zstd'):
+        self.root = os.path.expanduser(root)
+        self.partition = partition
+        self.compression = compression
+        # the partition column is held in the directory name, not the files
+        self.schema = pa.schema([(col, ARROW_TYPES[dtype])
+                                 for col, dtype in col_pd.items()
+                                 if col != partition])
+
+    def partition_dir(self, yyyymm: str):
+        '''
+        Return the directory holding a month, keyed as YYYY-MM.
+        '''
+        return os.path.join(self.root,
+                            f'{self.partition}={yyyymm[:4]}-{yyyymm[4:]}')
+
+    @contextmanager
+    def writer(self, yyyymm: str):
+        '''
+        Context manager yielding a function that appends a dataframe to the
+        month's parquet file, one row group per dataframe. The month replaces
+        any earlier copy of it only once the block exits without error.
+
+        Parameters
+        ----------
+            yyyymm (str): month being written
+        '''
+        out_dir = self.partition_dir(yyyymm)
+        # under _tmp, which is skipped by readers of the dataset
+        tmp_dir = os.path.join(self.root, '_tmp', os.path.basename(out_dir))
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        string_cols = [field.name for field in self.schema
+                       if pa.types.is_dictionary(field.type)]
+        pq_writer = pq.ParquetWriter(os.path.join(tmp_dir, 'part-0.parquet'),
+                                     self.schema,
+                                     compression=self.compression,
+                                     use_dictionary=string_cols)
+
+        def write(df: pd.DataFrame):
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            pq_writer.write_table(table.select(self.schema.names)
+                                  .cast(self.schema))
+
+        try:
+            yield write
+            pq_writer.close()
+        except Exception:
+            pq_writer.close()
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        shutil.rmtree(out_dir, ignore_errors=True)
+        os.replace(tmp_dir, out_dir)
+
+    def read(self, columns: list | None = None, months: list | None = None):
+        '''
+        Read the archived data into a dataframe.
+
+        Parameters
+        ----------
+            columns (list): columns to read, or None for all of them
+            months (list): months to read as YYYYMM, or None for all of them
+
+        Returns
+        -------
+            pd.DataFrame, with the partition column read as a categorical
+        '''
+        filters = None
+        if months is not None:
+            filters = [(self.partition, 'in',
+                        [f'{i[:4]}-{i[4:]}' for i in months])]
+
+        return pq.read_table(self.root, columns=columns, filters=filters,
+                             partitioning='hive').to_pandas()
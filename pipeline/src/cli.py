@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+'''Command line entry point of the pipeline'''
+
+import argparse
+import sys
+from datetime import date
+
+# only the standard library is imported here, each command imports what it
+# needs when it runs, so that --help and short tasks start quickly
+
+
+def cmd_fetch(args):
+    '''
+    Download the pv_train zip, or with --all every dataset in the registry.
+    '''
+    if args.all:
+        from lta.fetcher import DataMallFetcher
+        results = DataMallFetcher(args.date).run()
+        for name, zip_path in results.items():
+            print(f'{name}: {zip_path}')
+        return 0
+
+    import main
+    zip_path = main.fetch(args.date)
+    print(zip_path)
+
+    return 0
+
+
+def cmd_unzip(args):
+    '''
+    Unzip and archive the zip downloaded on the run date.
+    '''
+    import main
+    print(main.unzip(args.date))
+
+    return 0
+
+
+def cmd_load(args):
+    '''
+    Load the month's csv into mariadb.
+    '''
+    import main
+    main.load(args.date, args.zip)
+
+    return 0
+
+
+def cmd_upload(args):
+    '''
+    Upload the archived zips and the parquet archive to s3.
+    '''
+    import main
+    results = main.upload()
+    for path, status in results.items():
+        print(f'{status}: {path}')
+
+    return 0
+
+
+def cmd_run(args):
+    '''
+    Run fetch, unzip and load in sequence.
+    '''
+    import main
+    main.main(args.date)
+
+    return 0
+
+
+def build_parser():
+    '''
+    Build the argument parser with one subcommand per pipeline stage.
+    '''
+    parser = argparse.ArgumentParser(prog='pipeline',
+                                     description='LTA DataMall pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    commands = {
+        'fetch': (cmd_fetch, 'download the zip from LTA DataMall'),
+        'unzip': (cmd_unzip, 'unzip and archive the downloaded zip'),
+        'load': (cmd_load, 'load the csv into mariadb'),
+        'upload': (cmd_upload, 'upload the archives to s3'),
+        'run': (cmd_run, 'fetch, unzip and load'),
+    }
+    for name, (func, help_text) in commands.items():
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument('--date', type=date.fromisoformat,
+                         default=date.today(),
+                         help='run date as YYYY-MM-DD, defaults to today')
+        sub.set_defaults(func=func)
+
+    subparsers.choices['fetch'].add_argument(
+        '--all', action='store_true',
+        help='fetch every dataset in the registry concurrently')
+    subparsers.choices['load'].add_argument(
+        '--zip', default=None,
+        help='archived zip to stream the csv from')
+
+    return parser
+
+
+def cli(argv=None):
+    '''
+    Parse the command line and run the requested command.
+
+    Parameters
+    ----------
+        argv (list): arguments, defaults to sys.argv[1:]
+    '''
+    args = build_parser().parse_args(argv)
+
+    try:
+        return args.func(args)
+    finally:
+        import main
+        main.write_metrics()
+
+
+if __name__ == '__main__':
+    sys.exit(cli())
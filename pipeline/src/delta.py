@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+'''Row fingerprints of a loaded month, to load only what a new file changes'''
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from util import UDLogger
+
+# create logger
+ud_logger = UDLogger(filename='import.log', name=__name__)
+logger = ud_logger.create_logger()
+
+KEY_HASH = 'key_hash'
+ROW_HASH = 'row_hash'
+
+
+def fingerprint(df: pd.DataFrame, key_cols: list):
+    '''
+    Return the hash of the key columns and the hash of every column of each
+    row, hashed a column at a time.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): data to fingerprint
+        key_cols (list): columns identifying a row
+
+    Returns
+    -------
+        tuple of the key and row hashes as uint64 arrays
+    '''
+    key_hash = pd.util.hash_pandas_object(df[key_cols], index=False)
+    row_hash = pd.util.hash_pandas_object(df, index=False)
+
+    return key_hash.to_numpy(), row_hash.to_numpy()
+
+
+class Delta:
+    '''
+    Create class to compare chunks of a month against the fingerprints kept
+    from the last load of it, passing on only the rows that were inserted
+    or changed, and to work out the rows that were deleted. The keys and
+    fingerprints are kept in a parquet file per month, replaced by save()
+    once the month is loaded.
+
+    Parameters
+    ----------
+        path (str): parquet file of the month's fingerprints
+        key_cols (list): columns identifying a row
+    '''
+    def __init__(self, path: str, key_cols: list):
+        self.path = os.path.expanduser(path)
+        self.key_cols = list(key_cols)
+        self.counts = {'inserted': 0, 'changed': 0, 'unchanged': 0}
+        # fingerprints of the rows seen so far
+        self.seen = []
+
+        self.previous = None
+        if os.path.exists(self.path):
+            self.previous = pd.read_parquet(self.path)
+            logger.info(f'{self.previous.shape[0]} fingerprints read from '
+                        f'{self.path}.')
+            # row hash of each key, looked up by the chunks, keys not found
+            # (position -1) pick up the trailing 0
+            last = self.previous.drop_duplicates(KEY_HASH, keep='last')
+            self.index = pd.Index(last[KEY_HASH].to_numpy())
+            self.row_hash = np.append(last[ROW_HASH].to_numpy(), 0)
+
+    def __call__(self, df: pd.DataFrame):
+        '''
+        Return the rows of a chunk that are new or changed since the last
+        load.
+        '''
+        key_hash, row_hash = fingerprint(df, self.key_cols)
+        self.seen.append(df[self.key_cols].assign(
+            **{KEY_HASH: key_hash, ROW_HASH: row_hash}))
+
+        if self.previous is None:
+            self.counts['inserted'] += df.shape[0]
+            return df
+
+        pos = self.index.get_indexer(key_hash)
+        inserted = pos == -1
+        changed = ~inserted & (self.row_hash[pos] != row_hash)
+        self.counts['inserted'] += int(inserted.sum())
+        self.counts['changed'] += int(changed.sum())
+        self.counts['unchanged'] += int((~inserted & ~changed).sum())
+
+        return df[inserted | changed]
+
+    def deleted(self):
+        '''
+        Return the key columns of the rows of the last load that were not
+        seen in this one.
+        '''
+        if self.previous is None:
+            return pd.DataFrame(columns=self.key_cols)
+
+        seen = np.concatenate([i[KEY_HASH].to_numpy() for i in self.seen]) \
+            if self.seen else np.array([], dtype='uint64')
+        gone = ~np.isin(self.previous[KEY_HASH].to_numpy(), seen)
+
+        return self.previous.loc[gone, self.key_cols].reset_index(drop=True)
+
+    def save(self):
+        '''
+        Replace the month's fingerprints with those of the rows seen.
+        '''
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        fingerprints = pd.concat(self.seen, ignore_index=True) if self.seen \
+            else pd.DataFrame(columns=[*self.key_cols, KEY_HASH, ROW_HASH])
+
+        tmp_path = f'{self.path}.tmp'
+        fingerprints.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path)
+        logger.info(f'{fingerprints.shape[0]} fingerprints saved to '
+                    f'{self.path}.')
@@ -1,9 +1,24 @@
 #!/usr/bin/env python3
 
 '''Data Import Functions'''
+import atexit
 import os
-import mysql.connector
+import queue
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime as dt
+from contextlib import contextmanager, suppress
+from functools import partial
+from itertools import batched, islice
+
+import numpy as np
+import pandas as pd
+from dateutil.relativedelta import relativedelta
 from mysql.connector import Error
+from mysql.connector import pooling
+from mysql.connector.errors import PoolError
 from util import UDLogger
 
 # everytime the import.py executes, all new csv will be ingested into db
@@ -12,63 +27,905 @@ from util import UDLogger
 ud_logger = UDLogger(filename='import.log', name=__name__)
 logger = ud_logger.create_logger()
 
+# characters escaped in the tab separated LOAD DATA file, matched by the
+# statement, a backslash followed by any other character reads as that
+# character
+INFILE_ESCAPES = str.maketrans({'\\': '\\\\', '\t': '\\\t',
+                                '\n': '\\\n'})
+
+# server or client refusing LOAD DATA LOCAL INFILE, load falls back to
+# executemany() when any of these are raised
+INFILE_REFUSED = (1148, 2068, 3948)
+
+# default pool size, overridden by DB_POOL_SIZE or the pool_size argument
+POOL_SIZE = 5
+
+# most keys matched by one DELETE, keeping it well within max_allowed_packet
+DELETE_BATCH = 10_000
+
+
+def infile_field(value):
+    '''
+    Return a value as written to the LOAD DATA file, missing values (None,
+    NaN, NaT or pd.NA) as \\N so that they are loaded as NULL.
+    '''
+    # a missing float or date is the only value not equal to itself
+    if value is None or value is pd.NA or value != value:
+        return '\\N'
+
+    return str(value).translate(INFILE_ESCAPES)
+
+
+def frame_to_rows(df: pd.DataFrame):
+    '''
+    Lazily yield the rows of a dataframe as tuples of python values for
+    executemany(), built column by column instead of through an object
+    dtype copy of the whole frame.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): data to be inserted, in table column order
+    '''
+    cols = []
+    for _, col in df.items():
+        if pd.api.types.is_datetime64_any_dtype(col):
+            # convert each distinct date once and broadcast it back out,
+            # missing values (code -1) pick up the trailing None
+            codes, uniques = pd.factorize(col)
+            dates = np.append(uniques.date, None).astype(object)
+            cols.append(dates[codes].tolist())
+        else:
+            cols.append(col.tolist())
+
+    return zip(*cols)
+
+
+def _partition_defs(pieces: list):
+    '''
+    Return the definitions of RANGE partitions on year_month from their
+    names and upper bounds, None being MAXVALUE.
+    '''
+    return ', '.join(
+        f'PARTITION {name} VALUES LESS THAN '
+        f"({'MAXVALUE' if upper is None else f"'{upper:%Y-%m-%d}'"})"
+        for name, upper in pieces
+    )
+
+
+class Checkpoint:
+    '''
+    Create class for the row offset of a month committed so far to a table,
+    kept in the etl_checkpoint table and written in the transaction of the
+    batch it records.
+
+    Parameters
+    ----------
+        database (str): database holding etl_checkpoint
+        tbl (str): table being loaded
+        yyyymm (str): month being loaded
+        source (str): identifies the data loaded, or None
+    '''
+    def __init__(self, database: str, tbl: str, yyyymm: str,
+                 source: str | None = None):
+        self.table = f'{database}.etl_checkpoint'
+        self.key = (tbl, yyyymm)
+        self.source = source
+        self.offset = 0
+
+    def read(self, cursor):
+        '''
+        Return the rows committed by an earlier load of the same data, or 0.
+        Without a source the data cannot be told apart from other data of
+        the month, so the load starts over.
+        '''
+        if self.source is None:
+            return self.offset
+
+        cursor.execute(
+            f'SELECT `batch_offset`, `source` FROM {self.table} '
+            'WHERE `tbl` = %s AND `year_month` = %s;', self.key
+        )
+        row = cursor.fetchone()
+        if row is not None and row[1] == self.source:
+            self.offset = row[0]
+            logger.info(f'{self.key[0]} {self.key[1]} resuming from row '
+                        f'{self.offset}.')
+
+        return self.offset
+
+    def advance(self, cursor, rows: int):
+        '''
+        Record a batch of rows as loaded, committed with the batch.
+        '''
+        self.offset += rows
+        cursor.execute(
+            f'REPLACE INTO {self.table} '
+            '(`tbl`, `year_month`, `batch_offset`, `source`, `updated_at`) '
+            'VALUES (%s, %s, %s, %s, %s);',
+            (*self.key, self.offset, self.source, dt.now())
+        )
+
+    def clear(self, cursor):
+        '''
+        Remove the checkpoint of a month loaded in full.
+        '''
+        cursor.execute(
+            f'DELETE FROM {self.table} '
+            'WHERE `tbl` = %s AND `year_month` = %s;', self.key
+        )
+
 
 class DataPipe:
     '''
     Create class to perform data import into systems
+
+    Connections are checked out of a pool shared by every DataPipe in the
+    process with the same target, so loaders in one run reuse warm
+    connections. Pools are closed by DataPipe.close_pools(), which is also
+    registered to run at exit.
+
+    Parameters
+    ----------
+        pool_size (int): connections held by the pool, defaults to the
+            DB_POOL_SIZE environment variable or POOL_SIZE
     '''
-    def __init__(self, hostname, username, password, database):
+    # pools keyed by (hostname, username, database, local_infile), created
+    # under the lock as shard threads can ask for a pool at the same time
+    _pools = {}
+    _pools_lock = threading.Lock()
+    _pools_created = 0
+
+    def __init__(self, hostname, username, password, database,
+                 pool_size: int | None = None):
         self.hostname = hostname
         self.username = username
         self.password = password
         self.database = database
+        self.pool_size = pool_size or int(os.getenv('DB_POOL_SIZE',
+                                                    POOL_SIZE))
+        self.infile_refused = False
+
+    def get_pool(self, local_infile: bool = False):
+        '''
+        Return the connection pool for this target, creating it on first use.
+        A DataPipe joining a pool created by another takes on its size.
+
+        Parameters
+        ----------
+            local_infile: allow LOAD DATA LOCAL INFILE from the temp dir
+        '''
+        key = (self.hostname, self.username, self.database, local_infile)
+        with DataPipe._pools_lock:
+            pool = DataPipe._pools.get(key)
+            if pool is None:
+                pool = self._create_pool(local_infile)
+                DataPipe._pools[key] = pool
+
+        self.pool_size = pool.pool_size
+
+        return pool
+
+    def _create_pool(self, local_infile: bool):
+        '''
+        Create a connection pool, named uniquely within the process.
+        '''
+        kwargs = {}
+        if local_infile:
+            kwargs['allow_local_infile_in_path'] = tempfile.gettempdir()
+
+        DataPipe._pools_created += 1
+        pool = pooling.MySQLConnectionPool(
+            pool_name=f'datapipe_{DataPipe._pools_created}',
+            pool_size=self.pool_size,
+            host=self.hostname,
+            user=self.username,
+            password=self.password,
+            database=self.database,
+            **kwargs
+        )
+        logger.info(f'Connection pool to mariadb {self.database} created '
+                    f'with {self.pool_size} connections.')
+
+        return pool
+
+    def create_connection(self, local_infile: bool = False,
+                          timeout: float = 30):
+        '''
+        Check out a connection from the pool. The pool pings the connection
+        and reconnects it if it has gone stale. Closing the connection
+        returns it to the pool.
+
+        Parameters
+        ----------
+            local_infile: allow LOAD DATA LOCAL INFILE from the temp dir
+            timeout: seconds to wait for a free connection
+        '''
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                return self.get_pool(local_infile).get_connection()
+            except PoolError as e:
+                # pool exhausted, wait for a connection to be returned
+                if time.monotonic() >= deadline:
+                    logger.error(f'The error {e} occurred.')
+                    raise
+                time.sleep(0.1)
+            except Error as e:
+                logger.error(f'The error {e} occurred.')
+                raise
+
+    @contextmanager
+    def connection(self, local_infile: bool = False):
+        '''
+        Context manager that checks out a pooled connection, rolls back on
+        error and always returns the connection to the pool.
+
+        Parameters
+        ----------
+            local_infile: allow LOAD DATA LOCAL INFILE from the temp dir
+        '''
+        connection = self.create_connection(local_infile)
+        try:
+            yield connection
+        except Exception:
+            # a lost connection cannot be rolled back, keep the first error
+            with suppress(Error):
+                connection.rollback()
+            raise
+        finally:
+            connection.close()
+
+    @classmethod
+    def close_pools(cls):
+        '''
+        Disconnect every pooled connection and drop the pools.
+        '''
+        with cls._pools_lock:
+            for pool in cls._pools.values():
+                pool._remove_connections()
+            cls._pools.clear()
 
-    def create_connection(self):
+    def query(self, stmt: str, params=None):
         '''
-        Initiate SQL connector
+        Run a SELECT statement and return its result as a dataframe.
+
+        Parameters
+        ----------
+            stmt (str): statement, with %s placeholders
+            params: values of the placeholders
         '''
-        connection = None
         try:
-            connection = mysql.connector.connect(
-                host=self.hostname,
-                user=self.username,
-                password=self.password,
-                database=self.database
-            )
-            logger.info(f'Connection to mariadb {self.database} successful.')
+            with (self.connection() as connection,
+                  connection.cursor() as cursor):
+                cursor.execute(stmt, params)
+                return pd.DataFrame(cursor.fetchall(),
+                                    columns=cursor.column_names)
         except Error as e:
             logger.error(f'The error {e} occurred.')
             raise
 
-        return connection
-
-    def load_db(self, config_db, data):
+    def load_db(self, config_db, data, batch_size: int | None = None,
+                yyyymm: str | None = None, source: str | None = None,
+                stats: dict | None = None):
         '''
         Function that loads data from source to database table
 
         Parameters
         ----------
-            config_db: config for database
-            data: data to be inserted organized into a list of tuples
+            config_db: config for database, load_mode selects 'executemany'
+                (default), 'infile' for LOAD DATA LOCAL INFILE or 'upsert'
+                for INSERT ... ON DUPLICATE KEY UPDATE on key_col,
+                partition_exchange loads the month into a staging table
+                that is swapped in for the month's partition, and
+                checkpoint commits each batch along with the offset reached
+                so that a failed load resumes from the first uncommitted
+                batch, and parallel splits the batches over that many
+                connections, see _load_parallel()
+            data: data to be inserted organized into an iterable of tuples
+            batch_size: rows sent per statement, or None to send all rows
+                in a single statement
+            yyyymm: month being loaded, required for partition_exchange and
+                checkpoint
+            source: identifies the data loaded, e.g. its sha256, a
+                checkpoint left by other data is not resumed from
+            stats: if given, 'skipped' is set in it to the rows skipped on
+                resuming from a checkpoint, which are not sent again
         '''
-        connection = self.create_connection()
+        self._check_load_args(config_db, batch_size, yyyymm)
+        if config_db.get('parallel', 1) > 1:
+            return self._load_parallel(config_db, data, batch_size, yyyymm)
+
+        load_mode = config_db.get('load_mode', 'executemany')
+        exchange = config_db.get('partition_exchange', False)
 
-        # create the insert statement
         tbl = f'{self.database}.{config_db['tbl']}'
-        col_name_list = config_db['tbl_col'].values()
-        tbl_col_names = ', '.join(f'`{i}`' for i in col_name_list)
-        placeholders = ', '.join(['%s'] * len(col_name_list))
-        stmt = f'INSERT INTO {tbl} ({tbl_col_names}) VALUES ({placeholders});'
+        target = f'{tbl}_stg_{yyyymm}' if exchange else tbl
+        col_name_list = list(config_db['tbl_col'].values())
+        loader = self._select_loader(config_db)
+        checkpoint = None
+        if config_db.get('checkpoint', False):
+            checkpoint = Checkpoint(self.database, config_db['tbl'], yyyymm,
+                                    source)
 
         try:
-            cursor = connection.cursor()
-            cursor.executemany(stmt, data)
-            connection.commit()
+            with (self.connection(load_mode == 'infile') as connection,
+                  connection.cursor() as cursor):
+                offset = self._start_load(cursor, checkpoint, tbl, target)
+                if stats is not None:
+                    stats['skipped'] = offset
+
+                # rows are pulled lazily so that a streamed source is never
+                # held in memory as a whole, those committed before are
+                # skipped without being sent
+                rows = islice(data, offset, None) if offset else data
+                batches = [rows] if batch_size is None else \
+                    batched(rows, batch_size)
+                row_count = 0
+                for batch in batches:
+                    row_count += loader(cursor, target, col_name_list, batch)
+                    if checkpoint is not None:
+                        checkpoint.advance(cursor, len(batch))
+                        connection.commit()
+                if checkpoint is not None:
+                    checkpoint.clear(cursor)
+                connection.commit()
+
+                if exchange:
+                    self._exchange_partition(cursor, config_db['tbl'],
+                                             target, yyyymm)
             logger.info(f'Insert statement executed successfully for {tbl}.')
         except Error as e:
             logger.error(f'The error {e} occurred.')
             raise
 
+        return row_count
+
+    def delete_db(self, config_db, keys, batch_size: int | None = None):
+        '''
+        Function that deletes rows from a database table by their key_col
+        values, in a single transaction.
+
+        Parameters
+        ----------
+            config_db: config for database, with key_col
+            keys: key_col values of the rows to delete, as an iterable of
+                tuples in key_col order
+            batch_size: keys matched per statement, at most DELETE_BATCH,
+                which is also the default
+
+        Returns
+        -------
+            number of rows deleted
+        '''
+        tbl = f'{self.database}.{config_db['tbl']}'
+        key_col = config_db.get('key_col')
+        if not key_col:
+            err_msg = f'Error: deleting rows requires key_col: {tbl}'
+            logger.error(err_msg)
+            raise Exception(err_msg)
+
+        # each batch is a single statement matching its keys as a list of
+        # row values, rather than a round trip per key
+        cols = ', '.join(f'`{i}`' for i in key_col)
+        row = f'({', '.join(['%s'] * len(key_col))})'
+
+        try:
+            with (self.connection() as connection,
+                  connection.cursor() as cursor):
+                batch_size = min(batch_size or DELETE_BATCH, DELETE_BATCH)
+                row_count = 0
+                for batch in batched(keys, batch_size):
+                    cursor.execute(
+                        f'DELETE FROM {tbl} WHERE ({cols}) IN '
+                        f'({', '.join([row] * len(batch))});',
+                        [i for key in batch for i in key])
+                    row_count += cursor.rowcount
+                connection.commit()
+            logger.info(f'{row_count} rows deleted from {tbl}.')
+        except Error as e:
+            logger.error(f'The error {e} occurred.')
+            raise
+
+        return row_count
+
+    def _check_load_args(self, config_db, batch_size, yyyymm):
+        '''
+        Raise an exception if the options of the table need arguments that
+        were not given.
+        '''
+        tbl = config_db['tbl']
+        needs = {
+            'partition_exchange': yyyymm is None,
+            'checkpoint': yyyymm is None or batch_size is None,
+        }
+        for option, missing in needs.items():
+            if config_db.get(option, False) and missing:
+                err_msg = f'{option} requires yyyymm and batch_size: {tbl}'
+                logger.error(err_msg)
+                raise Exception(err_msg)
+
+        parallel = config_db.get('parallel', 1)
+        if parallel <= 1:
+            return
+
+        # the size of the pool joined, which may not be the one asked for
+        pool_size = self.get_pool(config_db.get('load_mode') == 'infile') \
+            .pool_size
+        conflict = config_db.get('checkpoint', False) or batch_size is None
+        if conflict or parallel > pool_size:
+            err_msg = (f'parallel {parallel} requires batch_size, no '
+                       f'checkpoint and pool_size >= parallel: {tbl}')
+            logger.error(err_msg)
+            raise Exception(err_msg)
+
+    def _load_parallel(self, config_db, data, batch_size, yyyymm):
+        '''
+        Load the batches over config_db['parallel'] pooled connections at
+        once, one shard per connection. Each shard is a transaction of its
+        own, committed once the batches run out. The first shard to fail
+        stops the batches being handed out, and the error of every shard
+        is reported.
+
+        With parallel_atomic, or partition_exchange, the shards load a
+        staging table, which only reaches the table once every shard has
+        succeeded and is dropped otherwise, so that either every row is
+        loaded or none is.
+        '''
+        shards = config_db['parallel']
+        tbl = f'{self.database}.{config_db['tbl']}'
+        exchange = config_db.get('partition_exchange', False)
+        staging = None
+        if exchange:
+            staging = f'{tbl}_stg_{yyyymm}'
+        elif config_db.get('parallel_atomic', False):
+            staging = f'{tbl}_par_{yyyymm or 'load'}'
+
+        with (self.connection() as connection,
+              connection.cursor() as cursor):
+            if exchange:
+                self._create_staging(cursor, tbl, staging)
+            elif staging:
+                cursor.execute(f'DROP TABLE IF EXISTS {staging};')
+                cursor.execute(f'CREATE TABLE {staging} LIKE {tbl};')
+
+        results, source_error = self._run_shards(
+            config_db, staging or tbl, batched(data, batch_size), shards)
+        failed = {f'shard {i}': r['error'] for i, r in enumerate(results)
+                  if r['error']}
+        if source_error is not None:
+            failed['source'] = source_error
+        if failed:
+            rolled_back = staging or source_error is not None
+            self._fail_shards(tbl, staging, results, failed, rolled_back)
+
+        with (self.connection() as connection,
+              connection.cursor() as cursor):
+            if exchange:
+                self._exchange_partition(cursor, config_db['tbl'], staging,
+                                         yyyymm)
+            elif staging:
+                self._publish_staging(cursor, config_db, staging)
+                connection.commit()
+
+        row_count = sum(r['rows'] for r in results)
+        logger.info(f'{row_count} rows loaded into {tbl} over {shards} '
+                    f'shards, {[r['rows'] for r in results]} rows each.')
+
+        return row_count
+
+    def _run_shards(self, config_db, target, batches, shards):
+        '''
+        Hand the batches out to the shards through a bounded queue, and
+        return the rows loaded and the error, if any, of each shard, along
+        with the error raised reading the source, if any. A source that
+        fails makes every shard roll back rather than commit.
+        '''
+        local_infile = config_db.get('load_mode') == 'infile'
+        load = partial(self._select_loader(config_db), tbl=target,
+                       col_name_list=list(config_db['tbl_col'].values()))
+
+        work = queue.Queue(maxsize=shards * 2)
+        abort, rollback = threading.Event(), threading.Event()
+        results = [{'rows': 0, 'error': None} for _ in range(shards)]
+        source_error = None
+
+        with ThreadPoolExecutor(max_workers=shards) as executor:
+            for result in results:
+                executor.submit(self._shard, load, local_infile, work,
+                                (abort, rollback), result)
+            try:
+                # the source is read on this thread only
+                for batch in batches:
+                    if abort.is_set():
+                        break
+                    work.put(batch)
+            except Exception as e:
+                # set before the shards are told to stop, so that none of
+                # them commits
+                source_error = e
+                rollback.set()
+            finally:
+                for _ in range(shards):
+                    work.put(None)
+
+        return results, source_error
+
+    def _shard(self, load, local_infile, work, events, result):
+        '''
+        Load the batches taken off the work queue over one connection, until
+        a None is taken, then commit them, or roll them back if the source
+        failed.
+        '''
+        abort, rollback = events
+        try:
+            with (self.connection(local_infile) as connection,
+                  connection.cursor() as cursor):
+                while (batch := work.get()) is not None:
+                    if not abort.is_set():
+                        result['rows'] += load(cursor, rows=batch)
+                if rollback.is_set():
+                    connection.rollback()
+                    result['rows'] = 0
+                else:
+                    connection.commit()
+        except Exception as e:
+            result['error'] = e
+            abort.set()
+            # take batches off the queue until told to stop, so the producer
+            # is never left blocked
+            while work.get() is not None:
+                pass
+
+    def _fail_shards(self, tbl, staging, results, failed, rolled_back):
+        '''
+        Drop the staging table of a failed load and raise an exception
+        reporting each failed shard, and the source if it failed.
+        '''
+        if staging:
+            with (self.connection() as connection,
+                  connection.cursor() as cursor):
+                cursor.execute(f'DROP TABLE IF EXISTS {staging};')
+
+        outcome = 'nothing was loaded'
+        if not rolled_back:
+            outcome = (f'{sum(r['rows'] for r in results)} rows were '
+                       'committed by the other shards')
+
+        errors = '; '.join(f'{name}: {e}' for name, e in failed.items())
+        err_msg = (f'Error: loading {tbl} over {len(results)} shards '
+                   f'failed, {outcome}: {errors}')
+        logger.error(err_msg)
+        raise Exception(err_msg)
+
+    def _publish_staging(self, cursor, config_db, staging):
+        '''
+        Copy the rows of a staging table into the table in one statement,
+        upserting in upsert mode, then drop the staging table.
+        '''
+        tbl = f'{self.database}.{config_db['tbl']}'
+        cols = ', '.join(f'`{i}`' for i in config_db['tbl_col'].values())
+        stmt = f'INSERT INTO {tbl} ({cols}) SELECT {cols} FROM {staging}'
+
+        key_col = config_db.get('key_col') or ()
+        if config_db.get('load_mode') == 'upsert':
+            updates = ', '.join(f'`{i}` = VALUES(`{i}`)'
+                                for i in config_db['tbl_col'].values()
+                                if i not in key_col)
+            stmt = f'{stmt} ON DUPLICATE KEY UPDATE {updates}'
+
+        cursor.execute(f'{stmt};')
+        cursor.execute(f'DROP TABLE {staging};')
+        logger.info(f'Staging table {staging} published to {tbl}.')
+
+    def _start_load(self, cursor, checkpoint, tbl, target):
+        '''
+        Return the rows committed by an earlier load to resume after, and
+        create the staging table when loading into one afresh.
+        '''
+        offset = checkpoint.read(cursor) if checkpoint else 0
+        if target != tbl and offset == 0:
+            self._create_staging(cursor, tbl, target)
+
+        return offset
+
+    def _create_staging(self, cursor, tbl, staging):
+        '''
+        Create an empty, unpartitioned copy of a partitioned table.
+        '''
+        cursor.execute(f'DROP TABLE IF EXISTS {staging};')
+        cursor.execute(f'CREATE TABLE {staging} LIKE {tbl};')
+        cursor.execute(f'ALTER TABLE {staging} REMOVE PARTITIONING;')
+
+    def partitions(self, cursor, tbl):
+        '''
+        Return the RANGE partitions of a table partitioned on year_month, in
+        order, as (name, lower, upper) with the bounds as datetimes, or None
+        where there is no bound.
+
+        Parameters
+        ----------
+            cursor: cursor of an open connection
+            tbl: table name, without the database
+        '''
+        cursor.execute(
+            'SELECT PARTITION_NAME, PARTITION_DESCRIPTION '
+            'FROM information_schema.PARTITIONS '
+            'WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s '
+            'ORDER BY PARTITION_ORDINAL_POSITION;',
+            (self.database, tbl)
+        )
+        result, lower = [], None
+        for name, description in cursor.fetchall():
+            upper = None if description == 'MAXVALUE' else \
+                dt.strptime(description.strip("'"), '%Y-%m-%d')
+            result.append((name, lower, upper))
+            lower = upper
+
+        return result
+
+    def ensure_partitions(self, cursor, tbl, yyyymm):
+        '''
+        Give the month a RANGE partition of its own, p<yyyymm>, holding that
+        month only, by splitting the partition it falls in with REORGANIZE
+        PARTITION, or adding it above the top partition of a table without
+        a MAXVALUE partition. Partitions are named after the first month
+        they hold, p_history and pmax being the lowest and highest.
+
+        Parameters
+        ----------
+            cursor: cursor of an open connection
+            tbl: table name, without the database
+            yyyymm: month being loaded
+
+        Returns
+        -------
+            name of the month's partition
+        '''
+        start = dt.strptime(yyyymm, '%Y%m')
+        end = start + relativedelta(months=1)
+        partitions = self.partitions(cursor, tbl)
+
+        containing = next((i for i in partitions
+                           if i[2] is None or i[2] > start), None)
+        if containing is None:
+            # above the top bound, a gap below the month gets a partition
+            # of its own so that p<yyyymm> only holds the month
+            top = partitions[-1][2] if partitions else None
+            pieces = [(f'p{yyyymm}', end)]
+            if top is not None and top < start:
+                pieces.insert(0, (f'p{top:%Y%m}', start))
+            cursor.execute(f'ALTER TABLE {self.database}.{tbl} ADD '
+                           f'PARTITION ({_partition_defs(pieces)});')
+            logger.info(f'Partition p{yyyymm} added to {tbl}.')
+        elif containing[1:] != (start, end):
+            self._split_partition(cursor, tbl, containing, start, end)
+
+        return self._check_month_partition(cursor, tbl, start, end)
+
+    def _split_partition(self, cursor, tbl, containing, start, end):
+        '''
+        Split a partition into the month, and what it holds below and above
+        the month.
+        '''
+        name, lower, upper = containing
+        pieces = []
+        if lower is None or lower < start:
+            pieces.append(('p_history' if lower is None else
+                           f'p{lower:%Y%m}', start))
+        pieces.append((f'p{start:%Y%m}', end))
+        if upper is None or upper > end:
+            pieces.append(('pmax' if upper is None else f'p{end:%Y%m}',
+                           upper))
+
+        cursor.execute(f'ALTER TABLE {self.database}.{tbl} REORGANIZE '
+                       f'PARTITION {name} INTO ({_partition_defs(pieces)});')
+        logger.info(f'Partition {name} of {tbl} split for p{start:%Y%m}.')
+
+    def _check_month_partition(self, cursor, tbl, start, end):
+        '''
+        Return the name of the partition holding exactly the month, raising
+        an exception if there is none, as exchanging it would then replace
+        the rows of other months.
+        '''
+        for name, lower, upper in self.partitions(cursor, tbl):
+            if (lower, upper) == (start, end):
+                return name
+
+        err_msg = (f'Error: {tbl} has no partition holding {start:%Y-%m} '
+                   'alone, it cannot be exchanged')
+        logger.error(err_msg)
+        raise Exception(err_msg)
+
+    def _exchange_partition(self, cursor, tbl, staging, yyyymm):
+        '''
+        Swap the loaded staging table in for the month's partition in one
+        metadata operation, then drop the staging table holding the rows
+        it replaced.
+        '''
+        partition = self.ensure_partitions(cursor, tbl, yyyymm)
+        cursor.execute(
+            f'ALTER TABLE {self.database}.{tbl} '
+            f'EXCHANGE PARTITION {partition} WITH TABLE {staging};'
+        )
+        cursor.execute(f'DROP TABLE {staging};')
+        logger.info(f'Partition {partition} of {tbl} exchanged.')
+
+    def _select_loader(self, config_db):
+        '''
+        Return the batch loader for the table's load_mode.
+
+        Parameters
+        ----------
+            config_db: config for database
+        '''
+        load_mode = config_db.get('load_mode', 'executemany')
+        tbl = config_db['tbl']
+
+        if load_mode == 'infile':
+            return self._load_infile
+
+        if load_mode == 'upsert':
+            key_col = config_db.get('key_col')
+            if not key_col:
+                err_msg = f'load_mode upsert requires key_col: {tbl}'
+                logger.error(err_msg)
+                raise Exception(err_msg)
+            update_col = [i for i in config_db['tbl_col'].values()
+                          if i not in key_col]
+            return partial(self._load_executemany, update_col=update_col)
+
+        return self._load_executemany
+
+    def _load_executemany(self, cursor, tbl, col_name_list, rows,
+                          update_col=()):
+        '''
+        Insert rows with a multi row INSERT built by executemany(). Rows
+        whose unique key already exists have update_col overwritten, which
+        leaves unchanged rows untouched.
+        '''
+        # create the insert statement
+        tbl_col_names = ', '.join(f'`{i}`' for i in col_name_list)
+        placeholders = ', '.join(['%s'] * len(col_name_list))
+        stmt = f'INSERT INTO {tbl} ({tbl_col_names}) VALUES ({placeholders})'
+
+        if update_col:
+            updates = ', '.join(f'`{i}` = VALUES(`{i}`)' for i in update_col)
+            stmt = f'{stmt} ON DUPLICATE KEY UPDATE {updates}'
+        stmt = f'{stmt};'
+
+        cursor.executemany(stmt, rows)
+
+        return cursor.rowcount
+
+    def _load_infile(self, cursor, tbl, col_name_list, rows):
+        '''
+        Write rows to a temporary tab separated file and bulk load it with
+        LOAD DATA LOCAL INFILE. Falls back to executemany() of the same
+        rows when the server or connector refuses local infile.
+        '''
+        if self.infile_refused:
+            return self._load_executemany(cursor, tbl, col_name_list, rows)
+
+        # kept for the fallback, batches are already tuples
+        if not isinstance(rows, (list, tuple)):
+            rows = list(rows)
+
+        tbl_col_names = ', '.join(f'`{i}`' for i in col_name_list)
+        stmt = (
+            f'LOAD DATA LOCAL INFILE %s INTO TABLE {tbl} '
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' "
+            "LINES TERMINATED BY '\\n' "
+            f'({tbl_col_names});'
+        )
+
+        with tempfile.NamedTemporaryFile('w', suffix='.tsv', newline='',
+                                         encoding='utf-8',
+                                         delete=False) as f:
+            f.writelines('\t'.join(map(infile_field, row)) + '\n'
+                         for row in rows)
+            infile = f.name
+
+        try:
+            cursor.execute(stmt, (infile,))
+            return cursor.rowcount
+        except Error as e:
+            if e.errno not in INFILE_REFUSED:
+                raise
+            logger.warning(f'LOAD DATA LOCAL INFILE refused ({e}), '
+                           'falling back to executemany().')
+            self.infile_refused = True
+            return self._load_executemany(cursor, tbl, col_name_list, rows)
+        finally:
+            os.remove(infile)
+
+
+class Dimensions:
+    '''
+    Create class to encode code columns as the small integer ids of their
+    dimension tables. Each table is read into memory once, codes are
+    resolved a column at a time over their distinct values, and codes not
+    seen before are inserted into the dimension table as they appear.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database holding the dimension tables
+        dims (dict): dataframe column mapped to the [table, code column] of
+            its dimension table
+    '''
+    def __init__(self, sqlpipe: DataPipe, dims: dict):
+        self.sqlpipe = sqlpipe
+        self.dims = dims
+        # code to id of each dimension, keyed by dataframe column
+        self.ids = {}
+
+    def fetch(self, tbl: str, code_col: str, codes: list | None = None):
+        '''
+        Return the ids of the given codes, or of every code, as a dict.
+        '''
+        stmt = f'SELECT `id`, `{code_col}` FROM {self.sqlpipe.database}.{tbl}'
+        if codes is not None:
+            placeholders = ', '.join(['%s'] * len(codes))
+            stmt += f' WHERE `{code_col}` IN ({placeholders})'
+
+        with (self.sqlpipe.connection() as connection,
+              connection.cursor() as cursor):
+            cursor.execute(f'{stmt};', codes)
+            return {code: id_ for id_, code in cursor.fetchall()}
+
+    def resolve(self, col: str, codes: list):
+        '''
+        Return the ids of the dimension of a column, inserting the codes
+        that are not in its table yet.
+
+        Parameters
+        ----------
+            col (str): dataframe column
+            codes (list): distinct codes to resolve
+        '''
+        tbl, code_col = self.dims[col]
+        if col not in self.ids:
+            self.ids[col] = self.fetch(tbl, code_col)
+        ids = self.ids[col]
+
+        missing = [i for i in codes if i not in ids]
+        if missing:
+            # INSERT IGNORE leaves codes added by a concurrent load alone
+            with (self.sqlpipe.connection() as connection,
+                  connection.cursor() as cursor):
+                cursor.executemany(
+                    f'INSERT IGNORE INTO {self.sqlpipe.database}.{tbl} '
+                    f'(`{code_col}`) VALUES (%s);',
+                    [(i,) for i in missing]
+                )
+                connection.commit()
+            ids.update(self.fetch(tbl, code_col, missing))
+            logger.info(f'{len(missing)} new codes added to {tbl}.')
+
+        return ids
+
+    def encode(self, df: pd.DataFrame):
+        '''
+        Replace the code columns of a dataframe with their ids.
+
+        Parameters
+        ----------
+            df (pd.DataFrame): data holding the code columns
+        '''
+        for col in self.dims:
+            codes, uniques = pd.factorize(df[col])
+            if (codes == -1).any():
+                err_msg = f'Error: {col} has missing values, it has no id'
+                logger.error(err_msg)
+                raise Exception(err_msg)
+
+            ids = self.resolve(col, uniques.tolist())
+            df[col] = np.array([ids[i] for i in uniques])[codes]
+
+        return df
+
+
+atexit.register(DataPipe.close_pools)
+
 
 if __name__ == '__main__':
 
@@ -3,56 +3,444 @@
 '''Imports pv_train data from csv into mariadb transport.r_pv_train'''
 
 import os
+import time
 
+from contextlib import contextmanager
+from contextlib import nullcontext
 from datetime import datetime as dt
 import pandas as pd
 from dateutil.relativedelta import relativedelta
 
+from archive import ParquetArchive
+from delta import Delta
 from util import load_config
+from validate import Quarantine
+from util import open_zip_member
 from util import UDLogger
 from import_func import DataPipe
+from import_func import Dimensions
+from import_func import frame_to_rows
+from manifest import Manifest
+from metrics import recorder
+from query_func import invalidate
+from query_func import version_file
+from rollup import refresh_rollups
 
 # create logger
 ud_logger = UDLogger(filename='import.log', name=__name__)
 logger = ud_logger.create_logger()
 
 YAML_FILE = 'lta_pv_train.yaml'
-config_pv_train = load_config(YAML_FILE)['config_pv_train']
-config_db_tbl = load_config(YAML_FILE)['config_db_tbl']
+config_pv_train = load_config(YAML_FILE).config_pv_train
+config_db_tbl = load_config(YAML_FILE).config_db_tbl
+config_fact_tbl = load_config(YAML_FILE).get('config_fact_tbl')
+config_rollup = load_config(YAML_FILE).get('config_rollup')
 
+# col_pd dtypes read as text and parsed by the transform
+NUMERIC_DTYPES = ('float32', 'float64', 'int8', 'int16', 'int32', 'int64',
+                  'Int64')
 
-def import_pv_train():
+
+def read_pv_train(file_path, chunksize: int | None = None):
     '''
-    Read in csv file and load into mariadb transport database.
+    Read in the pv_train csv file as an iterable of dataframes.
+
+    Parameters
+    ----------
+        file_path: path to the csv file, or a file object opened on it
+        chunksize (int): rows per dataframe, or None to read the whole file
+            into a single dataframe
     '''
-    logger.info(f'Run executing {__name__}')
+    # numeric columns are converted by transform_pv_train(), so that a value
+    # that does not parse reaches validation rather than failing the read
+    dtype = {col: 'str' if i in NUMERIC_DTYPES else i
+             for col, i in config_pv_train['col_pd'].items()}
+    try:
+        reader = pd.read_csv(file_path,
+                             delimiter=config_pv_train['delimiter'],
+                             dtype=dtype,
+                             chunksize=chunksize)
+    except Exception as e:
+        logger.error(f'The error {e} occurred.')
+        raise
 
-    # extract
-    # determine backfill logic
+    if chunksize is None:
+        return [reader]
+
+    return reader
+
+
+def transform_pv_train(df: pd.DataFrame):
+    '''
+    Apply the transformations required before loading into mariadb.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): pv_train data as read from the csv file
+    '''
+    # parse 'YYYY-MM' straight to the first day of the month in one pass,
+    # a month that does not parse is left missing for validation to reject
+    df['YEAR_MONTH'] = pd.to_datetime(df['YEAR_MONTH'], format='%Y-%m',
+                                      errors='coerce')
+
+    # likewise a blank or malformed number is left missing
+    for col, dtype in config_pv_train['col_pd'].items():
+        if dtype in NUMERIC_DTYPES:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+
+    return df
+
+
+def stream_rows(chunks, stats: dict, steps=()):
+    '''
+    Generator that transforms each chunk and yields its rows as tuples for
+    executemany(), so only one chunk is held in memory at any time.
+
+    Parameters
+    ----------
+        chunks: iterable of dataframes read from the csv file
+        stats (dict): running totals of rows and bytes, updated in place
+        steps: (stage, function) pairs applied in turn to each transformed
+            chunk, each returning the chunk to pass on
+    '''
+    # the reader parses lazily, so the time to fetch each chunk is read_csv,
+    # and its peak rss is measured over the same span
+    token = recorder.begin()
+    start = time.perf_counter()
+    try:
+        for idx, df in enumerate(chunks):
+            read_seconds = time.perf_counter() - start
+            read_peak = recorder.end(token)
+            with recorder.stage('transform') as metrics:
+                df = transform_pv_train(df)
+                rows = df.shape[0]
+                nbytes = int(df.memory_usage(index=False, deep=True).sum())
+                metrics.update(rows=rows, bytes=nbytes)
+            recorder.add('read_csv', read_seconds, rows, nbytes, read_peak)
+            logger.info(f'Chunk {idx}: {rows} rows, {nbytes} bytes')
+
+            for stage, func in steps:
+                with recorder.stage(stage) as metrics:
+                    df = func(df)
+                    metrics.update(rows=rows, bytes=nbytes)
+
+            stats['rows'] += df.shape[0]
+            stats['bytes'] += nbytes
+
+            yield from frame_to_rows(df)
+            token = recorder.begin()
+            start = time.perf_counter()
+    finally:
+        recorder.end(token)
+
+
+def open_source(file_path: str, zip_path: str | None = None,
+                binary: bool = False):
+    '''
+    Open the csv file, either decompressed from the zip as it is parsed, or
+    read from where it was extracted to.
+
+    Parameters
+    ----------
+        file_path (str): path to the extracted csv file, its name is also
+            the name of the csv within the zip
+        zip_path (str): zip file to stream the csv from, or None
+        binary (bool): open the extracted csv as a binary file object rather
+            than passing its path on to pandas
+    '''
+    if zip_path is not None:
+        return open_zip_member(zip_path, os.path.basename(file_path), logger)
+
+    if binary:
+        return open(os.path.expanduser(file_path), 'rb')
+
+    return nullcontext(file_path)
+
+
+@contextmanager
+def archive_writer(yyyymm: str):
+    '''
+    Context manager yielding a function that writes a transformed chunk to
+    the month's partition of the parquet archive and passes it on, or None
+    if parquet_prefix is not configured. The month is only published once
+    the block exits without error.
+
+    Parameters
+    ----------
+        yyyymm (str): month being loaded
+    '''
+    if not config_pv_train.get('parquet_prefix'):
+        yield None
+        return
+
+    # the archive uses the table's column names
+    tbl_col = config_db_tbl['tbl_col']
+    col_pd = {tbl_col[col]: dtype
+              for col, dtype in config_pv_train['col_pd'].items()}
+    archive = ParquetArchive(config_pv_train['parquet_prefix'], col_pd)
+
+    with archive.writer(yyyymm) as write:
+        def tee(df: pd.DataFrame):
+            write(df.rename(columns=tbl_col))
+            return df
+        yield tee
+
+
+def quarantine(yyyymm: str):
+    '''
+    Return a function that passes on the rows of a chunk meeting the rules
+    of the config, and writes the rest to the month's quarantine file, or
+    None if no rules are configured.
+
+    Parameters
+    ----------
+        yyyymm (str): month being loaded
+    '''
+    if not config_pv_train.get('rules'):
+        return None
+
+    return Quarantine(
+        f'{config_pv_train['quarantine_prefix']}/pv_train_{yyyymm}.csv',
+        config_pv_train['rules']
+    )
+
+
+def delta(yyyymm: str, config_db: dict):
+    '''
+    Return a function that passes on the rows of a chunk that are new or
+    changed since the month was last loaded, or None if delta_prefix is not
+    configured.
+
+    Parameters
+    ----------
+        yyyymm (str): month being loaded
+        config_db (dict): config of the table loaded, whose key_col
+            identifies a row
+    '''
+    if not config_pv_train.get('delta_prefix'):
+        return None
+
+    # the chunks still have the columns of the csv
+    csv_col = {tbl_col: col for col, tbl_col in config_db['tbl_col'].items()}
+
+    return Delta(
+        f'{config_pv_train['delta_prefix']}/pv_train_{yyyymm}.parquet',
+        [csv_col[i] for i in config_db['key_col']]
+    )
+
+
+def delete_removed(sqlpipe: DataPipe, config_db: dict, changes: Delta,
+                   encode=None):
+    '''
+    Delete the rows of the month's last load that are not in this one, then
+    keep the fingerprints of this load for the next.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database the rows are loaded into
+        config_db (dict): config of the table loaded
+        changes (Delta): fingerprints of the month
+        encode: function encoding the keys for the fact table, or None
+
+    Returns
+    -------
+        number of rows deleted
+    '''
+    removed = changes.deleted()
+    row_count = 0
+    if not removed.empty:
+        with recorder.stage('delete') as metrics:
+            if encode is not None:
+                removed = encode(removed)
+            row_count = sqlpipe.delete_db(config_db, frame_to_rows(removed),
+                                          config_pv_train.get('chunksize'))
+            metrics['rows'] = row_count
+    changes.save()
+
+    return row_count
+
+
+def fact_encoder(sqlpipe: DataPipe):
+    '''
+    Return a function that encodes a transformed chunk for the fact table,
+    replacing its codes with the ids of their dimension tables and the month
+    with its YYYYMM integer.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database holding the dimension tables
+    '''
+    dims = Dimensions(sqlpipe, config_fact_tbl['dims'])
+    yyyymm_col = config_fact_tbl.get('yyyymm_col')
+
+    def encode(df: pd.DataFrame):
+        df = dims.encode(df)
+        if yyyymm_col:
+            month = df[yyyymm_col].dt
+            df[yyyymm_col] = month.year * 100 + month.month
+        return df
+
+    return encode
+
+
+def load_pv_train(f, sqlpipe: DataPipe, yyyymm: str,
+                  source: str | None = None):
+    '''
+    Read, transform and load the csv file into mariadb.
+
+    Parameters
+    ----------
+        f: path to the csv file, or a file object opened on it
+        sqlpipe (DataPipe): database the rows are loaded into
+        yyyymm (str): month being loaded
+        source (str): sha256 of the csv file, so that a checkpoint is only
+            resumed from by a rerun over the same file
+
+    Returns
+    -------
+        dict of the rows loaded, rows quarantined, rows deleted and bytes
+        processed
+    '''
+    # chunksize streams the file through in fixed size pieces so that peak
+    # memory does not grow with the size of the month
+    chunksize = config_pv_train.get('chunksize')
+    chunks = read_pv_train(f, chunksize)
+
+    # the fact table holds ids in place of codes
+    config_db, encode = config_db_tbl, None
+    if config_pv_train.get('fact'):
+        config_db, encode = config_fact_tbl, fact_encoder(sqlpipe)
+
+    # transform, and convert each chunk into tuples for executemany(), each
+    # chunk is validated, written to the parquet archive and cut down to the
+    # rows changed since the last load, if these are configured
+    stats = {'rows': 0, 'bytes': 0}
+    check = quarantine(yyyymm)
+    changes = delta(yyyymm, config_db)
+    with archive_writer(yyyymm) as tee:
+        steps = [(stage, func) for stage, func in (('validate', check),
+                                                   ('archive_parquet', tee),
+                                                   ('delta', changes),
+                                                   ('encode', encode))
+                 if func is not None]
+        data = stream_rows(chunks, stats, steps)
+
+        # load_db pulls the chunks through read_csv, transform and the
+        # steps as it goes, so their time is taken off to leave the time
+        # spent in the database
+        stages = ('read_csv', 'transform', *(i for i, _ in steps))
+        upstream = recorder.seconds(*stages)
+        token = recorder.begin()
+        start = time.perf_counter()
+        loaded = {}
+        sqlpipe.load_db(config_db, data, batch_size=chunksize,
+                        yyyymm=yyyymm, source=source, stats=loaded)
+        elapsed = time.perf_counter() - start
+        upstream = recorder.seconds(*stages) - upstream
+        # rows committed by the load resumed from are not sent again
+        stats['rows'] -= loaded.get('skipped', 0)
+        recorder.add('load_db', elapsed - upstream,
+                     stats['rows'], stats['bytes'], recorder.end(token))
+
+    stats['deleted'] = 0
+    if changes is not None:
+        stats['deleted'] = delete_removed(sqlpipe, config_db, changes, encode)
+        logger.info(f'Delta for {yyyymm}: {changes.counts}, '
+                    f'{stats['deleted']} rows deleted')
+
+    # only the month just loaded is recomputed
+    if config_rollup:
+        with recorder.stage('rollup'):
+            refresh_rollups(sqlpipe, config_rollup, yyyymm)
+
+    # cached query results no longer hold the month
+    invalidate(version_file(config_pv_train), yyyymm)
+
+    stats['quarantined'] = check.count if check is not None else 0
+
+    return stats
+
+
+def source_path(yyyymm: str | None = None):
+    '''
+    Return the month to load and the path of its csv file. Without a month,
+    it is the one set by backfill, or else the previous month.
+
+    Parameters
+    ----------
+        yyyymm (str): month to load, overriding backfill
+    '''
     backfill = config_pv_train['backfill']
     csv_path = config_pv_train['csv_prefix'] + config_pv_train['csv_name']
-    logger.info(f'Run executing for backfill={backfill}')
 
-    if backfill is False:
+    if yyyymm is None and backfill is False:
         yyyymm = dt.strftime(dt.now() - relativedelta(months=1), '%Y%m')
-        file_path = f'{csv_path}_{yyyymm}.csv'
-    else:
+    elif yyyymm is None:
         yyyymm = config_pv_train['yyyymm']
-        file_path = f'{csv_path}_{yyyymm}.csv'
+    logger.info(f'Run executing for backfill={backfill}, month {yyyymm}')
 
-    try:
-        df = pd.read_csv(file_path,
-                         delimiter=config_pv_train['delimiter'],
-                         dtype=config_pv_train['col_pd'])
-    except Exception as e:
-        logger.error(f'The error {e} occurred.')
-        raise
+    return yyyymm, f'{csv_path}_{yyyymm}.csv'
+
+
+def check_pv_train(zip_path: str | None = None, yyyymm: str | None = None):
+    '''
+    Check that the month's csv can be opened and has the columns of col_pd,
+    before anything is loaded.
+
+    Parameters
+    ----------
+        zip_path (str): zip file to stream the csv from, or None to read the
+            csv extracted into csv_prefix
+        yyyymm (str): month to check, as for import_pv_train()
+
+    Returns
+    -------
+        path to the csv file checked
+    '''
+    yyyymm, file_path = source_path(yyyymm)
+
+    with open_source(file_path, zip_path) as f:
+        columns = pd.read_csv(f, delimiter=config_pv_train['delimiter'],
+                              nrows=0).columns.tolist()
+
+    expected = list(config_pv_train['col_pd'])
+    if columns != expected:
+        err_msg = (f'Error: {file_path} has columns {columns}, '
+                   f'expected {expected}')
+        logger.error(err_msg)
+        raise Exception(err_msg)
 
-    # transform
-    df.loc[:, 'YEAR_MONTH'] = df['YEAR_MONTH'].apply(lambda x: x + '-01')
+    logger.info(f'{file_path} checked for {yyyymm}.')
 
-    # convert dataframe into a list of tuples for executemany()
-    data = [tuple(row) for row in df.to_numpy()]
+    return file_path
+
+
+def import_pv_train(zip_path: str | None = None, yyyymm: str | None = None):
+    '''
+    Read in csv file and load into mariadb transport database.
+
+    Parameters
+    ----------
+        zip_path (str): zip file to stream the csv from, or None to read the
+            csv extracted into csv_prefix
+        yyyymm (str): month to load, e.g. from a backfill, or None for the
+            month set by backfill in the config
+    '''
+    logger.info(f'Run executing {__name__}')
+
+    # extract
+    yyyymm, file_path = source_path(yyyymm)
+
+    # skip a csv whose content has been loaded before
+    manifest = sha256 = None
+    if config_pv_train.get('manifest'):
+        manifest = Manifest(config_pv_train['manifest'])
+        with open_source(file_path, zip_path, binary=True) as f:
+            sha256, size = Manifest.digest(f)
+        if manifest.is_loaded(sha256, 'csv'):
+            logger.info(f'{__name__}: {yyyymm} skipped, already loaded')
+            return
+        name = os.path.basename(file_path)
 
     # load
     sqlpipe = DataPipe(
@@ -61,10 +449,23 @@ def import_pv_train():
         password=os.environ['DB_PASS'],
         database=os.environ['DB_NAME']
     )
-    sqlpipe.load_db(config_db_tbl, data)
 
-    row_count = df.shape[0]
-    logger.info(f'{__name__}: {yyyymm} completed, {row_count} rows inserted')
+    try:
+        with open_source(file_path, zip_path) as f:
+            stats = load_pv_train(f, sqlpipe, yyyymm, sha256)
+    except Exception:
+        if manifest is not None:
+            manifest.record(sha256, 'csv', name, size, 'failed')
+        raise
+
+    row_count = stats['rows']
+    if manifest is not None:
+        manifest.record(sha256, 'csv', name, size, 'loaded', row_count)
+
+    logger.info(f'{__name__}: {yyyymm} completed, {row_count} rows inserted, '
+                f'{stats['quarantined']} rows quarantined, '
+                f'{stats['deleted']} rows deleted, '
+                f'{stats['bytes']} bytes processed')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+
+'''Generic LTA DataMall dataset download'''
+
+import requests
+from requests.adapters import HTTPAdapter
+from datetime import datetime as dt
+import json
+import shutil
+import os
+
+import util
+from manifest import Manifest
+from util import UDLogger
+
+ud_logger = UDLogger(filename='api.log', name=__name__)
+logger = ud_logger.create_logger()
+
+# pooled session shared by every request to LTA DataMall and its downloads
+session = requests.Session()
+session.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=4))
+
+CHUNK_SIZE = 1024 * 1024
+TIMEOUT = (10, 60)
+
+
+def read_meta(meta_path: str):
+    '''
+    Read the validators (ETag, Last-Modified) of the last download.
+
+    Parameters
+    ----------
+        meta_path (str): path to the json file holding the validators
+    '''
+    if not os.path.exists(meta_path):
+        return {}
+
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def write_meta(meta_path: str, meta: dict):
+    '''
+    Write the validators (ETag, Last-Modified) of a download.
+
+    Parameters
+    ----------
+        meta_path (str): path to the json file holding the validators
+        meta (dict): validators, and whether the download completed and
+            was loaded
+    '''
+    with open(meta_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+
+
+def download_headers(meta: dict, offset: int):
+    '''
+    Build the Range or conditional headers for a download. Conditional
+    headers are only sent once the previous download has been loaded, so a
+    zip whose load failed is downloaded and loaded again.
+
+    Parameters
+    ----------
+        meta: validators of the previous download
+        offset: bytes already written to the .part file
+    '''
+    validator = meta.get('etag') or meta.get('last_modified')
+
+    # resume only if the .part still belongs to the same file
+    if offset and validator and not meta.get('complete'):
+        return {'Range': f'bytes={offset}-', 'If-Range': validator}
+
+    headers = {}
+    if meta.get('complete') and meta.get('loaded'):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    return headers
+
+
+class DataMallDataset:
+    '''
+    Create class to perform API call and download a dataset from LTA
+    DataMall, configured by config_<name> in lta_<name>.yaml
+
+    Parameters
+    ----------
+        name (str): dataset name, e.g. 'pv_train'
+        date (date): run date, used to name the downloaded zip
+    '''
+
+    def __init__(self, name, date):
+        self.name = name
+        self.date = date
+        self.conf = util.load_config('config.yaml')
+        self.conf_ds = util.load_config(f'lta_{name}.yaml')[f'config_{name}']
+
+        manifest = self.conf_ds.get('manifest')
+        self.manifest = Manifest(manifest) if manifest else None
+
+    def read_key(self):
+        '''
+        Read the LTA DataMall account key.
+        '''
+        with util.safe_open(self.conf['api']['lta_key'], 'r') as k:
+            return k.readlines()[0].strip()
+
+    def api_call(self):
+        '''
+        API call to LTA DataMall to get URL for the data.
+        '''
+
+        url = self.conf['api']['lta_url']
+        url_suffix = self.conf_ds['url_suffix']
+
+        headers = {
+            'AccountKey': self.read_key(),
+            'accept': 'application/json'
+        }
+
+        resp = session.get(url + url_suffix,
+                           headers=headers,
+                           timeout=TIMEOUT)
+
+        if resp.ok:
+            data = resp.json()
+            dl_link = data['value'][0]['Link']
+            logger.info(f'api call: {url_suffix}: {resp.status_code}')
+        else:
+            err = f'Error: {resp.status_code}, {resp.text}'
+            logger.error(f'{err}')
+            raise Exception(f'{err}')
+
+        return dl_link
+
+    def begin_download(self, zip_dir: str):
+        '''
+        Return the state of a download into zip_dir: the paths of the zip,
+        its .part file and the file holding the validators of the last
+        download, those validators, the bytes already in the .part file and
+        the Range or conditional headers to request the zip with.
+
+        Parameters
+        ----------
+            zip_dir: dir that stores the zip file
+        '''
+        yyyymmdd = dt.strftime(self.date, '%Y%m%d')
+        zip_dir = os.path.expanduser(f'{zip_dir}')
+        os.makedirs(zip_dir, exist_ok=True)
+        zip_path = f'{zip_dir}/{self.name}_{yyyymmdd}.zip'
+        part_path = f'{zip_path}.part'
+
+        meta_path = f'{zip_dir}/{self.name}.json'
+        meta = read_meta(meta_path)
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+
+        return {
+            'zip_path': zip_path,
+            'part_path': part_path,
+            'meta_path': meta_path,
+            'meta': meta,
+            'offset': offset,
+            'headers': download_headers(meta, offset)
+        }
+
+    def start_part(self, download: dict, status_code: int, headers):
+        '''
+        Take the status and headers of the response to a download request,
+        recording its validators, and return the offset of the .part file
+        the body is written from, or None when the zip has not changed.
+
+        Parameters
+        ----------
+            download (dict): state returned by begin_download()
+            status_code (int): status of the response
+            headers: headers of the response
+        '''
+        if status_code == 304:
+            meta = download['meta']
+            validator = meta.get('etag') or meta.get('last_modified')
+            logger.info(f'{self.name}: zip file unchanged since last '
+                        f'download: {validator}')
+            return None
+
+        # anything but 206 is the whole file, so start the .part over
+        offset = download['offset'] if status_code == 206 else 0
+        if status_code == 206:
+            self.check_content_range(download, headers.get('Content-Range'))
+        if offset:
+            logger.info(f'Resuming download of {download['zip_path']} from '
+                        f'{offset}')
+
+        download['meta'] = {
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'complete': False
+        }
+        write_meta(download['meta_path'], download['meta'])
+
+        return offset
+
+    def check_content_range(self, download: dict, content_range):
+        '''
+        Raise an exception, dropping the .part file so that the next run
+        starts over, unless a partial response starts where the .part file
+        ends.
+
+        Parameters
+        ----------
+            download (dict): state returned by begin_download()
+            content_range (str): Content-Range header, e.g.
+                'bytes 6-14/15'
+        '''
+        unit, _, spec = (content_range or '').partition(' ')
+        start = spec.split('-', 1)[0]
+        if unit == 'bytes' and start.isdigit() and \
+                int(start) == download['offset']:
+            return
+
+        os.remove(download['part_path'])
+        err = (f'Error: partial response {content_range!r} does not resume '
+               f'{download['part_path']} at {download['offset']}')
+        logger.error(err)
+        raise Exception(err)
+
+    def check_part_complete(self, download: dict, content_range):
+        '''
+        Check a 416 to a resumed download, which is sent when the .part file
+        already holds the whole file, as when a run stopped before renaming
+        it into place. Unless Content-Range shows the file is the size of
+        the .part file, raise an exception, dropping the .part file so that
+        the next run starts over.
+
+        Parameters
+        ----------
+            download (dict): state returned by begin_download()
+            content_range (str): Content-Range header, e.g. 'bytes */15'
+        '''
+        unit, _, spec = (content_range or '').partition(' ')
+        total = spec.removeprefix('*/')
+        if unit == 'bytes' and total.isdigit() and \
+                int(total) == download['offset']:
+            logger.info(f'{download['part_path']} is already complete')
+            return
+
+        os.remove(download['part_path'])
+        err = (f'Error: range not satisfiable {content_range!r} for '
+               f'{download['part_path']} at {download['offset']}')
+        logger.error(err)
+        raise Exception(err)
+
+    def finish_download(self, download: dict):
+        '''
+        Rename the complete .part file into place, and return the path to
+        the zip file, or None when the manifest shows its content has been
+        loaded before.
+
+        Parameters
+        ----------
+            download (dict): state returned by begin_download()
+        '''
+        zip_path = download['zip_path']
+        os.replace(download['part_path'], zip_path)
+        write_meta(download['meta_path'], {**download['meta'],
+                                           'complete': True})
+        logger.info(f'Successfully wrote zip file to {zip_path}')
+
+        # a changed ETag can still carry content that was loaded before
+        if self.manifest is not None:
+            with open(zip_path, 'rb') as f:
+                sha256, size = Manifest.digest(f)
+            if self.manifest.is_loaded(sha256, 'zip'):
+                logger.info(f'Zip file already loaded: {sha256}')
+                os.remove(zip_path)
+                return None
+            self.manifest.record(sha256, 'zip', os.path.basename(zip_path),
+                                 size, 'downloaded')
+
+        return zip_path
+
+    def download_zip(self,
+                     dl_link: str,
+                     zip_dir: str):
+        '''
+        Download zip file from URL and deposit file into incoming dir.
+
+        The zip is streamed into a .part file that is renamed into place once
+        complete. An interrupted download resumes from the .part file with a
+        Range request, or is renamed into place if the .part file turns out
+        to be complete already, and the download is skipped when the ETag or
+        Last-Modified of the previous download shows it has not changed.
+
+        Parameters
+        ----------
+            dl_link: url link to the download
+            zip_dir: dir that stores the zip file
+
+        Returns
+        -------
+            path to the zip file, or None when the file has not changed
+        '''
+        download = self.begin_download(zip_dir)
+
+        with session.get(dl_link, headers=download['headers'], stream=True,
+                         timeout=TIMEOUT) as zip_resp:
+
+            if zip_resp.status_code == 416 and download['offset']:
+                self.check_part_complete(download,
+                                         zip_resp.headers.get('Content-Range'))
+                return self.finish_download(download)
+
+            if not zip_resp.ok:
+                err = f'Error: {zip_resp.status_code}, {zip_resp.text}'
+                logger.error(f'{err}')
+                raise Exception(f'{err}')
+
+            offset = self.start_part(download, zip_resp.status_code,
+                                     zip_resp.headers)
+            if offset is None:
+                return None
+
+            with open(download['part_path'], 'ab' if offset else 'wb') as f:
+                for chunk in zip_resp.iter_content(chunk_size=CHUNK_SIZE):
+                    f.write(chunk)
+
+        return self.finish_download(download)
+
+    def mark_loaded(self, zip_path: str, zip_dir: str | None = None):
+        '''
+        Record that the zip file has been loaded, in the state of the
+        downloads so that the next download is conditional on the file
+        having changed, and in the manifest so that the same file is
+        skipped when it is downloaded again.
+
+        Parameters
+        ----------
+            zip_path: path to the zip file
+            zip_dir: dir the zip was downloaded to, defaults to zip_prefix
+        '''
+        zip_dir = os.path.expanduser(zip_dir or self.conf_ds['zip_prefix'])
+        meta_path = f'{zip_dir}/{self.name}.json'
+        meta = read_meta(meta_path)
+        if meta.get('complete'):
+            write_meta(meta_path, {**meta, 'loaded': True})
+
+        if self.manifest is None:
+            return
+
+        with util.safe_open(zip_path, 'rb') as f:
+            sha256, size = Manifest.digest(f)
+        self.manifest.record(sha256, 'zip', os.path.basename(zip_path),
+                             size, 'loaded')
+
+    def unzip_to_incoming(self,
+                          zip_dir: str,
+                          csv_dir: str,
+                          arc_dir: str | bool = False,
+                          extract: bool = True):
+        '''
+        Function unzips the dataset file and store the csv into the csv file.
+        It then moves the zip file into the archive folder.
+
+        Parameters
+        ----------
+            zip_dir: dir that stores the zip file
+            csv_dir: dir that stores the csv file
+            arc_dir: archive dir or if not archiving, False
+            extract: False to skip writing the csv to disk, for when the csv
+                is read straight from the zip
+
+        Returns
+        -------
+            path to the zip file after it has been archived
+        '''
+
+        yyyymmdd = dt.strftime(self.date, '%Y%m%d')
+
+        zip_path = os.path.expanduser(f'{zip_dir}/{self.name}_{yyyymmdd}.zip')
+        out_dir = os.path.expanduser(f'{csv_dir}')
+        arc_path = os.path.expanduser(f'{arc_dir}/{self.name}_{yyyymmdd}.zip')
+
+        try:
+            if extract:
+                util.unzip_file(zip_path, out_dir, logger)
+                logger.info(f'Successfully unzipped file {zip_path}.')
+            elif not os.path.exists(zip_path):
+                raise FileNotFoundError(zip_path)
+            if arc_dir is not False:
+                shutil.move(zip_path, arc_path)
+                logger.info(f'Successfully moved zipped file to {arc_path}.')
+                zip_path = arc_path
+        except Exception as e:
+            logger.error(f'The error {e} occurred.')
+            raise
+
+        return zip_path
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+
+'''Concurrent download of the LTA DataMall datasets in the registry'''
+
+import asyncio
+
+import httpx
+
+import util
+from lta.datamall import CHUNK_SIZE
+from lta.datamall import DataMallDataset
+from lta.registry import load_registry
+from util import UDLogger
+
+ud_logger = UDLogger(filename='api.log', name=__name__)
+logger = ud_logger.create_logger()
+
+
+class HostRateLimiter:
+    '''
+    Space out the requests made to each host by at least 1 / rate seconds.
+
+    Parameters
+    ----------
+        rate (float): requests per second allowed per host
+    '''
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self.next_slot = {}
+        self.lock = asyncio.Lock()
+
+    async def wait(self, url: str):
+        '''
+        Wait for the next free slot of the url's host.
+
+        Parameters
+        ----------
+            url (str): url about to be requested
+        '''
+        host = httpx.URL(url).host
+        loop = asyncio.get_running_loop()
+
+        # reserve a slot under the lock, then sleep outside of it
+        async with self.lock:
+            now = loop.time()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+
+        await asyncio.sleep(slot - now)
+
+
+class DataMallFetcher:
+    '''
+    Create class to look up and download the zip of several LTA DataMall
+    datasets concurrently, sharing one connection pool.
+
+    Parameters
+    ----------
+        date (date): run date, used to name the downloaded zips
+        names (list): datasets to fetch, or None for the whole registry
+        transport: httpx transport, for tests to stand in for the server
+    '''
+    def __init__(self, date, names: list | None = None, transport=None):
+        self.date = date
+        self.conf = util.load_config('config.yaml')
+        self.datasets = load_registry(names)
+        self.transport = transport
+        # the download steps are those of the synchronous path
+        self.sources = {name: DataMallDataset(name, date)
+                        for name in self.datasets}
+
+        api = self.conf['api']
+        self.max_connections = api.get('max_connections', 4)
+        self.rate_per_host = api.get('rate_per_host', 5)
+        # made by each run, as its lock belongs to the run's event loop
+        self.limiter = None
+
+    def run(self):
+        '''
+        Fetch every dataset, returning a dict of dataset name to the path of
+        its zip, or None where the zip has not changed.
+        '''
+        return asyncio.run(self.fetch_all())
+
+    async def fetch_all(self):
+        '''
+        Fetch every dataset concurrently. Errors are raised once all the
+        other datasets have finished.
+        '''
+        self.limiter = HostRateLimiter(self.rate_per_host)
+        limits = httpx.Limits(max_connections=self.max_connections)
+        async with httpx.AsyncClient(limits=limits,
+                                     timeout=httpx.Timeout(60, connect=10),
+                                     transport=self.transport) as client:
+            results = await asyncio.gather(
+                *(self.fetch(client, name) for name in self.datasets),
+                return_exceptions=True
+            )
+
+        errors = [f'{name}: {res}' for name, res in zip(self.datasets, results)
+                  if isinstance(res, Exception)]
+        if errors:
+            err = f'Error: fetch failed for {'; '.join(errors)}'
+            logger.error(err)
+            raise Exception(err)
+
+        return dict(zip(self.datasets, results))
+
+    async def fetch(self, client, name: str):
+        '''
+        Look up the download link of a dataset and download its zip.
+
+        Parameters
+        ----------
+            client (httpx.AsyncClient): shared client
+            name (str): dataset name
+        '''
+        dl_link = await self.api_call(client, name)
+
+        return await self.download_zip(client, name, dl_link)
+
+    async def api_call(self, client, name: str):
+        '''
+        API call to LTA DataMall to get URL for the data.
+
+        Parameters
+        ----------
+            client (httpx.AsyncClient): shared client
+            name (str): dataset name
+        '''
+        url = self.conf['api']['lta_url'] + self.datasets[name]['url_suffix']
+        headers = {
+            'AccountKey': self.sources[name].read_key(),
+            'accept': 'application/json'
+        }
+
+        await self.limiter.wait(url)
+        resp = await client.get(url, headers=headers)
+
+        if not resp.is_success:
+            raise Exception(f'Error: {resp.status_code}, {resp.text}')
+
+        logger.info(f'api call: {name}: {resp.status_code}')
+
+        return resp.json()['value'][0]['Link']
+
+    async def download_zip(self, client, name: str, dl_link: str):
+        '''
+        Stream the zip of a dataset into a .part file and rename it into
+        place, through the steps of DataMallDataset.download_zip(), with
+        file access run in a worker thread to keep the event loop free.
+
+        Parameters
+        ----------
+            client (httpx.AsyncClient): shared client
+            name (str): dataset name
+            dl_link (str): url link to the download
+        '''
+        source = self.sources[name]
+        download = await asyncio.to_thread(
+            source.begin_download, self.datasets[name]['zip_prefix'])
+
+        await self.limiter.wait(dl_link)
+        async with client.stream('GET', dl_link,
+                                 headers=download['headers']) as resp:
+            if resp.status_code == 416 and download['offset']:
+                await asyncio.to_thread(source.check_part_complete, download,
+                                        resp.headers.get('Content-Range'))
+                return await asyncio.to_thread(source.finish_download,
+                                               download)
+
+            if resp.status_code != 304 and not resp.is_success:
+                await resp.aread()
+                raise Exception(f'Error: {resp.status_code}, {resp.text}')
+
+            offset = await asyncio.to_thread(
+                source.start_part, download, resp.status_code, resp.headers)
+            if offset is None:
+                return None
+
+            f = await asyncio.to_thread(open, download['part_path'],
+                                        'ab' if offset else 'wb')
+            try:
+                async for chunk in resp.aiter_bytes(CHUNK_SIZE):
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+
+        return await asyncio.to_thread(source.finish_download, download)
@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+
+'''Registry of the LTA DataMall datasets configured in lta_<name>.yaml'''
+
+import glob
+import os
+
+import util
+
+
+def load_registry(names: list | None = None):
+    '''
+    Load the config of each dataset with an lta_<name>.yaml file holding a
+    config_<name> section.
+
+    Parameters
+    ----------
+        names (list): datasets to load, or None for every dataset found
+
+    Returns
+    -------
+        dict of dataset name to its config_<name> section
+    '''
+    registry = {}
+    pattern = os.path.join(util.config_dir(), 'lta_*.yaml')
+    for path in sorted(glob.glob(pattern)):
+        name = os.path.basename(path)[len('lta_'):-len('.yaml')]
+        conf = util.load_config(os.path.basename(path))
+        if f'config_{name}' in conf:
+            registry[name] = conf[f'config_{name}']
+
+    if names is not None:
+        missing = set(names) - set(registry)
+        if missing:
+            raise Exception(f'Error: unknown datasets {sorted(missing)}')
+        registry = {name: registry[name] for name in names}
+
+    return registry
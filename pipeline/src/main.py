@@ -1,37 +1,198 @@
+import os
 from datetime import datetime as dt
 
-
+from metrics import recorder
 from util import load_config
 from util import UDLogger
-from lta.pv_train import PVTrain
-from loaders.import_pv_train import import_pv_train
 
 # create logger
 ud_logger = UDLogger(filename='main.log', name=__name__)
 logger = ud_logger.create_logger()
 
-config = load_config('config.yaml')
-config_pv_train = load_config('lta_pv_train.yaml')['config_pv_train']
+# pandas, mysql.connector and requests are only imported by the stages that
+# need them, so that importing main (or cli) stays fast
+
+
+def fetch(date):
+    '''
+    Do api call to lta to get zip link, and download the zip.
+
+    Parameters
+    ----------
+        date (date): run date, used to name the zip
+
+    Returns
+    -------
+        path to the zip file, or None if nothing new was published
+    '''
+    from lta.pv_train import PVTrain
+
+    config = load_config('config.yaml')
+
+    pv_train = PVTrain(date)
+    with recorder.stage('api_call'):
+        dl_link = pv_train.api_call()
+
+    with recorder.stage('download_zip') as metrics:
+        zip_path = pv_train.download_zip(
+            dl_link, config['incoming']['pv_train'] + '/zip'
+        )
+        if zip_path is not None:
+            metrics['bytes'] = os.path.getsize(zip_path)
+
+    return zip_path
+
+
+def unzip(date):
+    '''
+    Unzip the downloaded zip, if extracting, and archive it.
+
+    Parameters
+    ----------
+        date (date): run date the zip was downloaded on
+
+    Returns
+    -------
+        path to the archived zip file
+    '''
+    from lta.pv_train import PVTrain
+
+    config_pv_train = load_config('lta_pv_train.yaml')['config_pv_train']
+
+    with recorder.stage('unzip_to_incoming') as metrics:
+        zip_path = PVTrain(date).unzip_to_incoming(
+            config_pv_train['zip_prefix'],
+            config_pv_train['csv_prefix'],
+            config_pv_train['arc_prefix'],
+            extract=config_pv_train['extract'],
+        )
+        metrics['bytes'] = os.path.getsize(zip_path)
+
+    return zip_path
+
+
+def load_month(date):
+    '''
+    Return the month loaded for a run date, as YYYYMM.
+
+    Parameters
+    ----------
+        date (date): run date the zip was downloaded on, the month before
+            it is the month loaded, as lta publishes each month after it
+    '''
+    from dateutil.relativedelta import relativedelta
 
+    return f'{date - relativedelta(months=1):%Y%m}'
 
-def main():
 
-    curr_date = dt.now().date()
-    # do api call to lta to get zip link
-    pv_train = PVTrain(curr_date)
-    dl_link = pv_train.api_call()
-    pv_train.download_zip(dl_link, config['incoming']['pv_train'] + '/zip')
+def load(date, zip_path: str | None = None):
+    '''
+    Load the csv into mariadb and mark the zip as loaded.
 
-    pv_train.unzip_to_incoming(
-        config_pv_train['zip_prefix'],
-        config_pv_train['csv_prefix'],
-        config_pv_train['arc_prefix'],
+    Parameters
+    ----------
+        date (date): run date the zip was downloaded on, see load_month()
+        zip_path (str): archived zip file, streamed from when the csv was
+            not extracted
+    '''
+    from lta.pv_train import PVTrain
+    from loaders.import_pv_train import import_pv_train
+
+    yyyymm = load_month(date)
+
+    # without extract, the csv is streamed from the archived zip on load
+    config_pv_train = load_config('lta_pv_train.yaml')['config_pv_train']
+    if zip_path is None and not config_pv_train['extract']:
+        # the zip downloaded on the run date, once archived
+        zip_path = os.path.expanduser(
+            f'{config_pv_train['arc_prefix']}/pv_train_{date:%Y%m%d}.zip')
+    import_pv_train(None if config_pv_train['extract'] else zip_path,
+                    yyyymm=yyyymm)
+
+    if zip_path is not None:
+        PVTrain(date).mark_loaded(zip_path)
+
+
+def upload():
+    '''
+    Upload the archived zips and the parquet archive to s3, skipping files
+    that are already there. Does nothing without an s3 section in
+    config.yaml.
+
+    Returns
+    -------
+        dict of the status of each file uploaded
+    '''
+    config_s3 = load_config('config.yaml').get('s3')
+    if not config_s3:
+        return {}
+
+    from uploader import S3Uploader
+
+    uploader = S3Uploader(
+        config_s3['bucket'],
+        prefix=config_s3.get('prefix', ''),
+        part_size=config_s3.get('part_size_mb', 64) * 1024 * 1024,
+        max_workers=config_s3.get('max_workers', 4),
+        endpoint_url=config_s3.get('endpoint_url')
     )
 
-    # load csv into mariadb
-    import_pv_train()
+    config_pv_train = load_config('lta_pv_train.yaml')['config_pv_train']
+    results = {}
+    with recorder.stage('upload') as metrics:
+        for key, name in (('arc_prefix', 'archive'),
+                          ('parquet_prefix', 'parquet')):
+            if config_pv_train.get(key):
+                results |= uploader.upload_dir(config_pv_train[key],
+                                               f'pv_train/{name}')
+        metrics['bytes'] = sum(os.path.getsize(path) for path, status
+                               in results.items() if status == 'uploaded')
+
+    return results
+
+
+def write_metrics():
+    '''
+    Write the stage metrics of the run to the Prometheus textfile and the
+    json run summary configured under metrics in config.yaml.
+    '''
+    config_metrics = load_config('config.yaml').get('metrics')
+    if not config_metrics:
+        return
+
+    try:
+        recorder.write(config_metrics.get('textfile'),
+                       config_metrics.get('summary'))
+    except OSError as e:
+        # metrics are best effort and never fail the run
+        logger.error(f'The error {e} occurred writing metrics.')
+
+
+def main(curr_date=None):
+    '''
+    Run fetch, unzip and load for a run date.
+
+    Parameters
+    ----------
+        curr_date (date): run date, defaults to today
+    '''
+    if curr_date is None:
+        curr_date = dt.now().date()
+
+    zip_path = fetch(curr_date)
+    if zip_path is None:
+        logger.info('No new pv_train file published, nothing to load.')
+        return
+
+    zip_path = unzip(curr_date)
+
+    # load csv into mariadb, uploading to s3 is left to `cli upload`
+    load(curr_date, zip_path)
 
 
 if __name__ == '__main__':
 
-    main()
+    try:
+        main()
+    finally:
+        write_metrics()
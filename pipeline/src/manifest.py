@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+
+'''Content addressed manifest of the files ingested by the pipeline'''
+
+import hashlib
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime as dt
+
+BLOCK_SIZE = 1024 * 1024
+
+
+class Manifest:
+    '''
+    SQLite manifest recording the sha256, size, row count and load status of
+    each zip and csv ingested, so that stages can skip inputs that have
+    already been loaded.
+
+    Parameters
+    ----------
+        path (str): path to the sqlite file
+    '''
+    def __init__(self, path: str):
+        self.path = os.path.expanduser(path)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS manifest ('
+                'sha256 TEXT NOT NULL, '
+                'kind TEXT NOT NULL, '
+                'name TEXT, '
+                'size INTEGER, '
+                'row_count INTEGER, '
+                'status TEXT NOT NULL, '
+                'updated_at TEXT NOT NULL, '
+                'PRIMARY KEY (sha256, kind))'
+            )
+
+    @staticmethod
+    def digest(f):
+        '''
+        Return the sha256 hex digest and size in bytes of a binary file
+        object, reading it in blocks.
+
+        Parameters
+        ----------
+            f: binary file object, read to the end
+        '''
+        sha256 = hashlib.sha256()
+        size = 0
+        while block := f.read(BLOCK_SIZE):
+            sha256.update(block)
+            size += len(block)
+
+        return sha256.hexdigest(), size
+
+    def lookup(self, sha256: str, kind: str):
+        '''
+        Return the manifest entry of a file as a dict, or None if the file
+        has not been seen before.
+
+        Parameters
+        ----------
+            sha256 (str): sha256 hex digest of the file
+            kind (str): 'zip' or 'csv'
+        '''
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                'SELECT * FROM manifest WHERE sha256 = ? AND kind = ?;',
+                (sha256, kind)
+            ).fetchone()
+
+        return dict(row) if row is not None else None
+
+    def is_loaded(self, sha256: str, kind: str):
+        '''
+        Return True if the file has already been loaded successfully.
+
+        Parameters
+        ----------
+            sha256 (str): sha256 hex digest of the file
+            kind (str): 'zip' or 'csv'
+        '''
+        entry = self.lookup(sha256, kind)
+
+        return entry is not None and entry['status'] == 'loaded'
+
+    def record(self, sha256: str, kind: str, name: str, size: int,
+               status: str, row_count: int | None = None):
+        '''
+        Insert or update the manifest entry of a file.
+
+        Parameters
+        ----------
+            sha256 (str): sha256 hex digest of the file
+            kind (str): 'zip' or 'csv'
+            name (str): file name, or member name within the zip
+            size (int): size of the file in bytes
+            status (str): e.g. 'downloaded', 'loaded' or 'failed'
+            row_count (int): rows loaded from the file, if known
+        '''
+        with closing(sqlite3.connect(self.path)) as conn, conn:
+            conn.execute(
+                'INSERT INTO manifest VALUES (?, ?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (sha256, kind) DO UPDATE SET '
+                'name = excluded.name, size = excluded.size, '
+                'row_count = COALESCE(excluded.row_count, row_count), '
+                'status = excluded.status, updated_at = excluded.updated_at;',
+                (sha256, kind, name, size, row_count, status,
+                 dt.now().isoformat(timespec='seconds'))
+            )
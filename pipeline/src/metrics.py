@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+
+'''Per stage pipeline metrics: wall time, throughput and peak memory'''
+
+import json
+import os
+import resource
+import time
+from contextlib import contextmanager
+
+
+def peak_rss():
+    '''
+    Return the peak resident set size of the process so far, in bytes.
+    '''
+    # ru_maxrss is in kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def read_hwm():
+    '''
+    Return the peak resident set size since the last reset_hwm(), in bytes,
+    or the peak of the process where /proc is not available.
+    '''
+    try:
+        with open('/proc/self/status', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return peak_rss()
+
+
+def reset_hwm():
+    '''
+    Reset the peak resident set size to the current one, on linux, so that
+    the peak of each stage can be read. Elsewhere the peak is left as the
+    peak of the process.
+    '''
+    try:
+        with open('/proc/self/clear_refs', 'w', encoding='utf-8') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+class Recorder:
+    '''
+    Create class to record the wall time, rows, bytes and peak rss of each
+    pipeline stage, and export them as a Prometheus textfile and a json
+    run summary. A stage recorded several times, e.g. once per chunk, is
+    accumulated.
+
+    The peak rss of a stage is measured from begin() to end(), by resetting
+    the kernel's high water mark at begin(). Stages measured at once, e.g.
+    read_csv within load_db, each keep the highest mark seen while they
+    were open.
+    '''
+    def __init__(self):
+        self.started = time.time()
+        self.stages = {}
+        # peak rss so far of the stages being measured, and of the run
+        self.windows = {}
+        self.peak = 0
+
+    def _fold_peak(self):
+        '''
+        Carry the high water mark into the stages being measured and the
+        run, before it is reset, and return it.
+        '''
+        hwm = read_hwm()
+        self.peak = max(self.peak, hwm)
+        for token, peak in self.windows.items():
+            self.windows[token] = max(peak, hwm)
+
+        return hwm
+
+    def begin(self):
+        '''
+        Start measuring the peak rss of a stage, returning the token to pass
+        to end().
+        '''
+        self._fold_peak()
+        reset_hwm()
+        token = object()
+        self.windows[token] = 0
+
+        return token
+
+    def end(self, token):
+        '''
+        Stop measuring the peak rss of a stage, returning it in bytes.
+        '''
+        return max(self.windows.pop(token, 0), self._fold_peak())
+
+    def add(self, stage: str, seconds: float, rows: int = 0,
+            nbytes: int = 0, peak: int | None = None):
+        '''
+        Add the time spent and the rows and bytes processed to a stage.
+
+        Parameters
+        ----------
+            stage (str): stage name, e.g. 'read_csv'
+            seconds (float): wall time spent
+            rows (int): rows processed
+            nbytes (int): bytes processed
+            peak (int): peak rss of the stage as returned by end(), or None
+                for the peak since the last stage began
+        '''
+        entry = self.stages.setdefault(
+            stage, {'seconds': 0.0, 'rows': 0, 'bytes': 0, 'calls': 0,
+                    'peak_rss_bytes': 0}
+        )
+        entry['seconds'] += seconds
+        entry['rows'] += rows
+        entry['bytes'] += nbytes
+        entry['calls'] += 1
+        if peak is None:
+            peak = self._fold_peak()
+        entry['peak_rss_bytes'] = max(entry['peak_rss_bytes'], peak)
+
+    def seconds(self, *stages: str):
+        '''
+        Return the total wall time recorded so far for the given stages.
+        '''
+        return sum(self.stages[name]['seconds'] for name in stages
+                   if name in self.stages)
+
+    @contextmanager
+    def stage(self, stage: str):
+        '''
+        Context manager timing a stage. It yields a dict in which the block
+        can set the 'rows' and 'bytes' it processed.
+
+        Parameters
+        ----------
+            stage (str): stage name, e.g. 'download_zip'
+        '''
+        counts = {'rows': 0, 'bytes': 0}
+        token = self.begin()
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.add(stage, time.perf_counter() - start,
+                     counts['rows'], counts['bytes'], self.end(token))
+
+    def summary(self):
+        '''
+        Return the run summary as a dict, with rows/s and bytes/s per stage.
+        '''
+        self._fold_peak()
+        stages = {}
+        for name, entry in self.stages.items():
+            seconds = entry['seconds']
+            stages[name] = {
+                **entry,
+                'rows_per_second': entry['rows'] / seconds if seconds else 0,
+                'bytes_per_second': entry['bytes'] / seconds if seconds else 0
+            }
+
+        return {
+            'started': self.started,
+            'duration_seconds': time.time() - self.started,
+            'peak_rss_bytes': max(self.peak, peak_rss()),
+            'stages': stages
+        }
+
+    def to_prometheus(self):
+        '''
+        Return the metrics in the Prometheus text exposition format.
+        '''
+        summary = self.summary()
+        metrics = {
+            'seconds': 'Wall time spent in the stage.',
+            'rows': 'Rows processed by the stage.',
+            'bytes': 'Bytes processed by the stage.',
+            'rows_per_second': 'Rows processed per second of the stage.',
+            'bytes_per_second': 'Bytes processed per second of the stage.',
+            'peak_rss_bytes': 'Peak resident memory during the stage.'
+        }
+
+        lines = []
+        for metric, help_text in metrics.items():
+            lines.append(f'# HELP pipeline_stage_{metric} {help_text}')
+            lines.append(f'# TYPE pipeline_stage_{metric} gauge')
+            for name, entry in summary['stages'].items():
+                lines.append(f'pipeline_stage_{metric}{{stage="{name}"}} '
+                             f'{entry[metric]}')
+
+        lines.append('# HELP pipeline_last_run_timestamp_seconds '
+                     'Start time of the last run.')
+        lines.append('# TYPE pipeline_last_run_timestamp_seconds gauge')
+        lines.append(f'pipeline_last_run_timestamp_seconds {self.started}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write(self, textfile: str | None = None, summary: str | None = None):
+        '''
+        Write the Prometheus textfile and the json run summary. Each file is
+        written to a temporary file and renamed, so a collector never reads
+        a partial file.
+
+        Parameters
+        ----------
+            textfile (str): path to the .prom file, or None to skip it
+            summary (str): path to the json summary, or None to skip it
+        '''
+        outputs = {
+            textfile: self.to_prometheus,
+            summary: lambda: json.dumps(self.summary(), indent=2)
+        }
+        for path, render in outputs.items():
+            if not path:
+                continue
+            path = os.path.expanduser(path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+                f.write(render())
+            os.replace(f'{path}.tmp', path)
+
+
+# recorder shared by every stage of the run
+recorder = Recorder()
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+
+'''Data Query Functions, the read side of import_func'''
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from import_func import DataPipe
+from rollup import aggregate
+from rollup import source_months
+from util import load_config
+from util import UDLogger
+
+ud_logger = UDLogger(filename='query.log', name=__name__)
+logger = ud_logger.create_logger()
+
+YAML_FILE = 'lta_pv_train.yaml'
+
+# dtypes of the columns returned by the queries
+RESULT_DTYPES = {
+    'year_month': 'datetime64[ns]',
+    'day_type': 'category',
+    'time_per_hour': 'Int64',
+    'pt_type': 'category',
+    'pt_code': 'category',
+    'total_tap_in_volume': 'Int64',
+    'total_tap_out_volume': 'Int64'
+}
+
+
+def version_file(config_pv_train):
+    '''
+    Return the path of the file whose change marks cached results stale, or
+    None if cache_version is not configured.
+
+    Parameters
+    ----------
+        config_pv_train: config_pv_train section of the yaml file, the
+            loader's own so that it can be pointed elsewhere
+    '''
+    path = config_pv_train.get('cache_version')
+
+    return os.path.expanduser(path) if path else None
+
+
+def data_version(path: str | None):
+    '''
+    Return a token that changes whenever invalidate() is called, in this
+    process or any other.
+    '''
+    if path is None:
+        return None
+
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    return stat.st_mtime_ns, stat.st_size
+
+
+def invalidate(path: str | None, yyyymm: str | None = None):
+    '''
+    Mark every cached query result stale, called once a month is loaded.
+
+    Parameters
+    ----------
+        path (str): version file, as returned by version_file(), or None
+            when cache_version is not configured
+        yyyymm (str): month loaded, recorded in the version file
+    '''
+    if path is None:
+        return
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f'{time.time_ns()} {yyyymm or ''}\n')
+    logger.info(f'Query caches invalidated, {yyyymm} loaded.')
+
+
+class ResultCache:
+    '''
+    Create class for a thread safe LRU cache of query results whose entries
+    expire after ttl seconds, or as soon as the data version changes.
+
+    Parameters
+    ----------
+        maxsize (int): results held before the least recently used is
+            evicted
+        ttl (float): seconds a result is served for
+        version: function returning the current data version, or None
+    '''
+    def __init__(self, maxsize: int = 128, ttl: float = 300, version=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = version or (lambda: None)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''
+        Return the cached value of a key, or None if it is missing or stale.
+        '''
+        version = self.version()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] != version or \
+                    time.monotonic() > entry[1]:
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, key, value):
+        '''
+        Cache a value, evicting the least recently used if full.
+        '''
+        entry = (self.version(), time.monotonic() + self.ttl, value)
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        '''
+        Drop every cached value.
+        '''
+        with self.lock:
+            self.entries.clear()
+
+
+class PVTrainQuery:
+    '''
+    Create class of typed queries over r_pv_train, or v_pv_train when the
+    fact table is loaded, returning dataframes.
+    Results are cached, and the cache is invalidated by import_pv_train
+    loading a month. Aggregates are answered from the rollups where they
+    cover the request.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database to query, defaults to the DB_*
+            environment variables
+        cache (ResultCache): result cache, defaults to one following the
+            version file, ResultCache(maxsize=0) disables caching
+    '''
+    def __init__(self, sqlpipe: DataPipe | None = None,
+                 cache: ResultCache | None = None):
+        conf = load_config(YAML_FILE)
+        # the table the loader writes, with fact the view over the fact
+        # table, filtered on its YYYYMM month_key
+        if conf.config_pv_train.get('fact'):
+            self.tbl = conf.config_fact_tbl['view']
+            self.month_key = conf.config_fact_tbl['month_key']
+        else:
+            self.tbl = conf.config_db_tbl['tbl']
+            self.month_key = None
+        # without rollups, aggregates are read from the table itself
+        self.config_rollup = conf.get('config_rollup') or {
+            'source': self.tbl,
+            'month_col': 'year_month',
+            'month_key': self.month_key,
+            'measures': ['total_tap_in_volume', 'total_tap_out_volume'],
+            'rollups': {}
+        }
+        self.sqlpipe = sqlpipe or DataPipe(
+            hostname=os.environ['DB_HOST'],
+            username=os.environ['DB_USER'],
+            password=os.environ['DB_PASS'],
+            database=os.environ['DB_NAME']
+        )
+        if cache is None:
+            path = version_file(conf.config_pv_train)
+            cache = ResultCache(version=lambda: data_version(path))
+        self.cache = cache
+
+    def cached(self, key, func, *args, **kwargs):
+        '''
+        Return the cached result of a query, running it on a miss. Callers
+        get a copy, so the cached dataframe cannot be changed.
+        '''
+        df = self.cache.get(key)
+        if df is None:
+            df = func(*args, **kwargs)
+            df = df.astype({k: v for k, v in RESULT_DTYPES.items()
+                            if k in df.columns})
+            self.cache.put(key, df)
+
+        return df.copy()
+
+    def select(self, start: str, end: str, **filters):
+        '''
+        Return the rows of the table between two months, as YYYYMM, keeping
+        those whose columns hold one of the values given for them.
+        '''
+        where, params = source_months(
+            {'month_col': 'year_month', 'month_key': self.month_key},
+            start, end)
+        where = [where]
+        for col, values in sorted(filters.items()):
+            if values is None:
+                continue
+            values = [values] if isinstance(values, (str, int)) else values
+            where.append(f'`{col}` IN ({', '.join(['%s'] * len(values))})')
+            params.extend(values)
+
+        stmt = (f'SELECT `year_month`, `day_type`, `time_per_hour`, '
+                f'`pt_type`, `pt_code`, `total_tap_in_volume`, '
+                f'`total_tap_out_volume` '
+                f'FROM {self.sqlpipe.database}.{self.tbl} '
+                f'WHERE {' AND '.join(where)} '
+                f'ORDER BY `year_month`, `pt_code`, `day_type`, '
+                f'`time_per_hour`;')
+
+        return self.cached((stmt, tuple(params)), self.sqlpipe.query,
+                           stmt, params)
+
+    def by_station(self, pt_code: str | list[str], start: str, end: str):
+        '''
+        Return the hourly rows of one or more stations, e.g. 'NS1'.
+        '''
+        return self.select(start, end, pt_code=pt_code)
+
+    def by_month(self, start: str, end: str, day_type: str | None = None):
+        '''
+        Return every row of a range of months, as YYYYMM.
+        '''
+        return self.select(start, end, day_type=day_type)
+
+    def by_hour(self, hour: int | list[int], start: str, end: str,
+                day_type: str | None = None):
+        '''
+        Return the rows of every station at one or more hours, 0 to 23.
+        '''
+        return self.select(start, end, time_per_hour=hour, day_type=day_type)
+
+    def totals(self, group_by: list[str], start: str, end: str,
+               **filters):
+        '''
+        Return the tap volumes summed per month and group_by columns, from
+        the rollups where they cover the request.
+        '''
+        filters = {k: [v] if isinstance(v, (str, int)) else list(v)
+                   for k, v in filters.items() if v is not None}
+        key = ('totals', tuple(group_by), start, end,
+               tuple(sorted((k, tuple(v)) for k, v in filters.items())))
+
+        return self.cached(key, aggregate, self.sqlpipe, self.config_rollup,
+                           group_by, start, end, filters)
+
+    def station_totals(self, start: str, end: str,
+                       pt_code: str | list[str] | None = None):
+        '''
+        Return the monthly tap volumes of each station.
+        '''
+        return self.totals(['pt_code'], start, end, pt_code=pt_code)
+
+    def hourly_profile(self, start: str, end: str,
+                       day_type: str | None = None):
+        '''
+        Return the monthly tap volumes of each hour, per day type.
+        '''
+        return self.totals(['day_type', 'time_per_hour'], start, end,
+                           day_type=day_type)
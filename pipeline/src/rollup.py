@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+'''Rollup tables of pv_train, refreshed a month at a time'''
+
+from datetime import datetime as dt
+
+from dateutil.relativedelta import relativedelta
+
+from util import UDLogger
+
+# create logger
+ud_logger = UDLogger(filename='import.log', name=__name__)
+logger = ud_logger.create_logger()
+
+# months each rollup has been refreshed for
+MONTH_TBL = 'etl_rollup_month'
+
+
+def month_date(yyyymm: str):
+    '''
+    Return the first day of a YYYYMM month as YYYY-MM-DD.
+    '''
+    return f'{yyyymm[:4]}-{yyyymm[4:]}-01'
+
+
+def source_months(config_rollup, start: str, end: str):
+    '''
+    Return the condition selecting the months from start to end, as YYYYMM,
+    of the source table, and its parameters. A source with a month_key,
+    such as the yyyymm of v_pv_train, is filtered on that YYYYMM column, so
+    that the index of the table under a view is used rather than the month
+    column the view computes.
+    '''
+    if config_rollup.get('month_key'):
+        col, bounds = config_rollup['month_key'], [int(start), int(end)]
+    else:
+        col = config_rollup['month_col']
+        bounds = [month_date(start), month_date(end)]
+
+    if start == end:
+        return f'`{col}` = %s', bounds[:1]
+
+    return f'`{col}` BETWEEN %s AND %s', bounds
+
+
+def refresh_rollups(sqlpipe, config_rollup, yyyymm: str):
+    '''
+    Recompute the rows of every rollup for one month from the source table,
+    replacing the month in a single transaction so that readers never see
+    it half refreshed, and record the month as covered.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database holding the tables
+        config_rollup: config_rollup section of the yaml file, with the
+            source table, month_col, optionally month_key, measures and the
+            group columns of each rollup
+        yyyymm (str): month just loaded
+    '''
+    db = sqlpipe.database
+    month_col = config_rollup['month_col']
+    measures = config_rollup['measures']
+    month = month_date(yyyymm)
+    where, params = source_months(config_rollup, yyyymm, yyyymm)
+
+    with (sqlpipe.connection() as connection,
+          connection.cursor() as cursor):
+        for tbl, group_col in config_rollup['rollups'].items():
+            cols = ', '.join(f'`{i}`' for i in (month_col, *group_col))
+            sums = ', '.join(f'SUM(`{i}`)' for i in measures)
+            cursor.execute(f'DELETE FROM {db}.{tbl} '
+                           f'WHERE `{month_col}` = %s;', (month,))
+            cursor.execute(
+                f'INSERT INTO {db}.{tbl} '
+                f'({cols}, {', '.join(f'`{i}`' for i in measures)}) '
+                f'SELECT {cols}, {sums} FROM {db}.{config_rollup['source']} '
+                f'WHERE {where} GROUP BY {cols};', tuple(params)
+            )
+            logger.info(f'{tbl} refreshed for {yyyymm}, '
+                        f'{cursor.rowcount} rows.')
+            cursor.execute(
+                f'REPLACE INTO {db}.{MONTH_TBL} VALUES (%s, %s, %s);',
+                (tbl, month, dt.now())
+            )
+        connection.commit()
+
+
+def covering_rollup(config_rollup, cols):
+    '''
+    Return the smallest rollup grouped on every given column, or None.
+
+    Parameters
+    ----------
+        config_rollup: config_rollup section of the yaml file
+        cols: columns grouped on or filtered by
+    '''
+    covering = [(len(group_col), tbl)
+                for tbl, group_col in config_rollup['rollups'].items()
+                if set(cols) <= set(group_col)]
+
+    return min(covering)[1] if covering else None
+
+
+def covers_months(sqlpipe, tbl: str, start: str, end: str):
+    '''
+    Return True if a rollup has been refreshed for every month from start
+    to end, as YYYYMM.
+    '''
+    refreshed = sqlpipe.query(
+        f'SELECT COUNT(*) AS n FROM {sqlpipe.database}.{MONTH_TBL} '
+        'WHERE `tbl` = %s AND `year_month` BETWEEN %s AND %s;',
+        (tbl, month_date(start), month_date(end))
+    )['n'].iloc[0]
+    delta = relativedelta(dt.strptime(end, '%Y%m'),
+                          dt.strptime(start, '%Y%m'))
+    months = delta.years * 12 + delta.months + 1
+
+    return refreshed == months
+
+
+def aggregate(sqlpipe, config_rollup, group_by: list, start: str, end: str,
+              filters: dict | None = None):
+    '''
+    Return the measures summed per month and group, read from a rollup
+    when one covers the columns and months asked for, and from the source
+    table otherwise.
+
+    Parameters
+    ----------
+        sqlpipe (DataPipe): database holding the tables
+        config_rollup: config_rollup section of the yaml file
+        group_by (list): columns to group on besides the month
+        start (str): first month, as YYYYMM
+        end (str): last month, as YYYYMM
+        filters (dict): column mapped to the list of values to keep
+
+    Returns
+    -------
+        pd.DataFrame of the month, group_by and measure columns
+    '''
+    filters = filters or {}
+    month_col = config_rollup['month_col']
+
+    tbl = covering_rollup(config_rollup, [*group_by, *filters])
+    if tbl is None or not covers_months(sqlpipe, tbl, start, end):
+        tbl = config_rollup['source']
+    logger.info(f'Aggregate of {group_by} read from {tbl}.')
+
+    cols = ', '.join(f'`{i}`' for i in (month_col, *group_by))
+    sums = ', '.join(f'SUM(`{i}`) AS `{i}`'
+                     for i in config_rollup['measures'])
+    if tbl == config_rollup['source']:
+        where, params = source_months(config_rollup, start, end)
+        where = [where]
+    else:
+        where = [f'`{month_col}` BETWEEN %s AND %s']
+        params = [month_date(start), month_date(end)]
+    for col, values in filters.items():
+        where.append(f'`{col}` IN ({', '.join(['%s'] * len(values))})')
+        params.extend(values)
+
+    df = sqlpipe.query(
+        f'SELECT {cols}, {sums} FROM {sqlpipe.database}.{tbl} '
+        f'WHERE {' AND '.join(where)} GROUP BY {cols} ORDER BY {cols};',
+        params
+    )
+
+    # SUM() comes back as decimal
+    measures = list(config_rollup['measures'])
+    df[measures] = df[measures].astype('Int64')
+
+    return df
@@ -0,0 +1,5 @@
+/* Add the MAXVALUE partition to an r_pv_train created before it was in */
+/* create_r_pv_train_part.sql, so that months are split out of it */
+ALTER TABLE `r_pv_train` ADD PARTITION (
+	PARTITION `pmax` VALUES LESS THAN (MAXVALUE)
+);
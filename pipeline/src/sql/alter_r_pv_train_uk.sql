@@ -0,0 +1,33 @@
+/* Add the natural key to an existing r_pv_train in transport */
+
+/* Drop the rows missing part of the natural key, which the key columns */
+/* no longer allow and the loader now quarantines */
+DELETE FROM `r_pv_train`
+WHERE `year_month` IS NULL
+	OR `day_type` IS NULL
+	OR `time_per_hour` IS NULL
+	OR `pt_type` IS NULL
+	OR `pt_code` IS NULL
+;
+
+/* Keep the latest loaded row of each duplicated natural key */
+DELETE t1 FROM `r_pv_train` t1
+INNER JOIN `r_pv_train` t2
+	ON t1.`year_month` = t2.`year_month`
+	AND t1.`day_type` = t2.`day_type`
+	AND t1.`time_per_hour` = t2.`time_per_hour`
+	AND t1.`pt_type` = t2.`pt_type`
+	AND t1.`pt_code` = t2.`pt_code`
+	AND t1.`id` < t2.`id`
+;
+
+/* InnoDB allows any number of duplicate keys holding a NULL, so the key */
+/* columns are made NOT NULL for the key to hold */
+ALTER TABLE `r_pv_train`
+	MODIFY `year_month` DATE NOT NULL,
+	MODIFY `day_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	MODIFY `time_per_hour` INT(11) NOT NULL,
+	MODIFY `pt_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	MODIFY `pt_code` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	ADD UNIQUE INDEX `uk_r_pv_train` (`year_month`, `day_type`, `time_per_hour`, `pt_type`, `pt_code`) USING BTREE
+;
@@ -0,0 +1,13 @@
+/* Create table etl_checkpoint in transport, holding the rows of a month
+   committed so far by a load with checkpoint enabled */
+CREATE TABLE `etl_checkpoint` (
+	`tbl` VARCHAR(64) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`year_month` CHAR(6) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`batch_offset` BIGINT(20) UNSIGNED NOT NULL,
+	`source` VARCHAR(64) NULL DEFAULT NULL COLLATE 'utf8mb4_general_ci',
+	`updated_at` DATETIME NOT NULL,
+	PRIMARY KEY (`tbl`, `year_month`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
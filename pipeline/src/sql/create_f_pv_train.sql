@@ -0,0 +1,67 @@
+/* Create the pv_train dimension tables and fact table f_pv_train in transport */
+
+/* Dimension tables, one small integer id per distinct code */
+CREATE TABLE `d_day_type` (
+	`id` TINYINT(3) UNSIGNED NOT NULL AUTO_INCREMENT,
+	`day_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	PRIMARY KEY (`id`) USING BTREE,
+	UNIQUE INDEX `uk_d_day_type` (`day_type`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
+
+CREATE TABLE `d_pt_type` (
+	`id` TINYINT(3) UNSIGNED NOT NULL AUTO_INCREMENT,
+	`pt_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	PRIMARY KEY (`id`) USING BTREE,
+	UNIQUE INDEX `uk_d_pt_type` (`pt_type`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
+
+CREATE TABLE `d_pt_code` (
+	`id` SMALLINT(5) UNSIGNED NOT NULL AUTO_INCREMENT,
+	`pt_code` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	PRIMARY KEY (`id`) USING BTREE,
+	UNIQUE INDEX `uk_d_pt_code` (`pt_code`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
+
+/* Fact table of integer columns, clustered on its natural key, with
+   year_month held as YYYYMM */
+CREATE TABLE `f_pv_train` (
+	`year_month` MEDIUMINT(8) UNSIGNED NOT NULL,
+	`day_type_id` TINYINT(3) UNSIGNED NOT NULL,
+	`time_per_hour` TINYINT(3) UNSIGNED NOT NULL,
+	`pt_type_id` TINYINT(3) UNSIGNED NOT NULL,
+	`pt_code_id` SMALLINT(5) UNSIGNED NOT NULL,
+	`total_tap_in_volume` INT(10) UNSIGNED NULL DEFAULT NULL,
+	`total_tap_out_volume` INT(10) UNSIGNED NULL DEFAULT NULL,
+	PRIMARY KEY (`year_month`, `day_type_id`, `time_per_hour`, `pt_type_id`, `pt_code_id`) USING BTREE,
+	INDEX `idx_f_pv_train_pt_code` (`pt_code_id`, `year_month`) USING BTREE
+)
+ENGINE=InnoDB
+;
+
+/* The fact table with its codes resolved, in the layout of r_pv_train.
+   year_month is computed, so filter months on yyyymm, the fact table's own
+   key, for the filter to use its index */
+CREATE VIEW `v_pv_train` AS
+SELECT
+	f.`year_month` AS `yyyymm`,
+	STR_TO_DATE(CONCAT(f.`year_month`, '01'), '%Y%m%d') AS `year_month`,
+	d.`day_type`,
+	f.`time_per_hour`,
+	t.`pt_type`,
+	c.`pt_code`,
+	f.`total_tap_in_volume`,
+	f.`total_tap_out_volume`
+FROM `f_pv_train` f
+INNER JOIN `d_day_type` d ON d.`id` = f.`day_type_id`
+INNER JOIN `d_pt_type` t ON t.`id` = f.`pt_type_id`
+INNER JOIN `d_pt_code` c ON c.`id` = f.`pt_code_id`
+;
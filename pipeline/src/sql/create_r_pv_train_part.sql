@@ -0,0 +1,23 @@
+/* Create table r_pv_train in transport, RANGE partitioned by month */
+/* Used with partition_exchange: True in lta_pv_train.yaml, the loader */
+/* splits each month it loads out of p_history or pmax into a partition */
+/* of its own */
+CREATE TABLE `r_pv_train` (
+	`id` BIGINT(20) NOT NULL AUTO_INCREMENT,
+	`year_month` DATE NOT NULL,
+	`day_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`time_per_hour` INT(11) NOT NULL,
+	`pt_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`pt_code` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`total_tap_in_volume` INT(11) NULL DEFAULT NULL,
+	`total_tap_out_volume` INT(11) NULL DEFAULT NULL,
+	PRIMARY KEY (`id`, `year_month`) USING BTREE,
+	UNIQUE INDEX `uk_r_pv_train` (`year_month`, `day_type`, `time_per_hour`, `pt_type`, `pt_code`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+PARTITION BY RANGE COLUMNS(`year_month`) (
+	PARTITION `p_history` VALUES LESS THAN ('2025-01-01'),
+	PARTITION `pmax` VALUES LESS THAN (MAXVALUE)
+)
+;
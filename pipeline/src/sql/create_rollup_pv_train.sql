@@ -0,0 +1,40 @@
+/* Create the pv_train rollup tables in transport, refreshed a month at a
+   time by import_pv_train, see config_rollup in lta_pv_train.yaml */
+
+/* Monthly tap volumes per station and day type */
+CREATE TABLE `ru_pv_train_station` (
+	`year_month` DATE NOT NULL,
+	`pt_code` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`day_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`total_tap_in_volume` BIGINT(20) NULL DEFAULT NULL,
+	`total_tap_out_volume` BIGINT(20) NULL DEFAULT NULL,
+	PRIMARY KEY (`year_month`, `pt_code`, `day_type`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
+
+/* Monthly hourly profile per day type, across every station */
+CREATE TABLE `ru_pv_train_hour` (
+	`year_month` DATE NOT NULL,
+	`day_type` VARCHAR(50) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`time_per_hour` INT(11) NOT NULL,
+	`total_tap_in_volume` BIGINT(20) NULL DEFAULT NULL,
+	`total_tap_out_volume` BIGINT(20) NULL DEFAULT NULL,
+	PRIMARY KEY (`year_month`, `day_type`, `time_per_hour`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
+
+/* Months each rollup has been refreshed for, queries only read a rollup
+   for months it covers */
+CREATE TABLE `etl_rollup_month` (
+	`tbl` VARCHAR(64) NOT NULL COLLATE 'utf8mb4_general_ci',
+	`year_month` DATE NOT NULL,
+	`refreshed_at` DATETIME NOT NULL,
+	PRIMARY KEY (`tbl`, `year_month`) USING BTREE
+)
+COLLATE='utf8mb4_general_ci'
+ENGINE=InnoDB
+;
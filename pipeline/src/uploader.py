@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+
+'''Uploads archived and derived files to S3 compatible object storage'''
+
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.exceptions import ClientError
+
+from manifest import Manifest
+from util import UDLogger
+
+# create logger
+ud_logger = UDLogger(filename='upload.log', name=__name__)
+logger = ud_logger.create_logger()
+
+MB = 1024 * 1024
+# s3 parts are at least 5MB, apart from the last one
+PART_SIZE = 64 * MB
+MAX_WORKERS = 4
+
+
+def sidecar_path(path: str):
+    '''
+    Return the path of the hidden file holding the state of the upload of
+    a file, next to it: the part uploaded so far of a multipart upload, or
+    the size and mtime of the file last uploaded.
+    '''
+    head, tail = os.path.split(path)
+
+    return os.path.join(head, f'.{tail}.upload.json')
+
+
+class S3Uploader:
+    '''
+    Create class to upload files to a bucket, skipping files unchanged since
+    their last upload, by size and mtime, or whose sha256 is already on the
+    object. Files larger than a part are sent as multipart uploads with
+    parts uploaded in parallel, whose progress is kept in a sidecar file so
+    that a failed upload resumes with the missing parts.
+
+    Parameters
+    ----------
+        bucket (str): bucket to upload to
+        prefix (str): key prefix of the uploaded objects
+        part_size (int): bytes per part of a multipart upload
+        max_workers (int): parts uploaded at once, which also bounds the
+            memory held in part buffers
+        client: boto3 s3 client, defaults to one for endpoint_url
+        endpoint_url (str): url of a non aws endpoint, e.g. minio
+    '''
+    def __init__(self, bucket: str, prefix: str = '',
+                 part_size: int = PART_SIZE, max_workers: int = MAX_WORKERS,
+                 client=None, endpoint_url: str | None = None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.client = client or boto3.client('s3', endpoint_url=endpoint_url)
+
+    def key(self, name: str):
+        '''
+        Return the object key of a file name relative to the prefix.
+        '''
+        return f'{self.prefix}/{name}' if self.prefix else name
+
+    def remote_sha256(self, key: str):
+        '''
+        Return the sha256 recorded on an object, or None if it does not
+        exist.
+        '''
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                return None
+            raise
+
+        return head['Metadata'].get('sha256')
+
+    def read_state(self, path: str):
+        '''
+        Return the upload state kept in the sidecar of a file, or None.
+        '''
+        state_path = sidecar_path(path)
+        if not os.path.exists(state_path):
+            return None
+
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def save_state(self, path: str, state: dict):
+        '''
+        Keep the upload state of a file in its sidecar.
+        '''
+        with open(sidecar_path(path), 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+
+    def unchanged(self, path: str, key: str, stamp: dict):
+        '''
+        Return True if the file was uploaded to the key and its size and
+        mtime have not changed since.
+        '''
+        state = self.read_state(path)
+
+        return state is not None and state.get('done', False) and \
+            state['key'] == key and \
+            {i: state.get(i) for i in stamp} == stamp
+
+    def upload(self, path: str, name: str | None = None):
+        '''
+        Upload a file unless the object already holds the same content.
+
+        Parameters
+        ----------
+            path (str): file to upload
+            name (str): name of the object under the prefix, defaults to the
+                file name
+
+        Returns
+        -------
+            'skipped' or 'uploaded'
+        '''
+        path = os.path.expanduser(path)
+        key = self.key(name or os.path.basename(path))
+
+        # files unchanged since their last upload are neither hashed nor
+        # looked up in the bucket
+        stat = os.stat(path)
+        stamp = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if self.unchanged(path, key, stamp):
+            logger.info(f'{key} skipped, unchanged since uploaded')
+            return 'skipped'
+
+        with open(path, 'rb') as f:
+            sha256, size = Manifest.digest(f)
+        done = {'key': key, 'sha256': sha256, 'done': True, **stamp}
+
+        if self.remote_sha256(key) == sha256:
+            self.save_state(path, done)
+            logger.info(f'{key} skipped, already uploaded')
+            return 'skipped'
+
+        try:
+            if size <= self.part_size:
+                with open(path, 'rb') as f:
+                    self.client.put_object(Bucket=self.bucket, Key=key,
+                                           Body=f, Metadata={'sha256': sha256})
+            else:
+                self.upload_multipart(path, key, sha256, size)
+        except Exception as e:
+            logger.error(f'The error {e} occurred uploading {path}.')
+            raise
+
+        self.save_state(path, done)
+        logger.info(f'{path} uploaded to s3://{self.bucket}/{key}, '
+                    f'{size} bytes')
+
+        return 'uploaded'
+
+    def resume_state(self, path: str, key: str, sha256: str):
+        '''
+        Return the state of an earlier multipart upload of the same content,
+        or a new upload. Parts are only taken as done if s3 still has them,
+        and an upload left by content that has changed since is aborted.
+        '''
+        state = self.read_state(path)
+        if state is not None and 'upload_id' in state:
+            if (state['key'], state['sha256'], state['part_size']) == \
+                    (key, sha256, self.part_size):
+                try:
+                    listed = self.client.list_parts(
+                        Bucket=self.bucket, Key=key,
+                        UploadId=state['upload_id'])
+                    state['parts'] = {str(i['PartNumber']): i['ETag']
+                                      for i in listed.get('Parts', [])}
+                    logger.info(f'{key} resuming, {len(state['parts'])} '
+                                f'parts already uploaded')
+                    return state
+                except ClientError:
+                    logger.info(f'{key} upload expired, starting again')
+            else:
+                self.abort(state)
+
+        upload = self.client.create_multipart_upload(
+            Bucket=self.bucket, Key=key, Metadata={'sha256': sha256})
+
+        return {'key': key, 'sha256': sha256, 'part_size': self.part_size,
+                'upload_id': upload['UploadId'], 'parts': {}}
+
+    def abort(self, state: dict):
+        '''
+        Abort a multipart upload, so that s3 drops the parts it holds.
+        '''
+        try:
+            self.client.abort_multipart_upload(
+                Bucket=self.bucket, Key=state['key'],
+                UploadId=state['upload_id'])
+            logger.info(f'{state['key']} stale upload aborted, the file '
+                        'has changed since')
+        except ClientError as e:
+            # already aborted, completed or expired
+            logger.info(f'{state['key']} stale upload not aborted: {e}')
+
+    def upload_multipart(self, path: str, key: str, sha256: str, size: int):
+        '''
+        Upload a file as a multipart upload, with the parts not yet uploaded
+        sent in parallel. Progress is saved after each part, and the upload
+        is left open on error so that the next call resumes it.
+
+        Parameters
+        ----------
+            path (str): file to upload
+            key (str): object key
+            sha256 (str): sha256 hex digest of the file
+            size (int): size of the file in bytes
+        '''
+        state = self.resume_state(path, key, sha256)
+        lock = threading.Lock()
+
+        def save():
+            self.save_state(path, state)
+
+        def upload_part(number: int):
+            with open(path, 'rb') as f:
+                f.seek((number - 1) * self.part_size)
+                body = f.read(self.part_size)
+            part = self.client.upload_part(
+                Bucket=self.bucket, Key=key, UploadId=state['upload_id'],
+                PartNumber=number, Body=body)
+            with lock:
+                state['parts'][str(number)] = part['ETag']
+                save()
+
+        save()
+        count = -(-size // self.part_size)
+        pending = [i for i in range(1, count + 1)
+                   if str(i) not in state['parts']]
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [executor.submit(upload_part, i) for i in pending]
+        errors = [future.exception() for future in futures
+                  if future.exception() is not None]
+        if errors:
+            raise Exception(f'Error: {len(errors)} of {count} parts of {key} '
+                            f'failed, rerun to resume: {errors[0]}')
+
+        self.client.complete_multipart_upload(
+            Bucket=self.bucket, Key=key, UploadId=state['upload_id'],
+            MultipartUpload={'Parts': [
+                {'PartNumber': i, 'ETag': state['parts'][str(i)]}
+                for i in range(1, count + 1)
+            ]})
+
+    def upload_dir(self, local_dir: str, name: str | None = None):
+        '''
+        Upload every file under a directory, keeping its layout, e.g. the
+        partitions of a parquet dataset. Hidden and underscore prefixed
+        files and directories are left out.
+
+        Parameters
+        ----------
+            local_dir (str): directory to upload
+            name (str): name of the directory under the prefix, defaults to
+                its own name
+
+        Returns
+        -------
+            dict of the status of each file uploaded
+        '''
+        local_dir = os.path.expanduser(local_dir).rstrip('/')
+        name = name or os.path.basename(local_dir)
+
+        results = {}
+        for root, dirs, files in os.walk(local_dir):
+            dirs[:] = sorted(i for i in dirs if not i.startswith(('.', '_')))
+            for fname in sorted(files):
+                if fname.startswith(('.', '_')):
+                    continue
+                path = os.path.join(root, fname)
+                rel = os.path.relpath(path, local_dir).replace(os.sep, '/')
+                results[path] = self.upload(path, f'{name}/{rel}')
+
+        return results
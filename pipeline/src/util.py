@@ -4,10 +4,27 @@
 
 import os
 
+import atexit
+import json
+import queue
 import zipfile
 import logging
+import logging.handlers
+from contextlib import contextmanager
 import yaml
 
+# dtypes accepted in the col_pd maps of lta_<name>.yaml
+DTYPES = ('str', 'string', 'category', 'bool', 'float32', 'float64',
+          'int8', 'int16', 'int32', 'int64', 'Int64')
+LOAD_MODES = ('executemany', 'infile', 'upsert')
+RULES = ('min', 'max', 'in', 'not_null', 'pattern')
+
+# parsed configs keyed by path, with the mtime they were parsed at
+_config_cache = {}
+
+# background listeners writing out log records, one per log file
+_log_listeners = {}
+
 
 def safe_open(path: str, mode: str):
     '''
@@ -24,29 +41,280 @@ def safe_open(path: str, mode: str):
     return open(full_path, mode)
 
 
+def config_dir():
+    '''
+    Utility function to return the directory holding the config files.
+    '''
+    return os.getenv('CONFIG_DIR') or os.path.expanduser('~/pipeline/config')
+
+
+class FrozenConfig(dict):
+    '''
+    Read only config handed out by load_config(). Sections are FrozenConfig
+    and lists are tuples, and keys can also be read as attributes. It stays
+    a dict so that it can be passed on as is, e.g. as pd.read_csv() dtype.
+
+    Parameters
+    ----------
+        data (dict): config as parsed from the yaml file
+    '''
+    def __init__(self, data: dict):
+        super().__init__((k, freeze(v)) for k, v in data.items())
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError('FrozenConfig is read only')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    clear = pop = popitem = setdefault = update = _read_only
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        self._read_only()
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+
+def freeze(value):
+    '''
+    Utility function to convert parsed yaml into read only values.
+
+    Parameters
+    ----------
+        value: dict, list or scalar parsed from yaml
+    '''
+    if isinstance(value, dict):
+        return FrozenConfig(value)
+    if isinstance(value, list):
+        return tuple(freeze(i) for i in value)
+
+    return value
+
+
+def _check_type(problems: list, conf, key: str, types, required=True):
+    '''
+    Append a problem if conf[key] is missing or not of the given type(s).
+    '''
+    if key not in conf:
+        if required:
+            problems.append(f'{key} is missing')
+        return False
+    if not isinstance(conf[key], types):
+        problems.append(f'{key} should be {types}, got {conf[key]!r}')
+        return False
+
+    return True
+
+
+def _check_rules(problems: list, rules: dict, col_pd: dict):
+    '''
+    Validate the data quality rules of a config_<name> section.
+    '''
+    for col, col_rules in rules.items():
+        if col not in col_pd:
+            problems.append(f'rules.{col} is not in col_pd')
+        unknown = set(col_rules) - set(RULES)
+        if unknown:
+            problems.append(f'rules.{col} has unknown rules {sorted(unknown)}')
+
+
+def _check_dataset(problems: list, conf: dict):
+    '''
+    Validate a config_<name> section of lta_<name>.yaml.
+    '''
+    _check_type(problems, conf, 'url_suffix', str)
+    _check_type(problems, conf, 'zip_prefix', str, required=False)
+    _check_type(problems, conf, 'parquet_prefix', str, required=False)
+    _check_type(problems, conf, 'delta_prefix', str, required=False)
+    _check_type(problems, conf, 'cache_version', str, required=False)
+    _check_type(problems, conf, 'chunksize', int, required=False)
+
+    if _check_type(problems, conf, 'col_pd', dict, required=False):
+        for col, dtype in conf['col_pd'].items():
+            if dtype not in DTYPES:
+                problems.append(f'col_pd.{col} has unknown dtype {dtype!r}')
+
+    if _check_type(problems, conf, 'rules', dict, required=False):
+        _check_type(problems, conf, 'quarantine_prefix', str)
+        _check_rules(problems, conf['rules'], conf.get('col_pd') or {})
+
+
+def _check_db_tbl(problems: list, conf: dict, col_pd: dict):
+    '''
+    Validate the config_db_tbl section of lta_<name>.yaml.
+    '''
+    _check_type(problems, conf, 'tbl', str)
+    if not _check_type(problems, conf, 'tbl_col', dict):
+        return
+
+    if col_pd and list(conf['tbl_col']) != list(col_pd):
+        problems.append('tbl_col should map the columns of col_pd in order')
+
+    _check_type(problems, conf, 'checkpoint', bool, required=False)
+    _check_type(problems, conf, 'parallel', int, required=False)
+    _check_type(problems, conf, 'parallel_atomic', bool, required=False)
+
+    if conf.get('load_mode', 'executemany') not in LOAD_MODES:
+        problems.append(f'load_mode should be one of {LOAD_MODES}')
+
+    if _check_type(problems, conf, 'key_col', list, required=False):
+        unknown = set(conf['key_col']) - set(conf['tbl_col'].values())
+        if unknown:
+            problems.append(f'key_col {sorted(unknown)} not in tbl_col')
+
+    if _check_type(problems, conf, 'dims', dict, required=False):
+        unknown = set(conf['dims']) - set(conf['tbl_col'])
+        if unknown:
+            problems.append(f'dims {sorted(unknown)} not in tbl_col')
+
+
+def _check_rollup(problems: list, conf: dict):
+    '''
+    Validate the config_rollup section of lta_<name>.yaml.
+    '''
+    for key in ('source', 'month_col'):
+        _check_type(problems, conf, key, str)
+    _check_type(problems, conf, 'measures', list)
+    if _check_type(problems, conf, 'rollups', dict):
+        for tbl, group_col in conf['rollups'].items():
+            if not isinstance(group_col, list):
+                problems.append(f'rollups.{tbl} should list its columns')
+
+
+def _check_rollup_source(problems: list, conf: dict, fact: bool):
+    '''
+    Validate that the rollups are computed from the table loaded, which with
+    fact is the view over the fact table, filtered on its month_key.
+    '''
+    if fact:
+        section = conf.get('config_fact_tbl') or {}
+        source, month_key = section.get('view'), section.get('month_key')
+    else:
+        source, month_key = (conf.get('config_db_tbl') or {}).get('tbl'), None
+    if source is None:
+        return
+
+    rollup = conf['config_rollup']
+    if (rollup.get('source'), rollup.get('month_key')) != (source, month_key):
+        problems.append(f'config_rollup should have source {source!r} and '
+                        f'month_key {month_key!r} with fact: {bool(fact)}')
+
+
+def _check_delta(problems: list, conf: dict):
+    '''
+    Validate the table section loaded in delta mode, which upserts the
+    changed rows and deletes the removed ones by key_col.
+    '''
+    if conf.get('load_mode') != 'upsert' or not conf.get('key_col'):
+        problems.append('delta_prefix needs load_mode upsert and key_col')
+    if conf.get('partition_exchange', False):
+        problems.append('delta_prefix cannot be used with '
+                        'partition_exchange')
+
+
+def _check_lta(problems: list, name: str, conf: dict):
+    '''
+    Validate the sections of lta_<name>.yaml.
+    '''
+    dataset = conf.get(f'config_{name}')
+    if _check_type(problems, conf, f'config_{name}', dict):
+        _check_dataset(problems, dataset)
+
+    col_pd = dataset.get('col_pd') if dataset else None
+    for section in ('config_db_tbl', 'config_fact_tbl'):
+        if _check_type(problems, conf, section, dict, required=False):
+            _check_db_tbl(problems, conf[section], col_pd)
+
+    if dataset and dataset.get('delta_prefix'):
+        section = 'config_fact_tbl' if dataset.get('fact') else \
+            'config_db_tbl'
+        _check_delta(problems, conf.get(section) or {})
+
+    if _check_type(problems, conf, 'config_rollup', dict, required=False):
+        _check_rollup(problems, conf['config_rollup'])
+        _check_rollup_source(problems, conf, (dataset or {}).get('fact'))
+
+
+def validate_config(config_file: str, conf: dict):
+    '''
+    Utility function to check a parsed config file against its schema,
+    raising an exception listing every problem found.
+
+    Parameters
+    ----------
+        config_file (str): config file name
+        conf (dict): config as parsed from the yaml file
+    '''
+    problems = []
+    if not isinstance(conf, dict):
+        problems.append('file should hold a mapping')
+    elif config_file == 'config.yaml':
+        if _check_type(problems, conf, 'api', dict):
+            _check_type(problems, conf['api'], 'lta_url', str)
+            _check_type(problems, conf['api'], 'lta_key', str)
+    elif config_file.startswith('lta_'):
+        _check_lta(problems, config_file[len('lta_'):-len('.yaml')], conf)
+
+    if problems:
+        raise Exception(f'Error: invalid config {config_file}: '
+                        f'{'; '.join(problems)}')
+
+
 def load_config(config_file: str):
     '''
     Utility function to load the requested config files.
 
+    Each file is parsed and validated once, and the same read only config
+    is handed out until the file's mtime changes.
+
     Parameters
     ----------
         config_file (str): config file name
     '''
 
-    # look for config directory 
-    config_dir = os.getenv('CONFIG_DIR')
+    config_path = os.path.join(config_dir(), config_file)
+    mtime = os.stat(config_path).st_mtime_ns
 
-    if not config_dir:
-        config_dir = os.path.expanduser('~/pipeline/config')
-
-    config_path = os.path.join(config_dir, config_file)
+    cached = _config_cache.get(config_path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
 
     with open(f'{config_path}', 'r', encoding='utf-8') as f:
         conf = yaml.safe_load(f)
 
+    validate_config(config_file, conf)
+    conf = freeze(conf)
+    _config_cache[config_path] = (mtime, conf)
+
     return conf
 
 
+def check_member(zip_path, fname, out_dir, logger):
+    '''
+    Utility function to reject zip members that would resolve outside of
+    the destination directory (path traversal).
+
+    Parameters
+    ----------
+        zip_path (str): path to the zip file
+        fname (str): name of the member within the zip file
+        out_dir (str): path to the destination directory
+    '''
+    abs_path = os.path.abspath(os.path.join(out_dir, fname))
+    if not abs_path.startswith(os.path.abspath(out_dir)):
+        err_msg = f'Unsafe file detected in {zip_path}: {fname}'
+        logger.error(err_msg)
+        raise Exception(err_msg)
+
+
 def unzip_file(zip_path, out_dir, logger):
     '''
     Utility function to unzip and save a file in a specified dir.
@@ -61,69 +329,166 @@ def unzip_file(zip_path, out_dir, logger):
             for fname in zip_obj.namelist():
 
                 # check for path traversal
-                abs_path = os.path.abspath(os.path.join(out_dir, fname))
-                if not abs_path.startswith(os.path.abspath(out_dir)):
-                    err_msg = f'Unsafe file detected in {zip_path}: {fname}'
-                    logger.error(err_msg)
-                    raise Exception(err_msg)
+                check_member(zip_path, fname, out_dir, logger)
 
                 # extract files to destination directory
                 zip_obj.extract(fname, out_dir)
-                logger.info(f'{fname} extracted to: {out_dir}')
+                logger.debug(f'{fname} extracted to: {out_dir}')
 
+            logger.info(f'{len(zip_obj.namelist())} files extracted to: '
+                        f'{out_dir}')
+
+    except zipfile.BadZipFile:
+        raise Exception(f'Error: {zip_path} is not a valid zip file.')
+
+
+@contextmanager
+def open_zip_member(zip_path, member, logger):
+    '''
+    Utility function to open a file within a zip as a decompressed stream,
+    without extracting it to disk.
+
+    Parameters
+    ----------
+        zip_path (str): path to the zip file
+        member (str): name of the file within the zip, another file is never
+            opened in its place as it may hold another month
+    '''
+    zip_path = os.path.expanduser(zip_path)
+    try:
+        zip_obj = zipfile.ZipFile(zip_path, 'r')
     except zipfile.BadZipFile:
         raise Exception(f'Error: {zip_path} is not a valid zip file.')
 
+    with zip_obj:
+        names = zip_obj.namelist()
+
+        # the same path traversal check as when extracting
+        for fname in names:
+            check_member(zip_path, fname, os.path.dirname(zip_path), logger)
+
+        if member not in names:
+            err_msg = f'Error: {member} not found in {zip_path}, ' \
+                f'which holds {names}'
+            logger.error(err_msg)
+            raise Exception(err_msg)
+
+        with zip_obj.open(member, 'r') as f:
+            logger.info(f'{member} opened from: {zip_path}')
+            yield f
+
+
+class JsonFormatter(logging.Formatter):
+    '''
+    Log formatter writing each record as one line of json.
+    '''
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, self.datefmt),
+            'level': record.levelname,
+            'name': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+
+        return json.dumps(entry)
+
+
+def stop_log_listeners():
+    '''
+    Utility function to flush and stop every log listener, run at exit.
+    '''
+    for listener in _log_listeners.values():
+        listener.stop()
+    _log_listeners.clear()
+
+
+atexit.register(stop_log_listeners)
+
 
 class UDLogger:
     '''
     User defined logger class.
 
+    Loggers only put records on a queue, and a listener thread per log file
+    writes them out to the console and the file, so logging does not block
+    on i/o. Creating the same logger again does not add more handlers.
+
     Parameters
     ----------
         filename (str): .log file the log messages to be written to
         name (str): name of the logger (typically the module's name)
+        fmt (str): 'text' or 'json', defaults to the LOG_FORMAT environment
+            variable or 'text'
     '''
-    def __init__(self, filename: str, name: str):
+    def __init__(self, filename: str, name: str, fmt: str | None = None):
         self.filename = os.path.expanduser(f'~/logs/{filename}')
         self.mode = 'a'
         self.encoding = 'utf-8'
         self.name = name
+        self.fmt = fmt or os.getenv('LOG_FORMAT', 'text')
 
     def create_logger(self):
         '''
-        Create new logger.
+        Create new logger, or return it unchanged if it already writes to
+        this log file.
+        '''
+        logger = logging.getLogger(self.name)
+        logger.setLevel(logging.INFO)
+
+        for handler in logger.handlers:
+            if getattr(handler, 'log_file', None) == self.filename:
+                return logger
 
-        Parameters
-        ----------
-            name (str): logger name
+        listener = self.get_listener()
+        queue_handler = logging.handlers.QueueHandler(listener.queue)
+        queue_handler.log_file = self.filename
+        logger.addHandler(queue_handler)
+
+        return logger
+
+    def get_listener(self):
+        '''
+        Return the running listener of the log file, starting it with its
+        console and file handlers on first use.
         '''
+        listener = _log_listeners.get(self.filename)
+        if listener is not None:
+            return listener
+
         # create directory to hold .log files
         log_dir = os.path.expanduser('~/logs')
         os.makedirs(log_dir, exist_ok=True)
 
-        logger = logging.getLogger(self.name)
-        logger.setLevel(logging.INFO)
-
         # create handlers
         console_handler = logging.StreamHandler()
+        # the file is only opened when the first record is written
         info_handler = logging.FileHandler(
             filename=self.filename,
             mode=self.mode,
-            encoding=self.encoding
+            encoding=self.encoding,
+            delay=True
         )
 
         # logging format
-        formatter = logging.Formatter(
-            fmt='%(asctime)s: %(levelname)s:%(name)s:%(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
-
-        # assignment of formatter to handler and handler to logger
+        if self.fmt == 'json':
+            formatter = JsonFormatter(datefmt='%Y-%m-%dT%H:%M:%S')
+        else:
+            formatter = logging.Formatter(
+                fmt='%(asctime)s: %(levelname)s:%(name)s:%(message)s',
+                datefmt='%Y-%m-%d %H:%M:%S'
+            )
+
+        # assignment of formatter to handler and handler to listener
         console_handler.setFormatter(formatter)
         info_handler.setFormatter(formatter)
 
-        logger.addHandler(console_handler)
-        logger.addHandler(info_handler)
+        listener = logging.handlers.QueueListener(
+            queue.SimpleQueue(), console_handler, info_handler,
+            respect_handler_level=True
+        )
+        listener.start()
+        _log_listeners[self.filename] = listener
 
-        return logger
+        return listener
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+
+'''Data quality rules, evaluated over whole columns at a time'''
+
+import os
+
+import pandas as pd
+
+from util import UDLogger
+
+# create logger
+ud_logger = UDLogger(filename='import.log', name=__name__)
+logger = ud_logger.create_logger()
+
+# mask of the values passing each rule, missing values fail every rule
+CHECKS = {
+    'min': lambda col, value: col >= value,
+    'max': lambda col, value: col <= value,
+    'in': lambda col, value: col.isin(value),
+    'not_null': lambda col, value: col.notna() | (not value),
+    'pattern': lambda col, value: col.astype('string').str.fullmatch(
+        value).fillna(False).astype(bool),
+}
+
+
+def failed_rules(df: pd.DataFrame, rules: dict):
+    '''
+    Return the rules each row fails, as 'COLUMN.rule' separated by ';', or
+    an empty string for rows passing every rule.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): data to check
+        rules (dict): column mapped to its rules, e.g. {'min': 0, 'max': 23}
+    '''
+    failed = pd.Series('', index=df.index, dtype=object)
+    for col, col_rules in rules.items():
+        for rule, value in col_rules.items():
+            # nullable columns compare missing values as NA
+            passed = CHECKS[rule](df[col], value).fillna(False)
+            mask = ~passed.to_numpy(dtype=bool)
+            if mask.any():
+                failed[mask] += f'{col}.{rule};'
+
+    return failed
+
+
+def split_valid(df: pd.DataFrame, rules: dict):
+    '''
+    Split a dataframe into the rows passing every rule and the rows failing
+    any, the latter with the rules they fail in a failed_rules column.
+
+    Parameters
+    ----------
+        df (pd.DataFrame): data to check
+        rules (dict): column mapped to its rules
+
+    Returns
+    -------
+        tuple of the valid and the rejected dataframes
+    '''
+    failed = failed_rules(df, rules)
+    bad = failed.to_numpy() != ''
+    if not bad.any():
+        return df, df.iloc[:0].assign(failed_rules='')
+
+    rejected = df[bad].assign(failed_rules=failed[bad].str.rstrip(';'))
+
+    return df[~bad], rejected
+
+
+class Quarantine:
+    '''
+    Create class to validate chunks of data, passing on the valid rows and
+    appending the rejected ones to a quarantine csv file. The file is
+    started afresh by each load, a load resumed from a checkpoint still
+    validating the chunks it skips, so that it holds the rejected rows of
+    the file once.
+
+    Parameters
+    ----------
+        path (str): quarantine csv file, replaced by the first chunk
+        rules (dict): column mapped to its rules
+    '''
+    def __init__(self, path: str, rules: dict):
+        self.path = os.path.expanduser(path)
+        self.rules = rules
+        self.count = 0
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __call__(self, df: pd.DataFrame):
+        '''
+        Return the valid rows of a chunk, quarantining the rest.
+        '''
+        valid, rejected = split_valid(df, self.rules)
+        if not rejected.empty:
+            rejected.to_csv(self.path, mode='a', index=False,
+                            header=self.count == 0)
+            self.count += rejected.shape[0]
+            logger.warning(f'{rejected.shape[0]} rows failed validation, '
+                           f'quarantined to {self.path}.')
+
+        return valid
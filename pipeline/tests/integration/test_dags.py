@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+import os
+
+import pytest
+
+pytest.importorskip('airflow')
+
+from airflow.models import DagBag  # noqa: E402
+
+DAG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..',
+                       'airflow', 'dags')
+
+
+@pytest.fixture(scope='module')
+def dagbag():
+    return DagBag(dag_folder=os.path.abspath(DAG_DIR), include_examples=False)
+
+
+def test_dags_import(dagbag):
+    '''
+    Perform integration test of parsing the airflow dags.
+    1) Every dag file imports without error
+    2) Both dags are defined
+    '''
+    assert dagbag.import_errors == {}
+    assert {'transport_dag', 'pv_train_backfill'} <= set(dagbag.dag_ids)
+
+
+def test_dags_wiring(dagbag):
+    '''
+    Perform integration test of the task dependencies of the dags.
+    1) The daily run fetches, unzips, validates and loads in turn
+    2) Each backfilled month waits for its csv, then validates and loads
+    '''
+    dag = dagbag.get_dag('transport_dag')
+    assert dag.get_task('unzip').upstream_task_ids == {'fetch'}
+    assert dag.get_task('validate').upstream_task_ids == {'unzip'}
+    assert dag.get_task('load').upstream_task_ids == {'unzip', 'validate'}
+
+    # the tasks of the group also take the month from the months task
+    dag = dagbag.get_dag('pv_train_backfill')
+    upstream = {i: dag.get_task(f'backfill_month.{i}').upstream_task_ids
+                for i in ('wait_for_csv', 'validate', 'load')}
+    assert 'backfill_month.csv_path' in upstream['wait_for_csv']
+    assert 'backfill_month.wait_for_csv' in upstream['validate']
+    assert 'backfill_month.validate' in upstream['load']
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+
+import asyncio
+import time
+from datetime import date
+
+import httpx
+import pytest
+
+from lta.fetcher import DataMallFetcher
+from lta.fetcher import HostRateLimiter
+
+
+@pytest.fixture
+def config_dir(monkeypatch, tmp_path):
+    '''
+    Config dir registering two datasets, with a dummy key.
+    '''
+    key_path = tmp_path / 'key_lta.txt'
+    key_path.write_text('dummy_key\n')
+
+    (tmp_path / 'config.yaml').write_text(
+        'api:\n'
+        "    lta_url: 'https://datamall2.mytransport.sg/'\n"
+        f"    lta_key: '{key_path}'\n"
+        '    max_connections: 2\n'
+        '    rate_per_host: 1000\n'
+    )
+    for name, suffix in (('pv_train', 'PV/Train'), ('pv_bus', 'PV/Bus')):
+        (tmp_path / f'lta_{name}.yaml').write_text(
+            f'config_{name}:\n'
+            f"    url_suffix: 'ltaodataservice/{suffix}'\n"
+            f"    zip_prefix: '{tmp_path / 'zip'}'\n"
+        )
+
+    monkeypatch.setenv('CONFIG_DIR', str(tmp_path))
+    return tmp_path
+
+
+def test_fetcher_fetch_all(config_dir):
+    '''
+    Perform integration test of DataMallFetcher against a stand-in server.
+    1) Every dataset in the registry is looked up and downloaded
+    2) Downloads overlap rather than running one after the other
+    3) An unchanged zip that has been loaded is skipped on the next run
+    '''
+    in_flight = {'now': 0, 'max': 0}
+
+    async def handler(request):
+        if request.url.host == 'datamall2.mytransport.sg':
+            assert request.headers['AccountKey'] == 'dummy_key'
+            name = request.url.path.rsplit('/', 1)[-1].lower()
+            link = f'https://files.example.com/{name}.zip'
+            return httpx.Response(200, json={'value': [{'Link': link}]})
+
+        if request.headers.get('If-None-Match') == '"v1"':
+            return httpx.Response(304)
+
+        in_flight['now'] += 1
+        in_flight['max'] = max(in_flight['max'], in_flight['now'])
+        await asyncio.sleep(0.05)
+        in_flight['now'] -= 1
+        return httpx.Response(200, headers={'ETag': '"v1"'},
+                              content=request.url.path.encode())
+
+    fetcher = DataMallFetcher(date(2025, 8, 1),
+                              transport=httpx.MockTransport(handler))
+    results = fetcher.run()
+
+    assert results == {
+        'pv_bus': f'{config_dir}/zip/pv_bus_20250801.zip',
+        'pv_train': f'{config_dir}/zip/pv_train_20250801.zip'
+    }
+    assert (config_dir / 'zip' / 'pv_bus_20250801.zip').read_bytes() == \
+        b'/bus.zip'
+    assert in_flight['max'] == 2
+
+    # zips are only skipped on their etag once loaded
+    for name, zip_path in results.items():
+        fetcher.sources[name].mark_loaded(zip_path)
+    assert fetcher.run() == {'pv_bus': None, 'pv_train': None}
+
+
+def test_fetcher_fetch_fail(config_dir):
+    '''
+    Perform integration test of DataMallFetcher errors.
+    1) A failed dataset raises once the others have finished
+    '''
+    def handler(request):
+        if request.url.path.endswith('Bus'):
+            return httpx.Response(403)
+        if request.url.host == 'datamall2.mytransport.sg':
+            link = 'https://files.example.com/train.zip'
+            return httpx.Response(200, json={'value': [{'Link': link}]})
+        return httpx.Response(200, content=b'zip')
+
+    fetcher = DataMallFetcher(date(2025, 8, 1),
+                              transport=httpx.MockTransport(handler))
+
+    with pytest.raises(Exception) as excinfo:
+        fetcher.run()
+    assert 'pv_bus: Error: 403' in str(excinfo.value)
+    assert (config_dir / 'zip' / 'pv_train_20250801.zip').exists()
+
+
+def test_fetcher_resume_complete(config_dir):
+    '''
+    Perform integration test of DataMallFetcher resuming a complete .part.
+    1) A 416 whose Content-Range matches the .part renames it into place
+    '''
+    zip_dir = config_dir / 'zip'
+    zip_dir.mkdir()
+    for name in ('pv_train', 'pv_bus'):
+        (zip_dir / f'{name}_20250801.zip.part').write_bytes(b'zipcontent')
+        (zip_dir / f'{name}.json').write_text(
+            '{"etag": "\\"v1\\"", "last_modified": null, "complete": false}')
+
+    def handler(request):
+        if request.url.host == 'datamall2.mytransport.sg':
+            link = 'https://files.example.com/train.zip'
+            return httpx.Response(200, json={'value': [{'Link': link}]})
+        assert request.headers['Range'] == 'bytes=10-'
+        return httpx.Response(416, headers={'Content-Range': 'bytes */10'})
+
+    fetcher = DataMallFetcher(date(2025, 8, 1),
+                              transport=httpx.MockTransport(handler))
+
+    assert fetcher.run()['pv_train'] == f'{zip_dir}/pv_train_20250801.zip'
+    assert (zip_dir / 'pv_train_20250801.zip').read_bytes() == b'zipcontent'
+    assert not (zip_dir / 'pv_train_20250801.zip.part').exists()
+
+
+def test_fetcher_run_twice(config_dir):
+    '''
+    Perform integration test of DataMallFetcher run more than once.
+    1) Each run, in its own event loop, makes its own rate limiter
+    2) Both runs download every dataset
+    '''
+    def handler(request):
+        if request.url.host == 'datamall2.mytransport.sg':
+            name = request.url.path.rsplit('/', 1)[-1].lower()
+            link = f'https://files.example.com/{name}.zip'
+            return httpx.Response(200, json={'value': [{'Link': link}]})
+        return httpx.Response(200, content=b'zip')
+
+    fetcher = DataMallFetcher(date(2025, 8, 1),
+                              transport=httpx.MockTransport(handler))
+    assert fetcher.limiter is None
+
+    first = fetcher.run()
+    limiter = fetcher.limiter
+    second = fetcher.run()
+
+    assert fetcher.limiter is not limiter
+    assert None not in first.values() and first == second
+
+
+def test_host_rate_limiter():
+    '''
+    Perform unit test for HostRateLimiter.
+    1) Requests to one host are spaced out by 1 / rate
+    2) Other hosts are not held back
+    '''
+    async def run():
+        limiter = HostRateLimiter(rate=20)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait('https://a.example.com/x')
+                               for _ in range(3)))
+        elapsed_a = time.monotonic() - start
+        start = time.monotonic()
+        await limiter.wait('https://b.example.com/x')
+        return elapsed_a, time.monotonic() - start
+
+    elapsed_a, elapsed_b = asyncio.run(run())
+
+    assert elapsed_a >= 0.1
+    assert elapsed_b < 0.05
+
+
+def test_fetcher_manifest_skip(config_dir):
+    '''
+    Perform integration test of DataMallFetcher against the manifest.
+    1) A zip whose content was loaded before is skipped, even under a new
+       ETag
+    '''
+    manifest = config_dir / 'manifest.db'
+    conf = (config_dir / 'lta_pv_train.yaml').read_text()
+    (config_dir / 'lta_pv_train.yaml').write_text(
+        conf + f"    manifest: '{manifest}'\n")
+    etags = iter(['"v1"', '"v2"'])
+
+    def handler(request):
+        if request.url.host == 'datamall2.mytransport.sg':
+            link = 'https://files.example.com/train.zip'
+            return httpx.Response(200, json={'value': [{'Link': link}]})
+        return httpx.Response(200, headers={'ETag': next(etags)},
+                              content=b'zip')
+
+    fetcher = DataMallFetcher(date(2025, 8, 1), names=['pv_train'],
+                              transport=httpx.MockTransport(handler))
+    zip_path = fetcher.run()['pv_train']
+    fetcher.sources['pv_train'].mark_loaded(zip_path)
+
+    assert fetcher.run() == {'pv_train': None}
@@ -1,10 +1,17 @@
 #!/usr/bin/env python3
 
+import zipfile
+
 import pandas as pd
 import pytest
+from datetime import date
 from unittest.mock import patch, MagicMock
 
+from loaders.import_pv_train import check_pv_train
 from loaders.import_pv_train import import_pv_train
+from loaders.import_pv_train import load_pv_train
+from import_func import DataPipe
+from util import load_config
 
 
 @pytest.fixture
@@ -52,8 +59,9 @@ def mock_env(monkeypatch):
 @patch('loaders.import_pv_train.pd.read_csv')
 def test_import_pv_train_backfill_F(mock_read_csv, mock_datapipe, mock_env):
 
-    # mock datapipe
+    # mock datapipe, consuming the streamed rows like the real load_db
     mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = lambda cfg, data, **kw: list(data)
     mock_datapipe.return_value = mock_instance
 
     # mock csv data 
@@ -86,8 +94,8 @@ def test_import_pv_train_backfill_F(mock_read_csv, mock_datapipe, mock_env):
                                     'test_database'}
 
     transformed_YEAR_MONTH = mock_df['YEAR_MONTH']
-    assert transformed_YEAR_MONTH.iloc[0] == '2025-01-01'
-    assert transformed_YEAR_MONTH.iloc[1] == '2024-12-01'
+    assert transformed_YEAR_MONTH.iloc[0] == pd.Timestamp('2025-01-01')
+    assert transformed_YEAR_MONTH.iloc[1] == pd.Timestamp('2024-12-01')
     mock_read_csv.assert_called_once()
 
 
@@ -123,8 +131,9 @@ def test_import_pv_train_backfill_F(mock_read_csv, mock_datapipe, mock_env):
 @patch('loaders.import_pv_train.pd.read_csv')
 def test_import_pv_train_backfill_T(mock_read_csv, mock_datapipe, mock_env):
 
-    # mock datapipe
+    # mock datapipe, consuming the streamed rows like the real load_db
     mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = lambda cfg, data, **kw: list(data)
     mock_datapipe.return_value = mock_instance
 
     # mock csv data 
@@ -157,6 +166,396 @@ def test_import_pv_train_backfill_T(mock_read_csv, mock_datapipe, mock_env):
                                     'test_database'}
 
     transformed_YEAR_MONTH = mock_df['YEAR_MONTH']
-    assert transformed_YEAR_MONTH.iloc[0] == '2025-01-01'
-    assert transformed_YEAR_MONTH.iloc[1] == '2024-12-01'
+    assert transformed_YEAR_MONTH.iloc[0] == pd.Timestamp('2025-01-01')
+    assert transformed_YEAR_MONTH.iloc[1] == pd.Timestamp('2024-12-01')
     mock_read_csv.assert_called_once()
+
+
+@patch('loaders.import_pv_train.config_pv_train', {
+    'backfill': True,
+    'csv_prefix': '/tmp/incoming/pv_train/csv',
+    'csv_name': 'csv_name',
+    'yyyymm': '202501',
+    'delimiter': ',',
+    'chunksize': 2,
+    'col_pd': {
+        'YEAR_MONTH': 'str',
+        'DAY_TYPE': 'str',
+        'TIME_PER_HOUR': 'int64',
+        'PT_TYPE': 'str',
+        'PT_CODE': 'str',
+        'TOTAL_TAP_IN_VOLUME': 'int64',
+        'TOTAL_TAP_OUT_VOLUME': 'int64'
+    }
+})
+@patch('loaders.import_pv_train.config_db_tbl', {
+    'tbl': 'r_pv_train',
+    'load_mode': 'executemany',
+    'tbl_col': {
+        'YEAR_MONTH': 'year_month',
+        'DAY_TYPE': 'day_type',
+        'TIME_PER_HOUR': 'time_per_hour',
+        'PT_TYPE': 'pt_type',
+        'PT_CODE': 'pt_code',
+        'TOTAL_TAP_IN_VOLUME': 'total_tap_in_volume',
+        'TOTAL_TAP_OUT_VOLUME': 'total_tap_out_volume'
+    }
+})
+@patch('loaders.import_pv_train.config_rollup', None)
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_import_pv_train_chunked(mock_pool, mock_env, tmp_path):
+
+    # write a 5 row csv to be read in chunks of 2
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    lines = ['YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+             'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME']
+    lines += [f'2025-01,WEEKDAY,{i},TRAIN,AB{i},{i * 10},{i * 20}'
+              for i in range(5)]
+    csv_path.write_text('\n'.join(lines))
+
+    # the real DataPipe batches the rows, only the connection is mocked
+    DataPipe._pools.clear()
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+
+    with patch.dict('loaders.import_pv_train.config_pv_train',
+                    {'csv_prefix': str(tmp_path) + '/',
+                     'parquet_prefix': str(tmp_path / 'parquet'),
+                     'cache_version': str(tmp_path / 'pv_train.version')}):
+        import_pv_train()
+    DataPipe._pools.clear()
+
+    # assert query caches are invalidated through the loader's config
+    assert (tmp_path / 'pv_train.version').read_text().endswith(' 202501\n')
+
+    # assert the file is streamed through in batches of 2 rows, each sent
+    # in its own executemany() in file order
+    assert cursor.executemany.call_count == 3
+    stmt = cursor.executemany.call_args.args[0]
+    assert stmt.startswith('INSERT INTO test_database.r_pv_train (')
+    batches = [list(i.args[1]) for i in cursor.executemany.call_args_list]
+    assert [len(b) for b in batches] == [2, 2, 1]
+    assert [r[4] for b in batches for r in b] == [f'AB{i}' for i in range(5)]
+    assert batches[0][0] == (date(2025, 1, 1), 'WEEKDAY', 0, 'TRAIN', 'AB0',
+                             0, 0)
+    assert all(type(v) in (date, str, int) for b in batches for r in b
+               for v in r)
+    connection.commit.assert_called_once()
+
+    # assert every chunk is also archived under the table's column names
+    archive = pd.read_parquet(tmp_path / 'parquet')
+    assert archive['pt_code'].tolist() == [f'AB{i}' for i in range(5)]
+    assert archive['year_month'].astype(str).unique().tolist() == ['2025-01']
+
+
+@patch('loaders.import_pv_train.config_pv_train', {
+    'backfill': True,
+    'csv_prefix': '/tmp/incoming/pv_train/csv',
+    'csv_name': '/transport_node_train',
+    'yyyymm': '202501',
+    'delimiter': ',',
+    'col_pd': {
+        'YEAR_MONTH': 'str',
+        'DAY_TYPE': 'str',
+        'TIME_PER_HOUR': 'int64',
+        'PT_TYPE': 'str',
+        'PT_CODE': 'str',
+        'TOTAL_TAP_IN_VOLUME': 'int64',
+        'TOTAL_TAP_OUT_VOLUME': 'int64'
+    }
+})
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_from_zip(mock_datapipe, mock_env, tmp_path):
+
+    # zip a csv without extracting it anywhere
+    zip_path = tmp_path / 'pv_train_20250201.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('transport_node_train_202501.csv',
+                    'YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+                    'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+                    '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n')
+
+    loaded = []
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = (
+        lambda cfg, data, **kw: loaded.extend(data))
+    mock_datapipe.return_value = mock_instance
+
+    import_pv_train(zip_path=str(zip_path))
+
+    # assert the csv is parsed straight from the zip
+    assert loaded == [(date(2025, 1, 1), 'WEEKDAY', 20, 'TRAIN', 'AB12',
+                       1234, 5678)]
+
+
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_manifest_skip(mock_datapipe, mock_env, tmp_path):
+
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    csv_path.write_text('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+                        'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+                        '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n')
+
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = lambda cfg, data, **kw: list(data)
+    mock_datapipe.return_value = mock_instance
+
+    config = {
+        'backfill': True,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'yyyymm': '202501',
+        'delimiter': ',',
+        'manifest': str(tmp_path / 'manifest.db'),
+        'col_pd': {'YEAR_MONTH': 'str'}
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        import_pv_train()
+        import_pv_train()
+
+    # assert the unchanged csv is only loaded once
+    mock_instance.load_db.assert_called_once()
+
+
+@patch('loaders.import_pv_train.Dimensions')
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_fact(mock_datapipe, mock_dimensions, mock_env,
+                              tmp_path):
+
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    csv_path.write_text('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+                        'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+                        '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n')
+
+    # resolve every code to id 7
+    def encode(df):
+        df[['DAY_TYPE', 'PT_TYPE', 'PT_CODE']] = 7
+        return df
+    mock_dimensions.return_value.encode.side_effect = encode
+
+    loaded = []
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = (
+        lambda cfg, data, **kw: loaded.extend(data))
+    mock_datapipe.return_value = mock_instance
+
+    config = {
+        'backfill': True,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'yyyymm': '202501',
+        'delimiter': ',',
+        'fact': True,
+        'col_pd': load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        import_pv_train()
+
+    # assert the fact table is loaded with ids and a YYYYMM month
+    config_db = mock_instance.load_db.call_args.args[0]
+    assert config_db['tbl'] == 'f_pv_train'
+    assert mock_dimensions.call_args.args[1] == config_db['dims']
+    assert loaded == [(202501, 7, 20, 7, 7, 1234, 5678)]
+
+
+def test_check_pv_train(tmp_path):
+
+    header = ('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+              'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+              '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n')
+    (tmp_path / 'csv_name_202503.csv').write_text(header)
+    (tmp_path / 'csv_name_202504.csv').write_text('YEAR_MONTH,PT_CODE\n')
+
+    config = {
+        'backfill': False,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'delimiter': ',',
+        'col_pd': load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        # assert the month given overrides backfill
+        assert check_pv_train(yyyymm='202503') == \
+            str(tmp_path / 'csv_name_202503.csv')
+
+        # assert a csv with other columns is rejected
+        with pytest.raises(Exception) as excinfo:
+            check_pv_train(yyyymm='202504')
+        assert 'expected' in str(excinfo.value)
+
+
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_quarantine(mock_datapipe, mock_env, tmp_path):
+
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    csv_path.write_text('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+                        'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+                        '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n'
+                        '2025-01,WEEKDAY,25,TRAIN,AB12,1234,5678\n'
+                        '2025-13,WEEKDAY,20,TRAIN,AB12,1234,5678\n'
+                        '2025-01,WEEKDAY,21,TRAIN,AB12,-1,5678\n')
+
+    loaded = []
+
+    def failing_load_db(cfg, data, **kw):
+        list(data)
+        raise Exception('Error: lost connection')
+
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = failing_load_db
+    mock_datapipe.return_value = mock_instance
+
+    config_pv_train = load_config('lta_pv_train.yaml').config_pv_train
+    config = {
+        'backfill': True,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'yyyymm': '202501',
+        'delimiter': ',',
+        'quarantine_prefix': str(tmp_path / 'quarantine'),
+        'rules': config_pv_train.rules,
+        'col_pd': config_pv_train.col_pd
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        # a failed load leaves its quarantined rows, the rerun replaces them
+        with pytest.raises(Exception):
+            import_pv_train()
+        mock_instance.load_db.side_effect = (
+            lambda cfg, data, **kw: loaded.extend(data))
+        import_pv_train()
+
+    # assert the clean row is loaded and the bad ones quarantined
+    assert loaded == [(date(2025, 1, 1), 'WEEKDAY', 20, 'TRAIN', 'AB12',
+                       1234, 5678)]
+    quarantined = pd.read_csv(tmp_path / 'quarantine' / 'pv_train_202501.csv')
+    assert quarantined['failed_rules'].tolist() == [
+        'TIME_PER_HOUR.max', 'YEAR_MONTH.not_null', 'TOTAL_TAP_IN_VOLUME.min'
+    ]
+
+
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_quarantine_numeric(mock_datapipe, mock_env,
+                                            tmp_path):
+
+    # a blank and a malformed number, in different chunks
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    csv_path.write_text('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+                        'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+                        '2025-01,WEEKDAY,20,TRAIN,AB12,,5678\n'
+                        '2025-01,WEEKDAY,21,TRAIN,AB12,1234,5678\n'
+                        '2025-01,WEEKDAY,x,TRAIN,AB12,1234,5678\n')
+
+    loaded = []
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = (
+        lambda cfg, data, **kw: loaded.extend(data))
+    mock_datapipe.return_value = mock_instance
+
+    config_pv_train = load_config('lta_pv_train.yaml').config_pv_train
+    config = {
+        'backfill': True,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'yyyymm': '202501',
+        'delimiter': ',',
+        'chunksize': 2,
+        'quarantine_prefix': str(tmp_path / 'quarantine'),
+        'rules': config_pv_train.rules,
+        'col_pd': config_pv_train.col_pd
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        import_pv_train()
+
+    # assert the rows that do not parse are quarantined rather than failing
+    # the read, and the good row still loads with python ints
+    assert loaded == [(date(2025, 1, 1), 'WEEKDAY', 21, 'TRAIN', 'AB12',
+                       1234, 5678)]
+    assert all(type(v) is int for v in loaded[0][2::3])
+    quarantined = pd.read_csv(tmp_path / 'quarantine' / 'pv_train_202501.csv')
+    assert quarantined['failed_rules'].tolist() == [
+        'TOTAL_TAP_IN_VOLUME.min',
+        'TIME_PER_HOUR.min;TIME_PER_HOUR.max;TIME_PER_HOUR.not_null'
+    ]
+
+
+@patch('loaders.import_pv_train.DataPipe')
+def test_import_pv_train_delta(mock_datapipe, mock_env, tmp_path):
+
+    # hour 20 is in both files
+    header = ('YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+              'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME\n'
+              '2025-01,WEEKDAY,20,TRAIN,AB12,1234,5678\n')
+    csv_path = tmp_path / 'csv_name_202501.csv'
+
+    loaded, deleted = [], []
+    mock_instance = MagicMock()
+    mock_instance.load_db.side_effect = (
+        lambda cfg, data, **kw: loaded.extend(data))
+    mock_instance.delete_db.side_effect = (
+        lambda cfg, keys, batch_size: deleted.extend(keys) or len(deleted))
+    mock_datapipe.return_value = mock_instance
+
+    config = {
+        'backfill': True,
+        'csv_prefix': str(tmp_path) + '/',
+        'csv_name': 'csv_name',
+        'yyyymm': '202501',
+        'delimiter': ',',
+        'delta_prefix': str(tmp_path / 'delta'),
+        'col_pd': load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    }
+    with patch('loaders.import_pv_train.config_pv_train', config):
+        csv_path.write_text(''.join([
+            header,
+            '2025-01,WEEKDAY,21,TRAIN,AB12,1000,2000\n',
+            '2025-01,WEEKDAY,22,TRAIN,AB12,10,20\n'
+        ]))
+        import_pv_train()
+        assert len(loaded) == 3
+
+        # republished with hour 21 changed, hour 22 gone and hour 23 added
+        loaded.clear()
+        csv_path.write_text(''.join([
+            header,
+            '2025-01,WEEKDAY,21,TRAIN,AB12,1001,2000\n',
+            '2025-01,WEEKDAY,23,TRAIN,AB12,5,6\n'
+        ]))
+        import_pv_train()
+
+    # assert only the changed and inserted rows are loaded, and the removed
+    # row deleted by its key
+    assert loaded == [
+        (date(2025, 1, 1), 'WEEKDAY', 21, 'TRAIN', 'AB12', 1001, 2000),
+        (date(2025, 1, 1), 'WEEKDAY', 23, 'TRAIN', 'AB12', 5, 6)
+    ]
+    assert list(deleted) == [
+        (date(2025, 1, 1), 'WEEKDAY', 22, 'TRAIN', 'AB12')
+    ]
+
+
+def test_load_pv_train_resumed(tmp_path):
+
+    csv_path = tmp_path / 'csv_name_202501.csv'
+    lines = ['YEAR_MONTH,DAY_TYPE,TIME_PER_HOUR,PT_TYPE,PT_CODE,'
+             'TOTAL_TAP_IN_VOLUME,TOTAL_TAP_OUT_VOLUME']
+    lines += [f'2025-01,WEEKDAY,{i},TRAIN,AB{i},{i * 10},{i * 20}'
+              for i in range(3)]
+    csv_path.write_text('\n'.join(lines))
+
+    # a load resumed from a checkpoint past the first 2 rows
+    def load_db(cfg, data, stats=None, **kw):
+        list(data)
+        stats['skipped'] = 2
+
+    sqlpipe = MagicMock()
+    sqlpipe.load_db.side_effect = load_db
+    config = {
+        'delimiter': ',',
+        'col_pd': load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    }
+    with (patch('loaders.import_pv_train.config_pv_train', config),
+          patch('loaders.import_pv_train.config_rollup', None)):
+        stats = load_pv_train(str(csv_path), sqlpipe, '202501')
+
+    # assert only the rows sent count as loaded
+    assert stats['rows'] == 1
@@ -7,6 +7,7 @@ import responses
 import zipfile
 
 from lta.pv_train import PVTrain
+from manifest import Manifest
 
 
 # api_call() test
@@ -69,9 +70,10 @@ def test_pv_train_download_zip_pass(tmp_path):
 
     responses.add(resp_pass)
 
-    pvt.download_zip(url, tmp_path)
+    dl_path = pvt.download_zip(url, tmp_path)
     test_zip = f'pv_train_{yyyymmdd}.zip'
     zip_path = tmp_path / f'{test_zip}'
+    assert dl_path == str(zip_path)
 
     # assert that zip file is downloaded and stored
     assert zip_path.exists()
@@ -104,6 +106,120 @@ def test_pv_train_download_zip_fail(tmp_path):
     assert "Error: 404" in str(excinfo.value)
 
 
+@responses.activate
+def test_pv_train_download_zip_resume(tmp_path):
+
+    url = 'https://datamall2.mytransport.sg/ltaodataservice/PV/Train'
+    pvt = PVTrain(dt.now().date())
+    yyyymmdd = dt.strftime(pvt.date, '%Y%m%d')
+    zip_content = b'zipcontent_byte'
+    zip_path = tmp_path / f'pv_train_{yyyymmdd}.zip'
+
+    # a previous download was interrupted after 6 bytes
+    (tmp_path / f'pv_train_{yyyymmdd}.zip.part').write_bytes(zip_content[:6])
+    (tmp_path / 'pv_train.json').write_text(
+        '{"etag": "\\"abc\\"", "last_modified": null, "complete": false}')
+
+    def range_callback(request):
+        assert request.headers['Range'] == 'bytes=6-'
+        assert request.headers['If-Range'] == '"abc"'
+        return (206, {'ETag': '"abc"', 'Content-Range': 'bytes 6-14/15'},
+                zip_content[6:])
+
+    responses.add_callback(responses.GET, url, callback=range_callback)
+
+    assert pvt.download_zip(url, tmp_path) == str(zip_path)
+
+    # assert only the remainder is fetched and the .part is renamed
+    assert zip_path.read_bytes() == zip_content
+    assert not (tmp_path / f'pv_train_{yyyymmdd}.zip.part').exists()
+
+
+@responses.activate
+def test_pv_train_download_zip_resume_mismatch(tmp_path):
+
+    url = 'https://datamall2.mytransport.sg/ltaodataservice/PV/Train'
+    pvt = PVTrain(dt.now().date())
+    yyyymmdd = dt.strftime(pvt.date, '%Y%m%d')
+    part_path = tmp_path / f'pv_train_{yyyymmdd}.zip.part'
+
+    part_path.write_bytes(b'zipcon')
+    (tmp_path / 'pv_train.json').write_text(
+        '{"etag": "\\"abc\\"", "last_modified": null, "complete": false}')
+    responses.add(responses.GET, url, status=206, body=b'tent_byte',
+                  headers={'ETag': '"abc"', 'Content-Range': 'bytes 0-8/15'})
+
+    # assert a partial response starting elsewhere is not appended, and the
+    # .part is dropped so that the next run starts over
+    with pytest.raises(Exception) as excinfo:
+        pvt.download_zip(url, tmp_path)
+    assert 'does not resume' in str(excinfo.value)
+    assert not part_path.exists()
+
+
+@responses.activate
+def test_pv_train_download_zip_resume_complete(tmp_path):
+
+    url = 'https://datamall2.mytransport.sg/ltaodataservice/PV/Train'
+    pvt = PVTrain(dt.now().date())
+    pvt.manifest = None
+    yyyymmdd = dt.strftime(pvt.date, '%Y%m%d')
+    zip_content = b'zipcontent_byte'
+    zip_path = tmp_path / f'pv_train_{yyyymmdd}.zip'
+    part_path = tmp_path / f'pv_train_{yyyymmdd}.zip.part'
+    meta = '{"etag": "\\"abc\\"", "last_modified": null, "complete": false}'
+
+    # a previous run wrote every byte but stopped before the rename
+    part_path.write_bytes(zip_content)
+    (tmp_path / 'pv_train.json').write_text(meta)
+    responses.add(responses.GET, url, status=416,
+                  headers={'Content-Range': 'bytes */15'})
+
+    # assert the complete .part is renamed into place
+    assert pvt.download_zip(url, tmp_path) == str(zip_path)
+    assert zip_path.read_bytes() == zip_content
+    assert not part_path.exists()
+    assert '"complete": true' in (tmp_path / 'pv_train.json').read_text()
+
+    # assert a .part that does not match the file is dropped, so that the
+    # next run starts over rather than failing on every run
+    zip_path.unlink()
+    part_path.write_bytes(zip_content)
+    (tmp_path / 'pv_train.json').write_text(meta)
+    responses.replace(responses.GET, url, status=416,
+                      headers={'Content-Range': 'bytes */20'})
+    with pytest.raises(Exception) as excinfo:
+        pvt.download_zip(url, tmp_path)
+    assert 'range not satisfiable' in str(excinfo.value)
+    assert not part_path.exists()
+
+
+@responses.activate
+def test_pv_train_download_zip_unchanged(tmp_path):
+
+    url = 'https://datamall2.mytransport.sg/ltaodataservice/PV/Train'
+    pvt = PVTrain(dt.now().date())
+    zip_content = b'zipcontent_byte'
+    seen = []
+
+    def etag_callback(request):
+        seen.append(request.headers.get('If-None-Match'))
+        if request.headers.get('If-None-Match') == '"abc"':
+            return (304, {}, b'')
+        return (200, {'ETag': '"abc"'}, zip_content)
+
+    responses.add_callback(responses.GET, url, callback=etag_callback)
+
+    # a download not loaded yet is fetched again, once loaded it is skipped
+    # on the etag
+    pvt.manifest = Manifest(str(tmp_path / 'manifest.db'))
+    zip_path = pvt.download_zip(url, tmp_path)
+    assert pvt.download_zip(url, tmp_path) == zip_path
+    pvt.mark_loaded(zip_path, tmp_path)
+    assert pvt.download_zip(url, tmp_path) is None
+    assert seen == [None, None, '"abc"']
+
+
 @responses.activate
 def test_pv_train_unzip_to_incoming_pass(tmp_path):
 
@@ -143,6 +259,34 @@ def test_pv_train_unzip_to_incoming_pass(tmp_path):
     assert arc_path.exists()
 
 
+def test_pv_train_unzip_to_incoming_no_extract(tmp_path):
+
+    pvt = PVTrain(dt.now().date())
+    yyyymmdd = dt.strftime(pvt.date, '%Y%m%d')
+
+    zip_filename = f'pv_train_{yyyymmdd}.zip'
+    zip_dir = tmp_path / 'zip'
+    arc_dir = tmp_path / 'archive'
+    csv_dir = tmp_path / 'csv'
+    for d in (zip_dir, arc_dir, csv_dir):
+        d.mkdir()
+
+    with zipfile.ZipFile(zip_dir / zip_filename, 'w') as zf:
+        zf.writestr('pv_train.csv', 'col1,col2\n1,2')
+
+    zip_path = pvt.unzip_to_incoming(
+        csv_dir=csv_dir,
+        zip_dir=zip_dir,
+        arc_dir=arc_dir,
+        extract=False
+    )
+
+    # assert that the zip is archived and nothing is extracted
+    assert zip_path == str(arc_dir / zip_filename)
+    assert (arc_dir / zip_filename).exists()
+    assert list(csv_dir.iterdir()) == []
+
+
 @responses.activate
 def test_pv_train_unzip_to_incoming_fail(tmp_path):
 
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from archive import ParquetArchive
+
+COL_PD = {
+    'year_month': 'str',
+    'pt_code': 'str',
+    'total_tap_in_volume': 'int64'
+}
+
+
+def frame(codes: list):
+    return pd.DataFrame({
+        'year_month': pd.Timestamp('2025-07-01'),
+        'pt_code': codes,
+        'total_tap_in_volume': range(len(codes))
+    })
+
+
+def test_archive_write_read(tmp_path):
+    '''
+    Perform unit test for writing and reading the parquet archive.
+    1) Each month is a hive partition holding one zstd compressed file
+    2) Chunks are appended as row groups with dictionary encoded strings
+    3) Only the columns and months requested are read back
+    4) Rewriting a month replaces it
+    '''
+    archive = ParquetArchive(tmp_path / 'parquet', COL_PD)
+    with archive.writer('202507') as write:
+        write(frame(['NS1', 'EW1']))
+        write(frame(['NS1']))
+    with archive.writer('202508') as write:
+        write(frame(['CC1']))
+
+    path = tmp_path / 'parquet' / 'year_month=2025-07' / 'part-0.parquet'
+    meta = pq.ParquetFile(path).metadata
+    assert meta.num_row_groups == 2
+    column = meta.row_group(0).column(0)
+    assert column.compression == 'ZSTD'
+    assert 'RLE_DICTIONARY' in column.encodings
+    assert sorted(p.name for p in (tmp_path / 'parquet').iterdir()) == [
+        '_tmp', 'year_month=2025-07', 'year_month=2025-08'
+    ]
+
+    df = archive.read(columns=['pt_code'], months=['202507'])
+    assert list(df.columns) == ['pt_code']
+    assert df['pt_code'].tolist() == ['NS1', 'EW1', 'NS1']
+
+    with archive.writer('202507') as write:
+        write(frame(['DT1']))
+    df = archive.read()
+    assert sorted(df['pt_code'].tolist()) == ['CC1', 'DT1']
+    assert df['year_month'].astype(str).tolist() in (
+        ['2025-07', '2025-08'], ['2025-08', '2025-07']
+    )
+
+
+def test_archive_write_error(tmp_path):
+    '''
+    Perform unit test for a failed write to the parquet archive.
+    1) The error is raised
+    2) The month already archived is left as it was
+    '''
+    archive = ParquetArchive(tmp_path / 'parquet', COL_PD)
+    with archive.writer('202507') as write:
+        write(frame(['NS1']))
+
+    with pytest.raises(ValueError):
+        with archive.writer('202507') as write:
+            write(frame(['EW1']))
+            raise ValueError('load failed')
+
+    assert archive.read()['pt_code'].tolist() == ['NS1']
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+
+import os
+import subprocess
+import sys
+from datetime import date
+from unittest.mock import patch
+
+import cli
+
+SRC_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'src')
+HEAVY_MODULES = ('pandas', 'numpy', 'mysql', 'requests', 'httpx')
+
+
+def import_times(module: str):
+    '''
+    Import a module in a fresh interpreter with -X importtime, returning
+    the cumulative import time in microseconds of each module imported.
+    '''
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+
+    return times
+
+
+def test_cli_import_time():
+    '''
+    Perform regression test for the import time of the entry points.
+    1) Importing cli or main does not pull in the heavy dependencies
+    2) Importing cli takes well under a second
+    '''
+    for module in ('cli', 'main'):
+        times = import_times(module)
+        heavy = [i for i in times if i.split('.')[0] in HEAVY_MODULES]
+        assert heavy == [], f'{module} imports {heavy}'
+
+    assert import_times('cli')['cli'] < 500_000
+
+
+@patch('main.write_metrics')
+@patch('main.load')
+def test_cli_load(mock_load, mock_write_metrics):
+    '''
+    Perform unit test for dispatching a cli command.
+    1) The command's stage is called with the parsed arguments
+    '''
+    assert cli.cli(['load', '--date', '2025-08-01', '--zip', 'a.zip']) == 0
+    mock_load.assert_called_once_with(date(2025, 8, 1), 'a.zip')
+    mock_write_metrics.assert_called_once()
+
+
+@patch('main.write_metrics')
+@patch('main.load')
+@patch('main.unzip', return_value='archive/pv_train_20250301.zip')
+@patch('main.fetch', return_value='zip/pv_train_20250301.zip')
+def test_cli_run(mock_fetch, mock_unzip, mock_load, mock_write_metrics):
+    '''
+    Perform unit test for the run command.
+    1) The run date given reaches fetch, unzip and load
+    '''
+    assert cli.cli(['run', '--date', '2025-03-01']) == 0
+    mock_fetch.assert_called_once_with(date(2025, 3, 1))
+    mock_unzip.assert_called_once_with(date(2025, 3, 1))
+    mock_load.assert_called_once_with(date(2025, 3, 1),
+                                      'archive/pv_train_20250301.zip')
+
+
+@patch('lta.pv_train.PVTrain')
+@patch('loaders.import_pv_train.import_pv_train')
+def test_main_load(mock_import, mock_pv_train):
+    '''
+    Perform unit test for main.load().
+    1) The month before the run date is loaded, not the month of today
+    2) Without --zip, the csv is streamed from the zip archived on the run
+       date
+    '''
+    import main
+
+    main.load(date(2025, 3, 1))
+
+    zip_path, = mock_import.call_args.args
+    assert zip_path.endswith('/archive/pv_train_20250301.zip')
+    assert mock_import.call_args.kwargs == {'yyyymm': '202502'}
+    mock_pv_train.return_value.mark_loaded.assert_called_once_with(zip_path)
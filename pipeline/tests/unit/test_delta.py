@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+
+from delta import Delta
+from delta import fingerprint
+
+KEY_COLS = ['YEAR_MONTH', 'PT_CODE']
+
+
+def frame(codes, volumes):
+    return pd.DataFrame({
+        'YEAR_MONTH': pd.to_datetime(['2025-07'] * len(codes), format='%Y-%m'),
+        'PT_CODE': codes,
+        'TOTAL_TAP_IN_VOLUME': volumes
+    })
+
+
+def test_fingerprint():
+    '''
+    Perform unit test for fingerprint().
+    1) Rows with the same key have the same key hash
+    2) The row hash changes with any column, the key hash only with the key
+    '''
+    key_hash, row_hash = fingerprint(frame(['NS1', 'NS1', 'EW2'], [1, 2, 1]),
+                                     KEY_COLS)
+
+    assert key_hash[0] == key_hash[1] != key_hash[2]
+    assert len(set(row_hash)) == 3
+
+
+def test_delta(tmp_path):
+    '''
+    Perform unit test for Delta.
+    1) Every row is passed on when the month has no fingerprints
+    2) Only inserted and changed rows are passed on after a load
+    3) Rows of the last load missing from this one are reported deleted
+    4) The fingerprints are only replaced by save()
+    '''
+    path = tmp_path / 'delta' / 'pv_train_202507.parquet'
+    changes = Delta(path, KEY_COLS)
+    df = frame(['NS1', 'EW2', 'CC3'], [10, 20, 30])
+    assert changes(df).equals(df)
+    assert changes.deleted().empty
+    changes.save()
+
+    changes = Delta(path, KEY_COLS)
+    passed = pd.concat([changes(frame(['NS1', 'EW2'], [10, 25])),
+                        changes(frame(['DT4'], [40]))])
+    assert passed['PT_CODE'].tolist() == ['EW2', 'DT4']
+    assert changes.counts == {'inserted': 1, 'changed': 1, 'unchanged': 1}
+    assert changes.deleted().to_dict('list') == {
+        'YEAR_MONTH': [pd.Timestamp('2025-07-01')], 'PT_CODE': ['CC3']
+    }
+    assert pd.read_parquet(path).shape[0] == 3
+
+    changes.save()
+    assert Delta(path, KEY_COLS)(frame(['NS1', 'EW2', 'DT4'],
+                                       [10, 25, 40])).empty
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import zipfile
+from unittest.mock import patch
+
+import pandas as pd
+
+from benchmarks.gen_pv_train import CODES
+from benchmarks.gen_pv_train import generate
+from util import load_config
+
+KEY_COLS = ['YEAR_MONTH', 'DAY_TYPE', 'TIME_PER_HOUR', 'PT_TYPE', 'PT_CODE']
+
+
+@patch('benchmarks.gen_pv_train.BLOCK_ROWS', 1000)
+def test_generate(tmp_path):
+    '''
+    Perform unit test for the synthetic pv_train generator.
+    1) The zip holds a csv named after it, spanning several blocks
+    2) The csv has the columns of col_pd and the requested rows
+    3) The rows belong to the requested month
+    4) Each row has its own natural key
+    '''
+    col_pd = load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    rows = 2010
+    zip_path = generate(str(tmp_path / 'transport_node_train_202508.zip'),
+                        rows, yyyymm='202508')
+
+    with zipfile.ZipFile(zip_path) as zip_obj:
+        assert zip_obj.namelist() == ['transport_node_train_202508.csv']
+        with zip_obj.open('transport_node_train_202508.csv') as f:
+            df = pd.read_csv(f, dtype=col_pd)
+
+    assert list(df.columns) == list(col_pd)
+    assert df.shape[0] == rows
+    assert set(df['YEAR_MONTH']) == {'2025-08'}
+    assert not df.duplicated(KEY_COLS).any()
+
+
+@patch('benchmarks.gen_pv_train.MAX_MONTHS', 2)
+def test_generate_spread(tmp_path):
+    '''
+    Perform unit test for larger sizes of the synthetic pv_train generator.
+    1) Rows beyond the keys of a month are spread over consecutive months
+    2) Beyond MAX_MONTHS, stations are added to each month
+    3) Each row keeps its own natural key, with a valid station code
+    '''
+    col_pd = load_config('lta_pv_train.yaml').config_pv_train.col_pd
+    per_month = len(CODES) * 2 * 24
+    rows = per_month + 10
+    df = pd.read_csv(generate(str(tmp_path / 'two.csv'), rows,
+                              yyyymm='202512'), dtype=col_pd)
+
+    assert df['YEAR_MONTH'].value_counts().to_dict() == \
+        {'2025-12': rows // 2, '2026-01': rows - rows // 2}
+    assert not df.duplicated(KEY_COLS).any()
+
+    rows = 3 * per_month
+    df = pd.read_csv(generate(str(tmp_path / 'more.csv'), rows),
+                     dtype=col_pd)
+
+    assert set(df['YEAR_MONTH']) == {'2025-07', '2025-08'}
+    assert df['PT_CODE'].nunique() > len(CODES)
+    assert df['PT_CODE'].str.fullmatch('[A-Z]{2}[0-9]+').all()
+    assert df.shape[0] == rows and not df.duplicated(KEY_COLS).any()
@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from unittest.mock import MagicMock, patch
+
+import pandas as pd
+import pytest
+from mysql.connector import Error
+from mysql.connector.errors import PoolError
+
+from import_func import DataPipe
+from import_func import Dimensions
+from import_func import frame_to_rows
+
+
+def test_frame_to_rows():
+    '''
+    Perform unit test for import_func.frame_to_rows() function.
+    1) Rows are yielded as tuples in column order
+    2) Values are native python types, dates included
+    3) Missing dates are passed on as None
+    '''
+    df = pd.DataFrame({
+        'YEAR_MONTH': pd.to_datetime(['2025-01', '2024-12', None],
+                                     format='%Y-%m'),
+        'PT_CODE': ['AB12', 'CD34', 'EF56'],
+        'TOTAL_TAP_IN_VOLUME': [1234, 5678, 0]
+    })
+
+    rows = list(frame_to_rows(df))
+
+    assert rows == [(date(2025, 1, 1), 'AB12', 1234),
+                    (date(2024, 12, 1), 'CD34', 5678),
+                    (None, 'EF56', 0)]
+    assert type(rows[0][2]) is int
+
+
+@pytest.fixture(autouse=True)
+def clear_pools():
+    DataPipe._pools.clear()
+    yield
+    DataPipe._pools.clear()
+
+
+CONFIG_DB = {
+    'tbl': 'r_pv_train',
+    'tbl_col': {
+        'YEAR_MONTH': 'year_month',
+        'PT_CODE': 'pt_code',
+        'TOTAL_TAP_IN_VOLUME': 'total_tap_in_volume'
+    }
+}
+
+ROWS = [(date(2025, 1, 1), 'AB12', 1234),
+        (date(2024, 12, 1), 'CD\tEF', 5678)]
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_infile(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() in infile mode.
+    1) Rows are written to a tab separated file and loaded with LOAD DATA
+    2) Columns are mapped from config_db['tbl_col']
+    3) The temporary file is removed afterwards
+    4) Missing values are written as \\N, which LOAD DATA reads as NULL
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    infiles = {}
+
+    def execute(stmt, params):
+        with open(params[0], newline='', encoding='utf-8') as f:
+            infiles[params[0]] = f.read()
+
+    cursor.execute.side_effect = execute
+    cursor.rowcount = 2
+
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    row_count = sqlpipe.load_db({**CONFIG_DB, 'load_mode': 'infile'}, ROWS)
+
+    stmt = cursor.execute.call_args.args[0]
+    assert stmt.startswith('LOAD DATA LOCAL INFILE %s INTO TABLE '
+                           'transport.r_pv_train')
+    assert stmt.endswith('(`year_month`, `pt_code`, `total_tap_in_volume`);')
+    assert 'allow_local_infile_in_path' in mock_pool.call_args.kwargs
+
+    (infile, content), = infiles.items()
+    assert content == '2025-01-01\tAB12\t1234\n2024-12-01\tCD\\\tEF\t5678\n'
+    assert not os.path.exists(infile)
+    assert row_count == 2
+    cursor.executemany.assert_not_called()
+    connection.commit.assert_called_once()
+    connection.close.assert_called_once()
+
+    infiles.clear()
+    sqlpipe.load_db({**CONFIG_DB, 'load_mode': 'infile'},
+                    [(None, 'AB\\12', float('nan')), (pd.NaT, pd.NA, 0)])
+    (infile, content), = infiles.items()
+    assert content == '\\N\tAB\\\\12\t\\N\n\\N\t\\N\t0\n'
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_infile_fallback(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() falling back to executemany().
+    1) A refused LOAD DATA is retried through executemany() with the rows
+       as given, not as read back from the file
+    2) Later batches skip LOAD DATA altogether
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.execute.side_effect = Error(msg='Loading local data is disabled',
+                                       errno=3948)
+    inserted = []
+    cursor.executemany.side_effect = lambda stmt, rows: inserted.extend(rows)
+
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    sqlpipe.load_db({**CONFIG_DB, 'load_mode': 'infile'}, ROWS, batch_size=1)
+
+    assert cursor.execute.call_count == 1
+    assert cursor.executemany.call_count == 2
+    assert inserted == ROWS
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_datapipe_shared_pool(mock_pool):
+    '''
+    Perform unit test for DataPipe connection pooling.
+    1) DataPipes with the same target share one pool
+    2) The pool size is configurable, a DataPipe joining a pool takes on
+       its size
+    3) close_pools() disconnects and drops every pool
+    '''
+    mock_pool.return_value.pool_size = 3
+    pipe_a = DataPipe('127.0.0.1', 'user', 'pass', 'transport', pool_size=3)
+    pipe_b = DataPipe('127.0.0.1', 'user', 'pass', 'transport', pool_size=8)
+
+    with pipe_a.connection(), pipe_b.connection():
+        pass
+
+    mock_pool.assert_called_once()
+    assert mock_pool.call_args.kwargs['pool_size'] == 3
+    assert mock_pool.return_value.get_connection.call_count == 2
+    assert pipe_b.pool_size == 3
+
+    DataPipe.close_pools()
+    mock_pool.return_value._remove_connections.assert_called_once()
+    assert DataPipe._pools == {}
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_datapipe_pool_threads(mock_pool):
+    '''
+    Perform unit test for DataPipe pools created from several threads.
+    1) Threads asking for a new pool at once create it only once
+    '''
+    def slow_pool(**kwargs):
+        time.sleep(0.01)
+        return MagicMock(pool_size=kwargs['pool_size'])
+
+    mock_pool.side_effect = slow_pool
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        pools = list(executor.map(lambda _: sqlpipe.get_pool(True), range(4)))
+
+    mock_pool.assert_called_once()
+    assert all(pool is pools[0] for pool in pools)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_datapipe_connection_error(mock_pool):
+    '''
+    Perform unit test for DataPipe.connection() cleanup.
+    1) An error inside the block rolls back the transaction
+    2) The connection is returned to the pool regardless
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+
+    with pytest.raises(Error):
+        with sqlpipe.connection():
+            raise Error(msg='Lock wait timeout exceeded', errno=1205)
+
+    connection.rollback.assert_called_once()
+    connection.close.assert_called_once()
+
+
+@patch('import_func.time.sleep')
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_datapipe_pool_exhausted(mock_pool, mock_sleep):
+    '''
+    Perform unit test for checkout from an exhausted pool.
+    1) Checkout waits for a connection to be returned
+    2) PoolError is raised once the timeout has passed
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    mock_pool.return_value.get_connection.side_effect = [
+        PoolError('pool exhausted'), connection
+    ]
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+
+    assert sqlpipe.create_connection() is connection
+    mock_sleep.assert_called_once()
+
+    mock_pool.return_value.get_connection.side_effect = PoolError('exhausted')
+    with pytest.raises(PoolError):
+        sqlpipe.create_connection(timeout=0)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_upsert(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() in upsert mode.
+    1) Rows are inserted with ON DUPLICATE KEY UPDATE
+    2) Only the columns outside key_col are updated
+    3) A missing key_col is rejected
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.rowcount = 2
+
+    config_db = {**CONFIG_DB, 'load_mode': 'upsert',
+                 'key_col': ['year_month', 'pt_code']}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    sqlpipe.load_db(config_db, ROWS)
+
+    stmt, rows = cursor.executemany.call_args.args
+    assert stmt == (
+        'INSERT INTO transport.r_pv_train '
+        '(`year_month`, `pt_code`, `total_tap_in_volume`) '
+        'VALUES (%s, %s, %s) ON DUPLICATE KEY UPDATE '
+        '`total_tap_in_volume` = VALUES(`total_tap_in_volume`);'
+    )
+    assert rows == ROWS
+
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db({**CONFIG_DB, 'load_mode': 'upsert'}, ROWS)
+    assert 'requires key_col' in str(excinfo.value)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_partition_exchange(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() with partition_exchange.
+    1) Rows are loaded into an unpartitioned staging table
+    2) The month is split out of the partition it falls in
+    3) The staging table is exchanged for the month's partition
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = [
+        [('p_history', "'2025-01-01'"), ('pmax', 'MAXVALUE')],
+        [('p_history', "'2024-12-01'"), ('p202412', "'2025-01-01'"),
+         ('pmax', 'MAXVALUE')]
+    ]
+    cursor.rowcount = 2
+
+    config_db = {**CONFIG_DB, 'partition_exchange': True}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    sqlpipe.load_db(config_db, ROWS, yyyymm='202412')
+
+    stg = 'transport.r_pv_train_stg_202412'
+    stmt, _ = cursor.executemany.call_args.args
+    assert stmt.startswith(f'INSERT INTO {stg} ')
+
+    ddl = [c.args[0] for c in cursor.execute.call_args_list
+           if not c.args[0].startswith('SELECT')]
+    assert ddl == [
+        f'DROP TABLE IF EXISTS {stg};',
+        f'CREATE TABLE {stg} LIKE transport.r_pv_train;',
+        f'ALTER TABLE {stg} REMOVE PARTITIONING;',
+        'ALTER TABLE transport.r_pv_train REORGANIZE PARTITION p_history '
+        "INTO (PARTITION p_history VALUES LESS THAN ('2024-12-01'), "
+        "PARTITION p202412 VALUES LESS THAN ('2025-01-01'));",
+        'ALTER TABLE transport.r_pv_train '
+        f'EXCHANGE PARTITION p202412 WITH TABLE {stg};',
+        f'DROP TABLE {stg};'
+    ]
+
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db(config_db, ROWS)
+    assert 'requires yyyymm' in str(excinfo.value)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_ensure_partitions(mock_pool):
+    '''
+    Perform unit test for DataPipe.ensure_partitions().
+    1) A month with a partition of its own is left alone
+    2) A month inside a partition of several months is split out of it,
+       with the months above it kept in a partition of their own
+    3) A month above the top of a table without pmax is added, with the
+       months skipped below it in a partition of their own
+    4) A month left in a partition with other months is not exchanged
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+
+    def ddl():
+        return [c.args[0] for c in cursor.execute.call_args_list
+                if c.args[0].startswith('ALTER')]
+
+    split = [('p_history', "'2025-01-01'"), ('p202501', "'2025-02-01'"),
+             ('p202502', "'2025-03-01'"), ('p202503', "'2025-04-01'"),
+             ('p202504', "'2025-07-01'"), ('pmax', 'MAXVALUE')]
+    cursor.fetchall.return_value = split
+    assert sqlpipe.ensure_partitions(cursor, 'r_pv_train', '202501') == \
+        'p202501'
+    assert ddl() == []
+
+    cursor.fetchall.side_effect = [
+        [('p_history', "'2025-01-01'"), ('p202501', "'2025-02-01'"),
+         ('p202502', "'2025-07-01'"), ('pmax', 'MAXVALUE')],
+        split
+    ]
+    sqlpipe.ensure_partitions(cursor, 'r_pv_train', '202503')
+    assert ddl() == [
+        'ALTER TABLE transport.r_pv_train REORGANIZE PARTITION p202502 '
+        "INTO (PARTITION p202502 VALUES LESS THAN ('2025-03-01'), "
+        "PARTITION p202503 VALUES LESS THAN ('2025-04-01'), "
+        "PARTITION p202504 VALUES LESS THAN ('2025-07-01'));"
+    ]
+
+    cursor.reset_mock()
+    cursor.fetchall.side_effect = [
+        [('p_history', "'2025-01-01'")],
+        [('p_history', "'2025-01-01'"), ('p202501', "'2025-03-01'"),
+         ('p202503', "'2025-04-01'")]
+    ]
+    sqlpipe.ensure_partitions(cursor, 'r_pv_train', '202503')
+    assert ddl() == [
+        'ALTER TABLE transport.r_pv_train ADD PARTITION '
+        "(PARTITION p202501 VALUES LESS THAN ('2025-03-01'), "
+        "PARTITION p202503 VALUES LESS THAN ('2025-04-01'));"
+    ]
+
+    cursor.fetchall.side_effect = [split, split]
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe._check_month_partition(
+            cursor, 'r_pv_train', datetime(2025, 5, 1), datetime(2025, 6, 1))
+    assert 'cannot be exchanged' in str(excinfo.value)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_dimensions_encode(mock_pool):
+    '''
+    Perform unit test for Dimensions.encode().
+    1) Codes are replaced with the ids of their dimension table
+    2) Codes not seen before are inserted and their ids fetched
+    3) The dimension table is only read once
+    4) Missing codes are rejected
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.fetchall.side_effect = [[(1, 'WEEKDAY')],
+                                   [(2, 'WEEKENDS/HOLIDAY')]]
+
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    dims = Dimensions(sqlpipe, {'DAY_TYPE': ['d_day_type', 'day_type']})
+    df = pd.DataFrame({'DAY_TYPE': ['WEEKDAY', 'WEEKENDS/HOLIDAY',
+                                    'WEEKDAY'],
+                       'TIME_PER_HOUR': [1, 2, 3]})
+    df = dims.encode(df)
+
+    assert df['DAY_TYPE'].tolist() == [1, 2, 1]
+    assert df['TIME_PER_HOUR'].tolist() == [1, 2, 3]
+    stmt, rows = cursor.executemany.call_args.args
+    assert stmt == ('INSERT IGNORE INTO transport.d_day_type (`day_type`) '
+                    'VALUES (%s);')
+    assert rows == [('WEEKENDS/HOLIDAY',)]
+    assert cursor.execute.call_args.args == (
+        'SELECT `id`, `day_type` FROM transport.d_day_type '
+        'WHERE `day_type` IN (%s);', ['WEEKENDS/HOLIDAY']
+    )
+
+    df = dims.encode(pd.DataFrame({'DAY_TYPE': ['WEEKENDS/HOLIDAY']}))
+    assert df['DAY_TYPE'].tolist() == [2]
+    assert cursor.fetchall.call_count == 2
+
+    with pytest.raises(Exception) as excinfo:
+        dims.encode(pd.DataFrame({'DAY_TYPE': ['WEEKDAY', None]}))
+    assert 'missing values' in str(excinfo.value)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_checkpoint(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() with checkpoint.
+    1) Rows committed by an earlier load of the same source are skipped,
+       and reported as such
+    2) Each batch is committed with the offset it reaches
+    3) The checkpoint is cleared once the month is loaded
+    4) A checkpoint left by another source is not resumed from
+    5) Without a source no checkpoint is resumed from
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.rowcount = 1
+    cursor.fetchone.return_value = (1, 'sha')
+
+    rows = [(date(2025, 1, 1), f'AB{i}', i) for i in range(3)]
+    config_db = {**CONFIG_DB, 'checkpoint': True}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    stats = {}
+    sqlpipe.load_db(config_db, iter(rows), batch_size=1, yyyymm='202501',
+                    source='sha', stats=stats)
+
+    assert [list(call.args[1]) for call in cursor.executemany.call_args_list] \
+        == [rows[1:2], rows[2:3]]
+    assert stats == {'skipped': 1}
+    offsets = [call.args[1][2] for call in cursor.execute.call_args_list
+               if call.args[0].startswith('REPLACE')]
+    assert offsets == [2, 3]
+    assert cursor.execute.call_args.args[0].startswith(
+        'DELETE FROM transport.etl_checkpoint')
+    assert connection.commit.call_count == 3
+
+    cursor.executemany.reset_mock()
+    sqlpipe.load_db(config_db, iter(rows), batch_size=1, yyyymm='202501',
+                    source='other')
+    assert cursor.executemany.call_count == 3
+
+    # without a source a checkpoint cannot be told apart from another file's
+    cursor.executemany.reset_mock()
+    cursor.fetchone.return_value = (1, None)
+    sqlpipe.load_db(config_db, iter(rows), batch_size=1, yyyymm='202501')
+    assert cursor.executemany.call_count == 3
+
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db(config_db, rows, yyyymm='202501')
+    assert 'checkpoint requires' in str(excinfo.value)
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_load_db_parallel(mock_pool):
+    '''
+    Perform unit test for DataPipe.load_db() with parallel shards.
+    1) Every batch is loaded once across the shards
+    2) With parallel_atomic, the shards load a staging table that is copied
+       into the table and dropped
+    3) A failed shard is reported, the staging table is dropped and nothing
+       is copied into the table
+    4) parallel cannot be combined with checkpoint
+    5) A source failing partway makes every shard roll back, and the
+       staging table is dropped
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.rowcount = 1
+
+    mock_pool.return_value.pool_size = 3
+
+    rows = [(date(2025, 1, 1), f'AB{i}', i) for i in range(6)]
+    config_db = {**CONFIG_DB, 'parallel': 3, 'parallel_atomic': True}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport', pool_size=3)
+    row_count = sqlpipe.load_db(config_db, iter(rows), batch_size=1,
+                                yyyymm='202501')
+
+    loaded = sorted(row for call in cursor.executemany.call_args_list
+                    for row in call.args[1])
+    assert loaded == rows
+    assert row_count == 6
+    assert all('transport.r_pv_train_par_202501' in call.args[0]
+               for call in cursor.executemany.call_args_list)
+    stmts = [call.args[0] for call in cursor.execute.call_args_list]
+    assert any(i.startswith('INSERT INTO transport.r_pv_train ')
+               for i in stmts if 'SELECT' in i)
+    assert stmts[-1] == 'DROP TABLE transport.r_pv_train_par_202501;'
+
+    cursor.reset_mock()
+    cursor.executemany.side_effect = Error('lock wait timeout')
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db(config_db, iter(rows), batch_size=1,
+                        yyyymm='202501')
+    assert 'shards failed, nothing was loaded' in str(excinfo.value)
+    assert 'lock wait timeout' in str(excinfo.value)
+    stmts = [call.args[0] for call in cursor.execute.call_args_list]
+    assert not any('SELECT' in i for i in stmts)
+    assert stmts[-1] == \
+        'DROP TABLE IF EXISTS transport.r_pv_train_par_202501;'
+
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db({**config_db, 'checkpoint': True}, rows,
+                        batch_size=1, yyyymm='202501')
+    assert 'parallel 3 requires' in str(excinfo.value)
+
+    def source():
+        yield from rows[:4]
+        raise ValueError('bad chunk')
+
+    cursor.reset_mock()
+    cursor.executemany.side_effect = None
+    connection.reset_mock()
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db(config_db, source(), batch_size=1, yyyymm='202501')
+    assert 'source: bad chunk' in str(excinfo.value)
+    assert 'nothing was loaded' in str(excinfo.value)
+    assert connection.commit.call_count == 0
+    assert connection.rollback.call_count == 3
+    stmts = [call.args[0] for call in cursor.execute.call_args_list]
+    assert not any('SELECT' in i for i in stmts)
+    assert stmts[-1] == \
+        'DROP TABLE IF EXISTS transport.r_pv_train_par_202501;'
+
+    # without a staging table the shards roll back all the same
+    connection.reset_mock()
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.load_db({**config_db, 'parallel_atomic': False}, source(),
+                        batch_size=1, yyyymm='202501')
+    assert 'nothing was loaded' in str(excinfo.value)
+    assert connection.commit.call_count == 0
+
+
+@patch('import_func.pooling.MySQLConnectionPool')
+def test_delete_db(mock_pool):
+    '''
+    Perform unit test for DataPipe.delete_db().
+    1) Rows are deleted by key_col in batches in one transaction, each
+       batch a single statement
+    2) No statement matches more than DELETE_BATCH keys
+    3) A table without key_col is rejected
+    '''
+    connection = mock_pool.return_value.get_connection.return_value
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.rowcount = 1
+
+    keys = [(date(2025, 1, 1), f'AB{i}') for i in range(3)]
+    config_db = {**CONFIG_DB, 'key_col': ['year_month', 'pt_code']}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    assert sqlpipe.delete_db(config_db, iter(keys), batch_size=2) == 2
+
+    stmt, params = cursor.execute.call_args_list[0].args
+    assert stmt == ('DELETE FROM transport.r_pv_train '
+                    'WHERE (`year_month`, `pt_code`) IN ((%s, %s), (%s, %s));')
+    assert params == [*keys[0], *keys[1]]
+    stmt, params = cursor.execute.call_args_list[1].args
+    assert stmt.endswith('IN ((%s, %s));') and params == [*keys[2]]
+    assert cursor.execute.call_count == 2
+    cursor.executemany.assert_not_called()
+    assert connection.commit.call_count == 1
+
+    cursor.execute.reset_mock()
+    with patch('import_func.DELETE_BATCH', 2):
+        sqlpipe.delete_db(config_db, keys)
+    assert cursor.execute.call_count == 2
+
+    with pytest.raises(Exception) as excinfo:
+        sqlpipe.delete_db(CONFIG_DB, keys)
+    assert 'requires key_col' in str(excinfo.value)
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+
+import hashlib
+import io
+
+from manifest import Manifest
+
+
+def test_manifest_digest():
+    '''
+    Perform unit test for Manifest.digest() function.
+    1) sha256 and size of the file object are returned
+    '''
+    data = b'col1,col2\n1,2\n'
+    sha256, size = Manifest.digest(io.BytesIO(data))
+
+    assert sha256 == hashlib.sha256(data).hexdigest()
+    assert size == 14
+
+
+def test_manifest_record(tmp_path):
+    '''
+    Perform unit test for recording files in the manifest.
+    1) Unseen files are not loaded
+    2) Entries are updated in place as their status changes
+    3) Only a 'loaded' status marks the file as loaded
+    '''
+    manifest = Manifest(tmp_path / 'logs' / 'manifest.db')
+
+    assert manifest.lookup('abc', 'csv') is None
+    assert not manifest.is_loaded('abc', 'csv')
+
+    manifest.record('abc', 'csv', 'pv_train.csv', 14, 'failed')
+    assert not manifest.is_loaded('abc', 'csv')
+
+    manifest.record('abc', 'csv', 'pv_train.csv', 14, 'loaded', 2)
+    assert manifest.is_loaded('abc', 'csv')
+    assert not manifest.is_loaded('abc', 'zip')
+
+    entry = manifest.lookup('abc', 'csv')
+    assert entry['row_count'] == 2
+    assert entry['size'] == 14
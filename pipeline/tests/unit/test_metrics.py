@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+import json
+import os
+
+import pytest
+
+from metrics import Recorder
+
+
+def test_recorder_stage():
+    '''
+    Perform unit test for recording pipeline stages.
+    1) Repeated stages are accumulated
+    2) Throughput is derived from the recorded rows, bytes and time
+    3) Peak rss is recorded with each stage
+    '''
+    recorder = Recorder()
+    recorder.add('read_csv', 2.0, rows=100, nbytes=1000)
+    recorder.add('read_csv', 2.0, rows=100, nbytes=1000)
+    with recorder.stage('transform') as metrics:
+        metrics['rows'] = 200
+
+    stages = recorder.summary()['stages']
+    assert stages['read_csv']['calls'] == 2
+    assert stages['read_csv']['rows_per_second'] == 50
+    assert stages['read_csv']['bytes_per_second'] == 500
+    assert stages['transform']['rows'] == 200
+    assert stages['transform']['peak_rss_bytes'] > 0
+    assert recorder.seconds('read_csv', 'load_db') == 4.0
+
+
+@pytest.mark.skipif(not os.path.exists('/proc/self/clear_refs'),
+                    reason='peak rss is only reset on linux')
+def test_recorder_stage_peak():
+    '''
+    Perform unit test for the peak rss of each stage.
+    1) A stage after a larger one reports its own peak, not the process's
+    2) A stage holds the peak of the stages run within it
+    '''
+    size = 64 * 1024 * 1024
+    recorder = Recorder()
+    with recorder.stage('outer'):
+        with recorder.stage('large'):
+            buf = b'x' * size
+            del buf
+        with recorder.stage('small'):
+            pass
+
+    stages = recorder.summary()['stages']
+    assert stages['large']['peak_rss_bytes'] - \
+        stages['small']['peak_rss_bytes'] > size // 2
+    assert stages['outer']['peak_rss_bytes'] >= \
+        stages['large']['peak_rss_bytes']
+    assert recorder.summary()['peak_rss_bytes'] >= \
+        stages['large']['peak_rss_bytes']
+
+
+def test_recorder_write(tmp_path):
+    '''
+    Perform unit test for exporting the recorded metrics.
+    1) The textfile holds a gauge per stage in the Prometheus format
+    2) The json summary holds every stage
+    3) No temporary files are left behind
+    '''
+    recorder = Recorder()
+    recorder.add('load_db', 1.5, rows=10, nbytes=100)
+
+    textfile = tmp_path / 'metrics' / 'pipeline.prom'
+    summary = tmp_path / 'logs' / 'run_summary.json'
+    recorder.write(str(textfile), str(summary))
+
+    lines = textfile.read_text().splitlines()
+    assert '# TYPE pipeline_stage_seconds gauge' in lines
+    assert 'pipeline_stage_seconds{stage="load_db"} 1.5' in lines
+    assert 'pipeline_stage_rows{stage="load_db"} 10' in lines
+
+    assert json.loads(summary.read_text())['stages']['load_db']['rows'] == 10
+    assert sorted(p.name for p in tmp_path.rglob('*.tmp')) == []
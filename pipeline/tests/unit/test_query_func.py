@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+
+import os
+from datetime import date
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from import_func import DataPipe
+from query_func import PVTrainQuery
+from query_func import ResultCache
+from query_func import invalidate
+from query_func import YAML_FILE
+
+CONFIG_DIR = os.path.join(os.path.dirname(__file__), '..', '..', 'config')
+
+
+def test_result_cache():
+    '''
+    Perform unit test for ResultCache.
+    1) The least recently used result is evicted when full
+    2) Results expire after ttl seconds
+    3) Results are stale once the data version changes
+    '''
+    version = [1]
+    cache = ResultCache(maxsize=2, ttl=60, version=lambda: version[0])
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+
+    version[0] = 2
+    assert cache.get('a') is None
+
+    with patch('query_func.time.monotonic', return_value=1e12):
+        cache.put('d', 4)
+    assert cache.get('d') == 4
+    with patch('query_func.time.monotonic', return_value=1e12 + 61):
+        assert cache.get('d') is None
+
+
+@pytest.fixture
+def cursor(tmp_path):
+    DataPipe._pools.clear()
+    with (patch('import_func.pooling.MySQLConnectionPool') as mock_pool,
+          patch('query_func.version_file',
+                return_value=str(tmp_path / 'pv_train.version'))):
+        connection = mock_pool.return_value.get_connection.return_value
+        yield connection.cursor.return_value.__enter__.return_value
+    DataPipe._pools.clear()
+
+
+def test_query_by_station(cursor, tmp_path):
+    '''
+    Perform unit test for PVTrainQuery.by_station().
+    1) The station and month range are queried with placeholders
+    2) Columns are returned with their dtypes
+    3) Repeated queries are served from the cache until a month is loaded
+    '''
+    cursor.column_names = ('year_month', 'pt_code', 'total_tap_in_volume')
+    cursor.fetchall.return_value = [(date(2025, 7, 1), 'NS1', 10)]
+
+    query = PVTrainQuery(DataPipe('127.0.0.1', 'user', 'pass', 'transport'))
+    df = query.by_station('NS1', '202506', '202507')
+
+    stmt, params = cursor.execute.call_args.args
+    assert 'FROM transport.r_pv_train WHERE `year_month` BETWEEN %s AND %s ' \
+        'AND `pt_code` IN (%s) ' in stmt
+    assert params == ['2025-06-01', '2025-07-01', 'NS1']
+    assert df['year_month'].iloc[0] == pd.Timestamp('2025-07-01')
+    assert df['pt_code'].dtype == 'category'
+    assert df['total_tap_in_volume'].dtype == 'Int64'
+
+    # a changed copy does not change the cached result
+    df.loc[0, 'total_tap_in_volume'] = 0
+    assert query.by_station('NS1', '202506', '202507')[
+        'total_tap_in_volume'].iloc[0] == 10
+    assert cursor.execute.call_count == 1
+
+    invalidate(str(tmp_path / 'pv_train.version'), '202508')
+    query.by_station('NS1', '202506', '202507')
+    assert cursor.execute.call_count == 2
+
+
+def test_query_fact(cursor, monkeypatch, tmp_path):
+    '''
+    Perform unit test for PVTrainQuery with the fact table loaded.
+    1) Rows are read from the view over the fact table, not r_pv_train
+    2) Months are filtered on the view's YYYYMM month_key
+    '''
+    conf = open(os.path.join(CONFIG_DIR, YAML_FILE), encoding='utf-8').read()
+    conf = conf.replace('fact: False', 'fact: True').replace(
+        "source: 'r_pv_train'", "source: 'v_pv_train'").replace(
+        "# month_key: 'yyyymm'", "month_key: 'yyyymm'")
+    (tmp_path / YAML_FILE).write_text(conf)
+    monkeypatch.setenv('CONFIG_DIR', str(tmp_path))
+
+    cursor.column_names = ('year_month', 'pt_code', 'total_tap_in_volume')
+    cursor.fetchall.return_value = [(date(2025, 7, 1), 'NS1', 10)]
+
+    query = PVTrainQuery(DataPipe('127.0.0.1', 'user', 'pass', 'transport'))
+    query.by_station('NS1', '202506', '202507')
+
+    stmt, params = cursor.execute.call_args.args
+    assert 'FROM transport.v_pv_train WHERE `yyyymm` BETWEEN %s AND %s ' \
+        'AND `pt_code` IN (%s) ' in stmt
+    assert params == [202506, 202507, 'NS1']
+    assert query.config_rollup['source'] == 'v_pv_train'
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from import_func import DataPipe
+from rollup import aggregate
+from rollup import covering_rollup
+from rollup import refresh_rollups
+
+CONFIG_ROLLUP = {
+    'source': 'r_pv_train',
+    'month_col': 'year_month',
+    'measures': ['total_tap_in_volume'],
+    'rollups': {
+        'ru_pv_train_station': ['pt_code', 'day_type'],
+        'ru_pv_train_hour': ['day_type', 'time_per_hour']
+    }
+}
+
+
+@pytest.fixture
+def cursor():
+    DataPipe._pools.clear()
+    with patch('import_func.pooling.MySQLConnectionPool') as mock_pool:
+        connection = mock_pool.return_value.get_connection.return_value
+        yield connection.cursor.return_value.__enter__.return_value
+    DataPipe._pools.clear()
+
+
+def test_refresh_rollups(cursor):
+    '''
+    Perform unit test for refresh_rollups().
+    1) Only the month loaded is deleted and recomputed from the source
+    2) The month is recorded as covered by each rollup
+    '''
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    refresh_rollups(sqlpipe, CONFIG_ROLLUP, '202507')
+
+    stmts = [call.args for call in cursor.execute.call_args_list]
+    assert stmts[0] == ('DELETE FROM transport.ru_pv_train_station '
+                        'WHERE `year_month` = %s;', ('2025-07-01',))
+    assert stmts[1] == (
+        'INSERT INTO transport.ru_pv_train_station '
+        '(`year_month`, `pt_code`, `day_type`, `total_tap_in_volume`) '
+        'SELECT `year_month`, `pt_code`, `day_type`, '
+        'SUM(`total_tap_in_volume`) FROM transport.r_pv_train '
+        'WHERE `year_month` = %s '
+        'GROUP BY `year_month`, `pt_code`, `day_type`;', ('2025-07-01',)
+    )
+    assert stmts[2][1][:2] == ('ru_pv_train_station', '2025-07-01')
+    assert len(stmts) == 6
+
+
+def test_refresh_rollups_month_key(cursor):
+    '''
+    Perform unit test for refresh_rollups() from a view over the fact table.
+    1) The source is filtered on its YYYYMM month_key, not the computed
+       month column
+    '''
+    config_rollup = {**CONFIG_ROLLUP, 'source': 'v_pv_train',
+                     'month_key': 'yyyymm'}
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+    refresh_rollups(sqlpipe, config_rollup, '202507')
+
+    stmt, params = cursor.execute.call_args_list[1].args
+    assert 'FROM transport.v_pv_train WHERE `yyyymm` = %s GROUP BY' in stmt
+    assert params == (202507,)
+
+
+def test_covering_rollup():
+    '''
+    Perform unit test for covering_rollup().
+    1) The smallest rollup holding every column is picked
+    2) Columns outside every rollup have none
+    '''
+    assert covering_rollup(CONFIG_ROLLUP, ['day_type']) == 'ru_pv_train_hour'
+    assert covering_rollup(CONFIG_ROLLUP, ['pt_code']) == \
+        'ru_pv_train_station'
+    assert covering_rollup(CONFIG_ROLLUP, ['pt_code', 'time_per_hour']) \
+        is None
+
+
+def test_aggregate(cursor):
+    '''
+    Perform unit test for aggregate().
+    1) A rollup covering the columns and months is read
+    2) The source table is read when the rollup misses a month
+    3) Sums are returned as integers
+    4) The source is filtered on its month_key when it has one
+    '''
+    sqlpipe = DataPipe('127.0.0.1', 'user', 'pass', 'transport')
+
+    def answer(months_covered, config_rollup=CONFIG_ROLLUP):
+        cursor.fetchall.side_effect = [
+            [(months_covered,)],
+            [('2025-07-01', 'NS1', Decimal(10))]
+        ]
+        cursor.execute.side_effect = lambda stmt, params: setattr(
+            cursor, 'column_names',
+            ('n',) if 'COUNT' in stmt
+            else ('year_month', 'pt_code', 'total_tap_in_volume'))
+        return aggregate(sqlpipe, config_rollup, ['pt_code'], '202506',
+                         '202507', filters={'pt_code': ['NS1']})
+
+    df = answer(2)
+    stmt, params = cursor.execute.call_args.args
+    assert stmt == (
+        'SELECT `year_month`, `pt_code`, SUM(`total_tap_in_volume`) AS '
+        '`total_tap_in_volume` FROM transport.ru_pv_train_station '
+        'WHERE `year_month` BETWEEN %s AND %s AND `pt_code` IN (%s) '
+        'GROUP BY `year_month`, `pt_code` ORDER BY `year_month`, `pt_code`;'
+    )
+    assert params == ['2025-06-01', '2025-07-01', 'NS1']
+    assert df['total_tap_in_volume'].tolist() == [10]
+
+    answer(1)
+    stmt, _ = cursor.execute.call_args.args
+    assert 'FROM transport.r_pv_train ' in stmt
+
+    answer(1, {**CONFIG_ROLLUP, 'month_key': 'yyyymm'})
+    stmt, params = cursor.execute.call_args.args
+    assert 'WHERE `yyyymm` BETWEEN %s AND %s AND `pt_code` IN' in stmt
+    assert params == [202506, 202507, 'NS1']
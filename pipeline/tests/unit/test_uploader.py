@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+
+import json
+import os
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from uploader import MB
+from uploader import S3Uploader
+from uploader import sidecar_path
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    for k, v in {'AWS_ACCESS_KEY_ID': 'testing',
+                 'AWS_SECRET_ACCESS_KEY': 'testing',
+                 'AWS_DEFAULT_REGION': 'us-east-1'}.items():
+        monkeypatch.setenv(k, v)
+    with mock_aws():
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='archive')
+        yield client
+
+
+def test_upload_skip(s3, tmp_path):
+    '''
+    Perform unit test for uploading a small file.
+    1) The file is put under the prefix with its sha256
+    2) An unchanged file is skipped
+    3) A changed file is uploaded again
+    '''
+    path = tmp_path / 'pv_train_20250801.zip'
+    path.write_bytes(b'zip')
+    uploader = S3Uploader('archive', prefix='lta/', client=s3)
+
+    assert uploader.upload(str(path)) == 'uploaded'
+    obj = s3.get_object(Bucket='archive', Key='lta/pv_train_20250801.zip')
+    assert obj['Body'].read() == b'zip'
+    assert uploader.upload(str(path)) == 'skipped'
+
+    path.write_bytes(b'zip2')
+    assert uploader.upload(str(path)) == 'uploaded'
+
+
+def test_upload_multipart_resume(s3, tmp_path):
+    '''
+    Perform unit test for resuming a failed multipart upload.
+    1) A failed part fails the upload and its progress is kept
+    2) The rerun only uploads the missing parts
+    3) The object is complete and the sidecar marks the file uploaded
+    '''
+    data = os.urandom(5 * MB) * 2 + b'tail'
+    path = tmp_path / 'big.zip'
+    path.write_bytes(data)
+    uploader = S3Uploader('archive', part_size=5 * MB, max_workers=3,
+                          client=s3)
+
+    upload_part = s3.upload_part
+    calls = []
+    failed = []
+
+    def flaky_upload_part(**kwargs):
+        calls.append(kwargs['PartNumber'])
+        if kwargs['PartNumber'] == 2 and not failed:
+            failed.append(2)
+            raise ConnectionError('connection reset')
+        return upload_part(**kwargs)
+
+    s3.upload_part = flaky_upload_part
+
+    with pytest.raises(Exception, match='1 of 3 parts'):
+        uploader.upload(str(path))
+    assert os.path.exists(sidecar_path(str(path)))
+
+    calls.clear()
+    assert uploader.upload(str(path)) == 'uploaded'
+    assert calls == [2]
+
+    obj = s3.get_object(Bucket='archive', Key='big.zip')
+    assert obj['Body'].read() == data
+    with open(sidecar_path(str(path)), encoding='utf-8') as f:
+        state = json.load(f)
+    assert state['done'] and 'upload_id' not in state
+
+
+def test_upload_unchanged(s3, tmp_path):
+    '''
+    Perform unit test for skipping files unchanged since their upload.
+    1) A file whose size and mtime are unchanged is neither hashed nor
+       looked up in the bucket
+    2) A file touched since is hashed again
+    '''
+    path = tmp_path / 'pv_train_20250801.zip'
+    path.write_bytes(b'zip')
+    uploader = S3Uploader('archive', client=s3)
+    assert uploader.upload(str(path)) == 'uploaded'
+
+    head_object = s3.head_object
+    heads = []
+
+    def counted_head_object(**kwargs):
+        heads.append(kwargs['Key'])
+        return head_object(**kwargs)
+
+    s3.head_object = counted_head_object
+    assert uploader.upload(str(path)) == 'skipped'
+    assert heads == []
+
+    os.utime(path, ns=(0, 0))
+    assert uploader.upload(str(path)) == 'skipped'
+    assert heads == ['pv_train_20250801.zip']
+
+
+def test_upload_multipart_stale(s3, tmp_path):
+    '''
+    Perform unit test for a multipart upload left by a file since changed.
+    1) The stale upload is aborted
+    2) The new content is uploaded in full
+    '''
+    path = tmp_path / 'big.zip'
+    path.write_bytes(os.urandom(5 * MB) + b'old')
+    uploader = S3Uploader('archive', part_size=5 * MB, client=s3)
+
+    def failing_upload_part(**kwargs):
+        raise ConnectionError('connection reset')
+
+    upload_part = s3.upload_part
+    s3.upload_part = failing_upload_part
+    with pytest.raises(Exception, match='rerun to resume'):
+        uploader.upload(str(path))
+    s3.upload_part = upload_part
+    assert len(s3.list_multipart_uploads(Bucket='archive')['Uploads']) == 1
+
+    data = os.urandom(5 * MB) + b'new'
+    path.write_bytes(data)
+    assert uploader.upload(str(path)) == 'uploaded'
+
+    assert 'Uploads' not in s3.list_multipart_uploads(Bucket='archive')
+    obj = s3.get_object(Bucket='archive', Key='big.zip')
+    assert obj['Body'].read() == data
+
+
+def test_upload_dir(s3, tmp_path):
+    '''
+    Perform unit test for uploading a directory.
+    1) Files keep their layout under the directory name
+    2) Hidden and underscore prefixed entries are left out
+    '''
+    root = tmp_path / 'parquet'
+    (root / 'year_month=2025-07').mkdir(parents=True)
+    (root / 'year_month=2025-07' / 'part-0.parquet').write_bytes(b'p')
+    (root / '_tmp').mkdir()
+    (root / '_tmp' / 'part-0.parquet').write_bytes(b't')
+    (root / '.part-0.parquet.upload.json').write_text('{}')
+
+    results = S3Uploader('archive', client=s3).upload_dir(str(root))
+
+    assert list(results.values()) == ['uploaded']
+    keys = [i['Key'] for i in s3.list_objects_v2(Bucket='archive')['Contents']]
+    assert keys == ['parquet/year_month=2025-07/part-0.parquet']
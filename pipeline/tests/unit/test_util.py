@@ -1,6 +1,11 @@
 #!/usr/bin/env python3
 
+import json
+import os
+import time
+import uuid
 import zipfile
+import pytest
 import util
 from util import UDLogger
 
@@ -75,6 +80,117 @@ def test_unzip_file_bad_zip(tmp_path):
         assert "not a valid zip file" in str(e)
 
 
+def test_open_zip_member(tmp_path):
+    '''
+    Perform unit test for util.open_zip_member() function.
+    1) Member is read from the zip without being extracted
+    2) A missing member raises rather than opening another csv in its
+       place
+    '''
+    mock_data = b'col1,col2\n1,2\n'
+    zip_path = tmp_path / 'test_open_zip_member.zip'
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('readme.txt', 'not a csv')
+        zf.writestr('data_202501.csv', mock_data)
+
+    with util.open_zip_member(zip_path, 'data_202501.csv', logger) as f:
+        assert f.read() == mock_data
+
+    with pytest.raises(Exception) as excinfo:
+        with util.open_zip_member(zip_path, 'data_202502.csv', logger):
+            pass
+    assert 'data_202502.csv not found' in str(excinfo.value)
+
+    # nothing is written next to the zip
+    assert [p.name for p in tmp_path.iterdir()] == [zip_path.name]
+
+
+def test_open_zip_member_path_traversal(tmp_path):
+    '''
+    Perform unit test for path traversal catch when streaming from a zip.
+    1) Malicious file path e.g. '../malicious.csv' will return an exception
+    '''
+    zip_path = tmp_path / 'malicious.zip'
+    with zipfile.ZipFile(zip_path, 'w') as zf:
+        zf.writestr('../malicious.csv', 'malicious content')
+
+    with pytest.raises(Exception) as excinfo:
+        with util.open_zip_member(zip_path, '../malicious.csv', logger):
+            pass
+    assert 'Unsafe file detected' in str(excinfo.value)
+
+
+def test_load_config_cached(monkeypatch, tmp_path):
+    '''
+    Perform unit test for util.load_config() caching.
+    1) The same read only config is returned while the file is unchanged
+    2) The file is parsed again once its mtime changes
+    '''
+    monkeypatch.setenv('CONFIG_DIR', str(tmp_path))
+    config_path = tmp_path / 'lta_test.yaml'
+    config_path.write_text("config_test:\n    url_suffix: 'a'\n")
+
+    conf = util.load_config('lta_test.yaml')
+    assert util.load_config('lta_test.yaml') is conf
+    assert conf.config_test.url_suffix == 'a'
+
+    with pytest.raises(TypeError):
+        conf['config_test']['url_suffix'] = 'b'
+
+    config_path.write_text("config_test:\n    url_suffix: 'b'\n")
+    mtime = os.stat(config_path).st_mtime_ns + 1_000_000_000
+    os.utime(config_path, ns=(mtime, mtime))
+
+    assert util.load_config('lta_test.yaml')['config_test']['url_suffix'] \
+        == 'b'
+
+
+def test_load_config_invalid(monkeypatch, tmp_path):
+    '''
+    Perform unit test for util.load_config() validation.
+    1) Every problem in the file is reported at once
+    '''
+    monkeypatch.setenv('CONFIG_DIR', str(tmp_path))
+    (tmp_path / 'lta_test.yaml').write_text(
+        'config_test:\n'
+        "    url_suffix: 'a'\n"
+        "    col_pd: {'A': 'int46', 'B': 'str'}\n"
+        'config_db_tbl:\n'
+        "    tbl: 't'\n"
+        "    tbl_col: {'A': 'a'}\n"
+        "    load_mode: 'merge'\n"
+        "    key_col: ['b']\n"
+        'config_rollup:\n'
+        "    source: 'v_t'\n"
+        "    month_col: 'a'\n"
+        '    measures: []\n'
+        '    rollups: {}\n'
+    )
+
+    with pytest.raises(Exception) as excinfo:
+        util.load_config('lta_test.yaml')
+
+    err = str(excinfo.value)
+    assert "col_pd.A has unknown dtype 'int46'" in err
+    assert 'tbl_col should map the columns of col_pd' in err
+    assert 'load_mode should be one of' in err
+    assert "key_col ['b'] not in tbl_col" in err
+    assert "config_rollup should have source 't'" in err
+
+
+def test_load_config_repo(monkeypatch):
+    '''
+    Perform unit test for the config files shipped with the pipeline.
+    1) Every file passes validation
+    '''
+    repo_config = os.path.join(os.path.dirname(__file__), '..', '..',
+                               'config')
+    monkeypatch.setenv('CONFIG_DIR', repo_config)
+
+    for config_file in os.listdir(repo_config):
+        assert util.load_config(config_file)
+
+
 def test_udlogger_init():
     '''
     Perform unit test for user defined logger.
@@ -83,3 +199,59 @@ def test_udlogger_init():
     logger = UDLogger(filename='test.log',
                       name='test_logger')
     assert logger.filename.endswith('test.log')
+
+
+def read_log(path, lines: int, timeout: float = 2):
+    '''
+    Wait for the log listener to write out the given number of lines.
+    '''
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                content = f.read().splitlines()
+            if len(content) >= lines:
+                return content
+        time.sleep(0.01)
+
+    raise AssertionError(f'{path} has fewer than {lines} lines')
+
+
+def test_udlogger_idempotent():
+    '''
+    Perform unit test for repeated UDLogger.create_logger() calls.
+    1) Only one handler is attached to the logger
+    2) Each message is written to the log file once
+    '''
+    filename = f'test_{uuid.uuid4().hex}.log'
+    ud_logger = UDLogger(filename=filename, name=f'test_{filename}')
+
+    test_logger = ud_logger.create_logger()
+    assert ud_logger.create_logger() is test_logger
+    assert len(test_logger.handlers) == 1
+
+    test_logger.info('first')
+    test_logger.info('second')
+
+    content = read_log(ud_logger.filename, 2)
+    os.remove(ud_logger.filename)
+    assert len(content) == 2
+    assert content[0].endswith(f' INFO:test_{filename}:first')
+
+
+def test_udlogger_json():
+    '''
+    Perform unit test for the json log format.
+    1) Each record is written as one line of json
+    '''
+    filename = f'test_{uuid.uuid4().hex}.log'
+    ud_logger = UDLogger(filename=filename, name=f'test_{filename}',
+                         fmt='json')
+
+    ud_logger.create_logger().warning('chunk %s loaded', 3)
+
+    content = read_log(ud_logger.filename, 1)
+    os.remove(ud_logger.filename)
+    entry = json.loads(content[0])
+    assert entry['level'] == 'WARNING'
+    assert entry['message'] == 'chunk 3 loaded'
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+
+import pandas as pd
+
+from validate import Quarantine
+from validate import split_valid
+from util import load_config
+
+RULES = {
+    'YEAR_MONTH': {'not_null': True},
+    'TIME_PER_HOUR': {'min': 0, 'max': 23},
+    'PT_CODE': {'pattern': '[A-Z]{2}[0-9]+'},
+    'TOTAL_TAP_IN_VOLUME': {'min': 0}
+}
+
+
+def frame():
+    return pd.DataFrame({
+        'YEAR_MONTH': pd.to_datetime(['2025-07', 'bad', '2025-07', '2025-07'],
+                                     format='%Y-%m', errors='coerce'),
+        'TIME_PER_HOUR': [0, 23, 24, 5],
+        'PT_CODE': ['NS1', 'EW2', 'NS1', None],
+        'TOTAL_TAP_IN_VOLUME': [10, 20, -1, 30]
+    })
+
+
+def test_split_valid():
+    '''
+    Perform unit test for split_valid().
+    1) Rows passing every rule are kept
+    2) Rejected rows list every rule they fail
+    3) Missing values fail their rules
+    '''
+    valid, rejected = split_valid(frame(), RULES)
+
+    assert valid.index.tolist() == [0]
+    assert rejected['failed_rules'].tolist() == [
+        'YEAR_MONTH.not_null',
+        'TIME_PER_HOUR.max;TOTAL_TAP_IN_VOLUME.min',
+        'PT_CODE.pattern'
+    ]
+
+    valid, rejected = split_valid(frame().iloc[:1], RULES)
+    assert valid.shape[0] == 1 and rejected.empty
+
+
+def test_quarantine(tmp_path):
+    '''
+    Perform unit test for Quarantine.
+    1) Valid rows are passed on
+    2) Rejected rows of every chunk are appended under a single header
+    '''
+    path = tmp_path / 'quarantine' / 'pv_train_202507.csv'
+    check = Quarantine(str(path), RULES)
+
+    assert check(frame()).shape[0] == 1
+    assert check(frame()).shape[0] == 1
+
+    quarantined = pd.read_csv(path)
+    assert check.count == 6
+    assert quarantined.shape[0] == 6
+    assert quarantined['failed_rules'].iloc[0] == 'YEAR_MONTH.not_null'
+
+
+def test_key_rules():
+    '''
+    Perform unit test for the rules configured for pv_train.
+    1) Every natural key column of r_pv_train is required, as the table
+       has them NOT NULL
+    '''
+    conf = load_config('lta_pv_train.yaml')
+    csv_col = {tbl_col: col for col, tbl_col
+               in conf.config_db_tbl.tbl_col.items()}
+    key_cols = [csv_col[i] for i in conf.config_db_tbl.key_col]
+
+    for col in key_cols:
+        assert conf.config_pv_train.rules[col]['not_null'] is True